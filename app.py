@@ -1,10 +1,22 @@
-import os, uuid, datetime, json
-from flask import Flask, request, jsonify, render_template, redirect, url_for, flash
+import os, queue
+from flask import Flask, Response, request, jsonify, render_template, redirect, url_for, flash, send_from_directory, abort
 from werkzeug.utils import secure_filename
 from pymongo import MongoClient
 from twilio.rest import Client
 from dotenv import load_dotenv
-from detect_module import process_image, send_detection_to_flask
+from detect_module import process_image, process_images, build_detection_payload
+from rule_index import RuleIndex
+from owner_resolver import OwnerResolver
+from notifications import NotificationDispatcher, FunctionTransport
+from ingestion import IngestionService
+from pagination import LISTINGS, DEFAULT_PAGE_SIZE, fetch_page, to_jsonable
+from db_schema import ensure_indexes
+from plate_index import PlateIndex
+from image_store import get_image_store
+from result_cache import get_result_cache
+from metrics import CONTENT_TYPE, REGISTRY, instrument
+from profiler import get_profiler, profiled
+from worker_pool import InferencePool
 
 load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI')
@@ -15,6 +27,14 @@ TW_FROM = os.getenv('TWILIO_FROM')
 client = MongoClient(MONGO_URI)
 db = client['echallan']
 
+if os.getenv('ENSURE_INDEXES', '1') != '0':
+    try:
+        ensure_indexes(db)
+    except Exception as e:
+        print(f"⚠️  Could not ensure indexes: {e}")
+rule_index = RuleIndex(db, ttl=float(os.getenv('RULES_TTL', '60')))
+owner_resolver = OwnerResolver(db, ttl=float(os.getenv('OWNER_CACHE_TTL', '300')))
+
 tw_client = Client(TW_SID, TW_TOKEN) if TW_SID and TW_TOKEN else None
 
 app = Flask(__name__)
@@ -25,62 +45,7 @@ app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 # Create upload folder if it doesn't exist
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
-def find_applicable_rules(detection):
-    # detection can be:
-    # - A single detection dict: {"class":"NoHelmet","confidence":0.6}
-    # - A list of detection dicts: [{"class":"NoHelmet","confidence":0.6}]
-    # - A detection data dict with "detections" list: {"detections": [{"class":"NoHelmet","confidence":0.6}], ...}
-
-    detections = []
-
-    if isinstance(detection, dict):
-        if 'detections' in detection:
-            # New format from detect_helmet.py
-            detections = detection['detections']
-        else:
-            # Single detection dict
-            detections = [detection]
-    elif isinstance(detection, list):
-        # List of detections
-        detections = detection
-    else:
-        return []
-
-    applicable = []
-    for det in detections:
-        class_name = det.get('class')
-        conf = det.get('confidence', 0.0)
-        if not class_name:
-            continue
-
-        rules = list(db.rules.find({"violation_class": class_name, "active": True}))
-        for r in rules:
-            if conf >= r.get('min_confidence', 0.0):
-                applicable.append(r)
-
-    return applicable
-
-def create_challan(vehicle_no, owner_id, rules_triggered, detection):
-    challan_no = f"CH{datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{str(uuid.uuid4())[:6]}"
-    violations = []
-    total = 0
-    for r in rules_triggered:
-        violations.append({"rule_id": r['rule_id'], "penalty": r['penalty'], "conf": detection.get('confidence', 0.0)})
-        total += r['penalty']
-    challan = {
-        "challan_no": challan_no,
-        "vehicle_no": vehicle_no,
-        "owner_id": owner_id,
-        "violations": violations,
-        "total_penalty": total,
-        "status": "issued",
-        "issued_at": datetime.datetime.utcnow(),
-        "notified": False,
-        "notification_log": []
-    }
-    res = db.challans.insert_one(challan)
-    return challan
-
+@instrument('send_sms')
 def send_sms(to, body):
     if not tw_client:
         print("Twilio not configured; mock send:", to, body)
@@ -88,7 +53,32 @@ def send_sms(to, body):
     msg = tw_client.messages.create(body=body, from_=TW_FROM, to=to)
     return {"status":"sent", "sid": msg.sid}
 
+# SMS goes through the outbox; workers call send_sms off the request path
+notifier = NotificationDispatcher(
+    db,
+    {"sms": FunctionTransport("twilio" if tw_client else "mock", send_sms)},
+    workers=int(os.getenv('NOTIFY_WORKERS', '4')),
+    rate_limits={"twilio": float(os.getenv('TWILIO_RATE_LIMIT', '1'))},
+)
+
+# /detect logic; the HTTP route and in-process callers (/upload) share it
+plate_index = PlateIndex(db=db, ttl=float(os.getenv('PLATE_INDEX_TTL', '300')))
+ingestion = IngestionService(db, rule_index, owner_resolver, notifier, plate_index)
+find_applicable_rules = ingestion.find_applicable_rules
+create_challan = ingestion.create_challan
+MAX_BATCH_EVENTS = int(os.getenv('MAX_BATCH_EVENTS', '1000'))
+ADMIN_TOKEN = os.getenv('ADMIN_TOKEN')
+# Web-only workers serve /detect, /data and the APIs and never load the ML
+# stack (torch, ultralytics, easyocr, cv2); /upload inference is refused
+WEB_ONLY = os.getenv('WEB_ONLY', '0') == '1'
+
+# Annotated images are rendered and written off the request path
+image_store = get_image_store()
+OUTPUT_FOLDER = 'outputs'
+
 @app.route('/detect', methods=['POST'])
+@instrument('receive_detection')
+@profiled('detect')
 def receive_detection():
     """
     Expected JSON payload from detector:
@@ -97,115 +87,247 @@ def receive_detection():
       "timestamp":"2025-10-28T18:00:00Z",
       "detection": {"class":"no_helmet","conf":0.92, "bbox":[x1,y1,x2,y2]},
       "vehicle_no": "MH01AB1234"  // optional if OCR matched
-      "image_path": "/path/..."
+      "image_path": "/path/...",
+      "idempotency_key": "..."  // optional; same value on every retry of one event
     }
     """
-    data = request.json
-    detection = data.get('detection')
-    src = data.get('source','unknown')
-    vehicle_no = data.get('vehicle_no')  # may be None
-
-    # Save raw violation log
-    viol_log = {
-        "timestamp": datetime.datetime.utcnow(),
-        "source": src,
-        "vehicle_no": vehicle_no,
-        "detection": detection,
-        "image_path": data.get('image_path'),
-        "processed": False
-    }
-    db.violations.insert_one(viol_log)
-
-    # Find rules
-    rules = find_applicable_rules(detection)
-    if not rules:
-        return jsonify({"status":"ok","message":"no rule triggered"}), 200
-
-    # Resolve owner via vehicle_no (if present)
-    owner = None
-    if vehicle_no:
-        owner = db.vehicles.find_one({"vehicle_no": vehicle_no})
-        if owner:
-            owner_doc = db.owners.find_one({"owner_id": owner['owner_id']})
-        else:
-            owner_doc = None
-    else:
-        owner_doc = None
-
-    # Create challan only if we have owner/vehicle or allow anonymous challans
-    if owner_doc:
-        challan = create_challan(vehicle_no, owner_doc['owner_id'], rules, detection)
-
-        # Notify owner via SMS (if phone present)
-        phone = owner_doc.get('phone')
-        body = f"Violation: {detection['class']} detected for {vehicle_no}. Penalty INR {challan['total_penalty']}. Challan No: {challan['challan_no']}."
-        sms_res = send_sms(phone, body)
-        # update challan notification info
-        db.challans.update_one({"challan_no": challan['challan_no']},
-                               {"$set":{"notified": True}, "$push": {"notification_log": {"method":"sms","to":phone,"ts":datetime.datetime.utcnow(),"status":sms_res}}})
-        return jsonify({"status":"challan_created", "challan_no": challan['challan_no']})
-    else:
-        # Option: create challan with vehicle_no null and mark for manual review
-        review = {
-            "vehicle_no": vehicle_no,
-            "detection": detection,
-            "status": "manual_review",
-            "created_at": datetime.datetime.utcnow()
-        }
-        db.manual_reviews.insert_one(review)
-        return jsonify({"status":"manual_review","message":"owner not found; logged for review"}), 200
+    return jsonify(ingestion.ingest(request.json)), 200
+
+@app.route('/detect/batch', methods=['POST'])
+def receive_detection_batch():
+    """
+    Same payloads as /detect, many per request, written with one bulk
+    insert per collection. Accepts a JSON list or {"events": [...]};
+    returns {"results": [...]} with one /detect-style response per event.
+    """
+    body = request.get_json(silent=True)
+    events = body.get('events') if isinstance(body, dict) else body
+    if not isinstance(events, list) or not all(isinstance(e, dict) for e in events):
+        return jsonify({"error": "expected a list of detection payloads"}), 400
+    if len(events) > MAX_BATCH_EVENTS:
+        return jsonify({"error": f"at most {MAX_BATCH_EVENTS} events per batch"}), 400
+    return jsonify({"results": ingestion.ingest_batch(events)}), 200
 
 @app.route('/')
 def index():
     return render_template('index.html')
 
+def ingest_uploads(all_data):
+    """Ingest uploaded detections; one results.html entry per image"""
+    results = []
+    for detection_data in all_data:
+        # Ingest in-process; no HTTP hop back into this server
+        ingest_response = ingestion.ingest(build_detection_payload(detection_data))
+
+        # Check if challan was created
+        challan = None
+        if ingest_response.get('status') == 'challan_created':
+            challan_no = ingest_response.get('challan_no')
+            challan = db.challans.find_one({"challan_no": challan_no})
+
+        image_path = detection_data['image_path']
+        thumbnail_path = image_store.thumbnail_path(image_path) if image_store.thumbnail_size else image_path
+        results.append({"detections": detection_data['detections'],
+                        "image_path": image_path,
+                        "thumbnail_path": thumbnail_path,
+                        "challan": challan})
+    return results
+
+# Uploads run in a pool of inference processes (frames handed over through
+# shared memory); INFERENCE_WORKERS=0 runs them in the request thread instead
+INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', '2'))
+inference_pool = None
+if INFERENCE_WORKERS > 0 and not WEB_ONLY:
+    inference_pool = InferencePool(
+        workers=INFERENCE_WORKERS,
+        threads_per_worker=int(os.getenv('INFERENCE_WORKER_THREADS', '1')),
+        queue_size=int(os.getenv('INFERENCE_QUEUE_SIZE', '64')),
+        output_dir=OUTPUT_FOLDER,
+        on_result=ingest_uploads,
+    )
+
+def _wants_json():
+    return request.accept_mimetypes.best_match(['text/html', 'application/json']) == 'application/json'
+
 @app.route('/upload', methods=['GET', 'POST'])
+@instrument('upload')
+@profiled('upload')
 def upload():
     if request.method == 'POST':
+        if WEB_ONLY:
+            abort(503, description='Inference is disabled on this web-only worker')
         if 'image' not in request.files:
             flash('No file part')
             return redirect(request.url)
-        file = request.files['image']
-        if file.filename == '':
+        files = [f for f in request.files.getlist('image') if f.filename != '']
+        if not files:
             flash('No selected file')
             return redirect(request.url)
-        if file and file.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')):
-            filename = secure_filename(file.filename)
-            filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-            file.save(filepath)
-
-            # Process the image
-            detection_data = process_image(filepath)
-
-            # Send to Flask API
-            flask_response = send_detection_to_flask(detection_data)
-
-            # Check if challan was created
-            challan = None
-            if flask_response.get('status') == 'challan_created':
-                challan_no = flask_response.get('challan_no')
-                challan = db.challans.find_one({"challan_no": challan_no})
-
-            return render_template('results.html',
-                                 detections=detection_data['detections'],
-                                 image_path=detection_data['image_path'],
-                                 challan=challan)
+        if all(f.filename.lower().endswith(('.png', '.jpg', '.jpeg', '.gif')) for f in files):
+            filepaths = []
+            for file in files:
+                filename = secure_filename(file.filename)
+                filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+                file.save(filepath)
+                filepaths.append(filepath)
+
+            if inference_pool is not None:
+                try:
+                    job_id = inference_pool.submit(filepaths)
+                except queue.Full:
+                    abort(503, description='Inference queue is full; try again shortly')
+                if _wants_json():
+                    return jsonify({"job_id": job_id, "status": "queued",
+                                    "status_url": url_for('job_status', job_id=job_id),
+                                    "result_url": url_for('job_result', job_id=job_id)}), 202
+                return redirect(url_for('job_result', job_id=job_id))
+
+            # Process the images (batched when more than one was uploaded)
+            if len(filepaths) == 1:
+                all_data = [process_image(filepaths[0])]
+            else:
+                all_data = process_images(filepaths)
+            return render_template('results.html', results=ingest_uploads(all_data))
         else:
             flash('Invalid file type. Please upload an image.')
             return redirect(request.url)
     return render_template('upload.html')
 
+def _job_or_404(job_id):
+    job = inference_pool.get(job_id) if inference_pool is not None else None
+    if job is None:
+        abort(404)
+    return job
+
+@app.route('/jobs/<job_id>')
+def job_status(job_id):
+    """
+    Poll an upload job: {"job_id", "status": queued|running|done|error,
+    "submitted_at", "finished_at", "images", "error", "stage_seconds",
+    "results" (once done)}
+
+    Jobs are held by the web process that accepted the upload, so behind
+    several processes polling needs sticky routing (or a single process).
+    """
+    return jsonify(to_jsonable(_job_or_404(job_id)))
+
+@app.route('/jobs/<job_id>/result')
+def job_result(job_id):
+    """Results page for an upload job; refreshes itself until the job finishes"""
+    job = _job_or_404(job_id)
+    if job['status'] == 'done':
+        return render_template('results.html', results=job['results'])
+    return render_template('processing.html', job=job)
+
+@app.route('/outputs/<path:filename>')
+def output_file(filename):
+    # Annotated images are written in the background; give the writer a moment
+    path = os.path.join(OUTPUT_FOLDER, filename)
+    if not os.path.exists(path) and not image_store.wait(path, timeout=10):
+        abort(404)
+    return send_from_directory(OUTPUT_FOLDER, filename)
+
 @app.route('/data')
 def data():
-    challans = list(db.challans.find().sort('issued_at', -1))
-    violations = list(db.violations.find().sort('timestamp', -1))
-    owners = list(db.owners.find())
-    vehicles = list(db.vehicles.find())
+    # Each tab shows one keyset page; "<tab>_cursor" pages that tab only
+    filters = {k: v for k, v in request.args.items() if not k.endswith('_cursor') and k != 'tab'}
+    pages, next_urls = {}, {}
+    for name in LISTINGS:
+        try:
+            docs, next_cursor = fetch_page(db, name, filters, request.args.get(f'{name}_cursor'))
+        except ValueError as e:
+            flash(str(e))
+            docs, next_cursor = fetch_page(db, name)
+        pages[name] = docs
+        if next_cursor:
+            next_urls[name] = url_for('data', **{**request.args, f'{name}_cursor': next_cursor, 'tab': name})
     return render_template('data.html',
-                         challans=challans,
-                         violations=violations,
-                         owners=owners,
-                         vehicles=vehicles)
+                         challans=pages['challans'],
+                         violations=pages['violations'],
+                         owners=pages['owners'],
+                         vehicles=pages['vehicles'],
+                         next_urls=next_urls,
+                         filters=filters,
+                         active_tab=request.args.get('tab', 'challans'))
+
+@app.route('/api/<listing>')
+def api_listing(listing):
+    """JSON page of challans, violations, owners or vehicles
+
+    Query args: cursor, limit, and the listing's filters
+    (status, vehicle, source, owner, from, to).
+    """
+    if listing not in LISTINGS:
+        return jsonify({"status": "error", "message": f"unknown listing: {listing}"}), 404
+    try:
+        docs, next_cursor = fetch_page(db, listing, request.args, request.args.get('cursor'),
+                                       request.args.get('limit', DEFAULT_PAGE_SIZE))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify({"items": to_jsonable(docs), "next_cursor": next_cursor})
+
+@app.route('/stats')
+def stats():
+    return jsonify({
+        "owner_resolver": owner_resolver.report(),
+        "rule_index": {"reloads": rule_index.reloads},
+        "image_store": image_store.report(),
+        "result_cache": get_result_cache().report(),
+        "profiler": get_profiler().report(),
+        "inference_pool": inference_pool.report() if inference_pool is not None else None
+    })
+
+@app.route('/metrics')
+def metrics():
+    """Stage latency histograms, call counters and in-flight gauges (Prometheus text format)"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
+def _admin_allowed():
+    # With ADMIN_TOKEN set, require it; otherwise only local callers
+    if ADMIN_TOKEN:
+        return request.headers.get('X-Admin-Token') == ADMIN_TOKEN
+    return request.remote_addr in ('127.0.0.1', '::1')
+
+@app.route('/admin/profiling', methods=['GET', 'POST'])
+def admin_profiling():
+    """
+    GET: profiler state and recent dumps.
+    POST {"sample_rate": 0.05, "max_dumps": 50}: change sampling at runtime
+    (sample_rate 0 turns it off).
+    """
+    if not _admin_allowed():
+        abort(403)
+    profiler = get_profiler()
+    if request.method == 'POST':
+        body = request.get_json(silent=True) or {}
+        try:
+            profiler.configure(sample_rate=body.get('sample_rate'), max_dumps=body.get('max_dumps'))
+        except (TypeError, ValueError) as e:
+            return jsonify({"status": "error", "message": str(e)}), 400
+    return jsonify(dict(profiler.report(), recent=[os.path.basename(p) for p in profiler.dumps()[:20]]))
+
+@app.route('/admin/profiling/summary')
+def admin_profiling_summary():
+    """
+    Top functions merged over dumps. Query args: dump (one file from
+    /admin/profiling), name (detect, upload, inference_worker,
+    detect_helmets), limit,
+    sort (cumulative or tottime).
+    """
+    if not _admin_allowed():
+        abort(403)
+    profiler = get_profiler()
+    paths = profiler.dumps(request.args.get('name'))
+    dump = request.args.get('dump')
+    if dump:
+        paths = [p for p in paths if os.path.basename(p) == dump]
+        if not paths:
+            return jsonify({"status": "error", "message": f"unknown dump: {dump}"}), 404
+    try:
+        return jsonify(profiler.summary(paths, limit=int(request.args.get('limit', 20)),
+                                        sort=request.args.get('sort', 'cumulative')))
+    except ValueError as e:
+        return jsonify({"status": "error", "message": str(e)}), 400
 
 if __name__ == '__main__':
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark per-image inference latency of the torch and ONNX Runtime backends
+"""
+
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+import cv2
+
+from inference_engine import BACKENDS, DEFAULT_MODEL_PATH, InferenceEngine
+
+SAMPLE_IMAGES = ["bus.jpg", "new.jpeg", "mew1.jpg", "detect.jpg", "detect2.jpg", "detect3.jpeg",
+                 "OIP.jpeg", "oip2.jpg"]
+
+
+def percentile(values, q):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+
+def bench_backend(backend, images, model_path=DEFAULT_MODEL_PATH, repeats=10, warmup=2, confidence=0.25):
+    """Load the model on backend and time repeats predictions per image (decoded arrays)"""
+    engine = InferenceEngine(backend=backend)
+    path = engine.resolve_model_path(model_path)
+    start = time.perf_counter()
+    engine.get_model(model_path)
+    load_time = time.perf_counter() - start
+
+    first = next(iter(images.values()))
+    for _ in range(warmup):
+        engine.predict(first, confidence=confidence, model_path=model_path, verbose=False)
+
+    per_image = {}
+    all_latencies = []
+    for name, img in images.items():
+        latencies = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            engine.predict(img, confidence=confidence, model_path=model_path, verbose=False)
+            latencies.append((time.perf_counter() - start) * 1000)
+        all_latencies.extend(latencies)
+        per_image[name] = {"median_ms": round(statistics.median(latencies), 2),
+                           "p90_ms": round(percentile(latencies, 0.9), 2)}
+    return {
+        "backend": backend,
+        "model": path,
+        "load_time_s": round(load_time, 3),
+        "median_ms": round(statistics.median(all_latencies), 2),
+        "p90_ms": round(percentile(all_latencies, 0.9), 2),
+        "mean_ms": round(statistics.mean(all_latencies), 2),
+        "images": per_image,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare per-image latency across inference backends")
+    parser.add_argument("images", nargs="*", default=SAMPLE_IMAGES)
+    parser.add_argument("--backends", nargs="+", choices=BACKENDS, default=list(BACKENDS))
+    parser.add_argument("--weights", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--repeats", type=int, default=10)
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--json", dest="json_out", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    images = {os.path.basename(p): cv2.imread(p) for p in args.images if os.path.exists(p)}
+    images = {name: img for name, img in images.items() if img is not None}
+    if not images:
+        print("❌ No readable images")
+        return 1
+
+    results = []
+    for backend in args.backends:
+        print(f"🏁 {backend}: {len(images)} image(s) x {args.repeats}")
+        report = bench_backend(backend, images, args.weights, repeats=args.repeats, warmup=args.warmup)
+        results.append(report)
+        print(f"   {report['model']}: load {report['load_time_s']:.2f}s, median {report['median_ms']:.1f} ms, "
+              f"p90 {report['p90_ms']:.1f} ms")
+        for name, stats in report["images"].items():
+            print(f"   - {name}: {stats['median_ms']:.1f} ms (p90 {stats['p90_ms']:.1f} ms)")
+
+    if len(results) > 1:
+        base = results[0]
+        for other in results[1:]:
+            print(f"📊 {other['backend']} vs {base['backend']}: "
+                  f"{base['median_ms'] / other['median_ms']:.2f}x median speedup")
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
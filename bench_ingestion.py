@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+"""
+Benchmark /detect ingestion: one event per call vs. /detect/batch bulk writes
+"""
+
+import argparse
+import datetime
+import os
+import random
+import sys
+import time
+
+from db_schema import ensure_indexes
+from ingestion import IngestionService
+from notifications import MockTransport, NotificationDispatcher
+from owner_resolver import OwnerResolver
+from plate_index import PlateIndex
+from rule_index import RuleIndex
+
+COLLECTIONS = ["owners", "vehicles", "rules", "violations", "challans", "manual_reviews",
+               "notification_outbox", "meta"]
+
+
+def seed(db, vehicles):
+    for name in COLLECTIONS:
+        db[name].delete_many({})
+    ensure_indexes(db)
+    db.owners.insert_many([{"owner_id": f"OWN{i:05d}", "name": f"Owner {i}", "phone": f"+9190000{i:05d}"}
+                           for i in range(vehicles)])
+    db.vehicles.insert_many([{"vehicle_no": f"MH{i % 50:02d}AB{i:04d}", "owner_id": f"OWN{i:05d}"}
+                             for i in range(vehicles)])
+    db.rules.insert_many([
+        {"rule_id": "no_helmet_riding", "violation_class": "NoHelmet", "min_confidence": 0.45,
+         "penalty": 500, "active": True},
+        {"rule_id": "triple_riding", "violation_class": "TripleRiding", "min_confidence": 0.5,
+         "penalty": 1000, "active": True},
+    ])
+
+
+def make_events(count, vehicles):
+    """A realistic mix: challans, manual reviews and detections with no rule hit"""
+    rng = random.Random(42)
+    start = datetime.datetime(2025, 10, 28, 18, 0, 0)
+    events = []
+    for n in range(count):
+        roll = rng.random()
+        i = rng.randrange(vehicles)
+        vehicle_no = f"MH{i % 50:02d}AB{i:04d}" if roll < 0.8 else f"XX{rng.randrange(99):02d}ZZ{i:04d}"
+        cls = "NoHelmet" if roll < 0.9 else "Helmet"
+        # distinct timestamps, or the idempotency key would fold repeats together
+        timestamp = (start + datetime.timedelta(seconds=n)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        events.append({"source": "bench", "timestamp": timestamp,
+                       "detection": {"detections": [{"class": cls, "confidence": 0.9}]},
+                       "vehicle_no": vehicle_no, "image_path": "outputs/bench.jpg"})
+    return events
+
+
+def build_service(db):
+    notifier = NotificationDispatcher(db, {"sms": MockTransport()}, autostart=False)
+    return IngestionService(db, RuleIndex(db), OwnerResolver(db), notifier, PlateIndex(db=db))
+
+
+def run(db, events, vehicles, batch_size):
+    """events/sec for single ingestion, then for batches of batch_size"""
+    rates = {}
+    for mode in ("single", "batch"):
+        seed(db, vehicles)
+        service = build_service(db)
+        start = time.perf_counter()
+        if mode == "single":
+            for event in events:
+                service.ingest(event)
+        else:
+            for i in range(0, len(events), batch_size):
+                service.ingest_batch(events[i:i + batch_size])
+        elapsed = time.perf_counter() - start
+        rates[mode] = len(events) / elapsed
+        print(f"⏱️  {mode:6s}: {len(events)} events in {elapsed:.2f}s ({rates[mode]:.0f} events/sec)")
+    return rates
+
+
+def main(argv=None):
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Compare single vs. batch /detect ingestion throughput")
+    parser.add_argument("--uri", default=None, help="MongoDB URI (default: MONGO_URI)")
+    parser.add_argument("--db", default="echallan_bench", help="scratch database; its collections are wiped")
+    parser.add_argument("--events", type=int, default=2000)
+    parser.add_argument("--batch-size", type=int, default=200)
+    parser.add_argument("--vehicles", type=int, default=1000)
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(args.uri or os.getenv('MONGO_URI'))[args.db]
+    rates = run(db, make_events(args.events, args.vehicles), args.vehicles, args.batch_size)
+    print(f"🚀 Batch speedup: {rates['batch'] / rates['single']:.1f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
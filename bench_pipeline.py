@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+Per-stage latency benchmark of the detection pipeline, written as JSON
+
+Stages: model load, inference, plate OCR, annotated image save and /detect
+ingestion. Each reports a cold figure (first call in a fresh object) and
+warm median/p90 over --repeats further calls, so runs can be diffed across
+commits.
+"""
+
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import cv2
+
+from bench_backends import SAMPLE_IMAGES, percentile
+from inference_engine import DEFAULT_MODEL_PATH, InferenceEngine
+
+STAGES = ("model_load", "inference", "ocr", "annotation", "ingestion")
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    value = fn(*args, **kwargs)
+    return (time.perf_counter() - start) * 1000, value
+
+
+def summarize(cold_ms, warm_ms):
+    summary = {"cold_ms": round(cold_ms, 3), "samples": len(warm_ms)}
+    if warm_ms:
+        summary["warm_median_ms"] = round(statistics.median(warm_ms), 3)
+        summary["warm_p90_ms"] = round(percentile(warm_ms, 0.9), 3)
+    return summary
+
+
+def bench_model_load(ctx, repeats):
+    engine = InferenceEngine(backend=ctx["backend"])
+    cold, _ = timed(engine.get_model, ctx["weights"])
+    warm = [timed(engine.get_model, ctx["weights"])[0] for _ in range(repeats)]
+    ctx["engine"] = engine
+    return {"model_load": summarize(cold, warm)}
+
+
+def bench_inference(ctx, repeats):
+    engine = ctx.get("engine") or InferenceEngine(backend=ctx["backend"])
+    engine.get_model(ctx["weights"])
+    cold = None
+    warm, per_image, results = [], {}, {}
+    for name, img in ctx["images"].items():
+        first, predicted = timed(engine.predict, img, confidence=ctx["confidence"], model_path=ctx["weights"],
+                                 verbose=False)
+        cold = first if cold is None else cold
+        samples = [timed(engine.predict, img, confidence=ctx["confidence"], model_path=ctx["weights"],
+                         verbose=False)[0] for _ in range(repeats)]
+        warm.extend(samples)
+        per_image[name] = summarize(first, samples)
+        results[name] = predicted[0]
+    ctx["engine"] = engine
+    ctx["results"] = results
+    return {"inference": dict(summarize(cold, warm), images=per_image)}
+
+
+def _plate_crops(ctx):
+    """Detected plate crops, or the lower third of each image when none are found"""
+    from detect_module import PLATE_CLASSES
+
+    crops = []
+    for name, img in ctx["images"].items():
+        result = ctx.get("results", {}).get(name)
+        if result is not None and result.boxes is not None:
+            for box in result.boxes:
+                if result.names[int(box.cls.item())].lower() in PLATE_CLASSES:
+                    x1, y1, x2, y2 = box.xyxy[0].cpu().numpy().astype(int)
+                    crops.append(img[max(0, y1):y2, max(0, x1):x2])
+    if not crops:
+        crops = [img[img.shape[0] * 2 // 3:, :] for img in ctx["images"].values()]
+    return [c for c in crops if c.size]
+
+
+def bench_ocr(ctx, repeats):
+    from plate_ocr import PlateOCR
+
+    engine = ctx.get("engine") or InferenceEngine(backend=ctx["backend"])
+    load_cold, reader = timed(engine.get_reader)
+    load_warm = [timed(engine.get_reader)[0] for _ in range(repeats)]
+
+    # cache_size=0 so warm calls measure recognition, not the phash cache
+    plate_ocr = PlateOCR(reader, cache_size=0)
+    crops = _plate_crops(ctx)
+    cold, _ = timed(plate_ocr.read_many, crops)
+    warm = [timed(plate_ocr.read_many, crops)[0] for _ in range(repeats)]
+    return {"ocr_load": summarize(load_cold, load_warm),
+            "ocr": dict(summarize(cold, warm), crops=len(crops))}
+
+
+def bench_annotation(ctx, repeats):
+    """Critical-path enqueue vs. background render + encode + write"""
+    from image_store import ImageStore
+
+    store = ImageStore(fmt=ctx["image_format"], quality=ctx["image_quality"])
+    results = ctx.get("results") or {}
+    if not results:
+        raise RuntimeError("needs the inference stage")
+    enqueue, write = [], []
+    for _ in range(repeats + 1):
+        # Fresh directory each round, or content addressing would skip the writes
+        directory = tempfile.mkdtemp(prefix="bench_annotation_")
+        try:
+            for result in results.values():
+                enqueue.append(timed(store.save_result, result, directory)[0])
+                write.append(timed(store.flush)[0])
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+    n = len(results)
+    return {"annotation_enqueue": summarize(enqueue[0], enqueue[n:]),
+            "annotation_write": summarize(write[0], write[n:])}
+
+
+def _ingestion_db(mongo_uri):
+    if mongo_uri:
+        from pymongo import MongoClient
+
+        return MongoClient(mongo_uri)["echallan_bench"], "mongodb"
+    import mongomock
+
+    return mongomock.MongoClient()["echallan_bench"], "mongomock"
+
+
+def bench_ingestion(ctx, repeats):
+    from bench_ingestion import build_service, seed
+
+    db, store = _ingestion_db(ctx["mongo_uri"])
+    seed(db, 100)
+    start = datetime.datetime(2025, 10, 28, 18, 0, 0)
+
+    def payload(i, cls):
+        # Distinct timestamps so the idempotency key never folds calls together
+        timestamp = (start + datetime.timedelta(seconds=i)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return {"source": "bench", "timestamp": timestamp, "vehicle_no": "MH01AB0001",
+                "detection": {"detections": [{"class": cls, "confidence": 0.9}]}, "image_path": "outputs/x.jpg"}
+
+    report = {}
+    for stage, cls, offset in (("ingestion", "NoHelmet", 0), ("ingestion_no_rule", "Helmet", 100000)):
+        service = build_service(db)
+        cold, _ = timed(service.ingest, payload(offset, cls))
+        warm = [timed(service.ingest, payload(offset + i + 1, cls))[0] for i in range(repeats)]
+        report[stage] = dict(summarize(cold, warm), store=store)
+    return report
+
+
+BENCHES = {
+    "model_load": bench_model_load,
+    "inference": bench_inference,
+    "ocr": bench_ocr,
+    "annotation": bench_annotation,
+    "ingestion": bench_ingestion,
+}
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def run(stages=STAGES, image_paths=SAMPLE_IMAGES, repeats=5, backend="torch", weights=DEFAULT_MODEL_PATH,
+        confidence=0.25, mongo_uri=None, image_format="jpg", image_quality=90):
+    """Run the selected stages in order; a stage that cannot run is recorded as skipped"""
+    images = {os.path.basename(p): cv2.imread(p) for p in image_paths if os.path.exists(p)}
+    ctx = {
+        "images": {name: img for name, img in images.items() if img is not None},
+        "backend": backend,
+        "weights": weights,
+        "confidence": confidence,
+        "mongo_uri": mongo_uri,
+        "image_format": image_format,
+        "image_quality": image_quality,
+    }
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.datetime.utcnow().isoformat() + "Z",
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "backend": backend,
+            "repeats": repeats,
+            "images": sorted(ctx["images"]),
+        },
+        "stages": {},
+    }
+    for stage in stages:
+        try:
+            report["stages"].update(BENCHES[stage](ctx, repeats))
+        except Exception as e:
+            report["stages"][stage] = {"skipped": f"{type(e).__name__}: {e}"}
+    return report
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Per-stage pipeline latency benchmark (JSON output)")
+    parser.add_argument("images", nargs="*", default=SAMPLE_IMAGES)
+    parser.add_argument("--stages", nargs="+", choices=STAGES, default=list(STAGES))
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--backend", default=os.getenv("INFERENCE_BACKEND", "torch"))
+    parser.add_argument("--weights", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--confidence", type=float, default=0.25)
+    parser.add_argument("--mongo-uri", default=None, help="benchmark ingestion against this MongoDB "
+                                                          "(default: in-memory mongomock)")
+    parser.add_argument("--image-format", default="jpg")
+    parser.add_argument("--image-quality", type=int, default=90)
+    parser.add_argument("--output", "-o", help="write the JSON report here instead of stdout")
+    args = parser.parse_args(argv)
+
+    report = run(args.stages, args.images, args.repeats, args.backend, args.weights, args.confidence,
+                 args.mongo_uri, args.image_format, args.image_quality)
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text + "\n")
+        for name, stage in report["stages"].items():
+            if "skipped" in stage:
+                print(f"⏭️  {name}: skipped ({stage['skipped']})")
+            else:
+                print(f"⏱️  {name}: cold {stage['cold_ms']:.1f} ms, warm {stage.get('warm_median_ms', 0):.1f} ms")
+        print(f"✅ Report written to {args.output}")
+    else:
+        print(text)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
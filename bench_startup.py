@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+Measure web-tier startup: time to import app, peak RSS, and which heavy ML
+modules got loaded, in a fresh interpreter per run
+
+Modes:
+  web        WEB_ONLY=1, import app only
+  full       import app as an inference worker would start
+  inference  full, then load the model and OCR reader (first-use cost)
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+HEAVY_MODULES = ("torch", "ultralytics", "easyocr", "cv2", "numpy")
+MODES = ("web", "full", "inference")
+
+PROBE = """
+import json, resource, sys, time
+start = time.perf_counter()
+import app
+report = {"import_s": time.perf_counter() - start}
+if %(load_models)r:
+    from inference_engine import get_engine
+    start = time.perf_counter()
+    engine = get_engine()
+    try:
+        engine.get_model()
+        engine.get_plate_ocr()
+        report["model_load_s"] = time.perf_counter() - start
+    except ImportError as e:
+        report["model_load_error"] = str(e)
+report["max_rss_mb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+report["heavy_modules"] = [m for m in %(heavy)r if m in sys.modules]
+print(json.dumps(report))
+"""
+
+
+def probe(mode, repo_dir):
+    """One fresh interpreter; returns its report dict"""
+    env = dict(os.environ, PYTHONPATH=repo_dir, ENSURE_INDEXES="0")
+    env["WEB_ONLY"] = "1" if mode == "web" else "0"
+    code = PROBE % {"load_models": mode == "inference", "heavy": HEAVY_MODULES}
+    # app creates uploads/ in the working directory; keep it out of the repo
+    with tempfile.TemporaryDirectory() as cwd:
+        for name in ("runs", "yolov8n.pt"):      # weights are looked up relative to cwd
+            if os.path.exists(os.path.join(repo_dir, name)):
+                os.symlink(os.path.join(repo_dir, name), os.path.join(cwd, name))
+        out = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True, text=True,
+                             check=True).stdout
+    return json.loads(out.strip().splitlines()[-1])
+
+
+def bench_mode(mode, repo_dir, runs=3):
+    reports = [probe(mode, repo_dir) for _ in range(runs)]
+    summary = {
+        "import_s": round(statistics.median(r["import_s"] for r in reports), 4),
+        "max_rss_mb": round(statistics.median(r["max_rss_mb"] for r in reports), 1),
+        "heavy_modules": reports[-1]["heavy_modules"],
+    }
+    loads = [r["model_load_s"] for r in reports if "model_load_s" in r]
+    if loads:
+        summary["model_load_s"] = round(statistics.median(loads), 4)
+    if "model_load_error" in reports[-1]:
+        summary["model_load_error"] = reports[-1]["model_load_error"]
+    return summary
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure app startup time and memory per deployment mode")
+    parser.add_argument("--modes", nargs="+", choices=MODES, default=list(MODES))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--json", dest="json_out", help="write the results to this file")
+    args = parser.parse_args(argv)
+
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    results = {}
+    for mode in args.modes:
+        results[mode] = report = bench_mode(mode, repo_dir, args.runs)
+        heavy = ", ".join(report["heavy_modules"]) or "none"
+        line = f"🚀 {mode}: import {report['import_s'] * 1000:.0f} ms, RSS {report['max_rss_mb']:.0f} MB, heavy: {heavy}"
+        if "model_load_s" in report:
+            line += f", model + OCR load {report['model_load_s']:.2f}s"
+        elif "model_load_error" in report:
+            line += f" (models not loaded: {report['model_load_error']})"
+        print(line)
+
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,248 @@
+import collections
+import os
+import queue
+import threading
+import time
+
+import cv2
+
+from notifications import RateLimiter
+
+_SENTINEL = object()
+
+
+class VideoSource:
+    """One camera feed or video file read by its own decode thread
+
+    Decoded frames land in a small buffer of buffer_size. With realtime=True
+    (camera semantics) a full buffer drops its oldest frame, so the scheduler
+    always sees fresh frames and a slow model shows up as drops, not as
+    growing lag; local files are replayed at their native frame rate. With
+    realtime=False the reader waits for space instead and nothing is dropped.
+    """
+
+    def __init__(self, name, uri, fps_budget=5.0, buffer_size=2, realtime=True, capture_factory=cv2.VideoCapture):
+        self.name = name
+        self.uri = uri
+        self.fps_budget = fps_budget
+        self.buffer_size = buffer_size
+        self.realtime = realtime
+        self.capture_factory = capture_factory
+        self.budget = RateLimiter(fps_budget, burst=1) if fps_budget else None
+        self._buffer = collections.deque()
+        self.finished = False
+        self.error = None
+        self.stats = {"frames_read": 0, "processed": 0, "dropped": 0, "handler_errors": 0, "lag_total": 0.0,
+                      "lag_max": 0.0}
+
+    def _pace_interval(self, cap):
+        # Cameras pace themselves; replayed files are slowed to their native rate
+        if not self.realtime or not os.path.exists(str(self.uri)):
+            return 0.0
+        fps = cap.get(cv2.CAP_PROP_FPS) or 25.0
+        return 1.0 / fps
+
+    def read_loop(self, cond, stop):
+        cap = self.capture_factory(self.uri)
+        try:
+            if not cap.isOpened():
+                raise IOError(f"could not open video source {self.uri}")
+            interval = self._pace_interval(cap)
+            next_frame = time.monotonic()
+            index = 0
+            while not stop.is_set():
+                ret, frame = cap.read()
+                if not ret:
+                    break
+                with cond:
+                    if self.realtime:
+                        if len(self._buffer) >= self.buffer_size:
+                            self._buffer.popleft()
+                            self.stats["dropped"] += 1
+                    else:
+                        cond.wait_for(lambda: len(self._buffer) < self.buffer_size or stop.is_set())
+                    self._buffer.append((index, time.monotonic(), frame))
+                    self.stats["frames_read"] += 1
+                    cond.notify_all()
+                index += 1
+                if interval:
+                    next_frame += interval
+                    time.sleep(max(0.0, next_frame - time.monotonic()))
+        except Exception as e:
+            self.error = e
+        finally:
+            cap.release()
+            with cond:
+                self.finished = True
+                cond.notify_all()
+
+    def done(self):
+        return self.finished and not self._buffer
+
+    def take(self):
+        """Oldest buffered frame if the FPS budget allows one now, else None"""
+        if not self._buffer or (self.budget is not None and not self.budget.try_acquire()):
+            return None
+        return self._buffer.popleft()
+
+    def record(self, lag):
+        self.stats["processed"] += 1
+        self.stats["lag_total"] += lag
+        self.stats["lag_max"] = max(self.stats["lag_max"], lag)
+
+    def report(self, wall_time):
+        stats = self.stats
+        return {
+            "source": self.name,
+            "uri": str(self.uri),
+            "fps_budget": self.fps_budget,
+            "frames_read": stats["frames_read"],
+            "processed": stats["processed"],
+            "dropped": stats["dropped"],
+            "handler_errors": stats["handler_errors"],
+            "fps": round(stats["processed"] / wall_time, 2) if wall_time > 0 else 0.0,
+            "mean_lag": round(stats["lag_total"] / stats["processed"], 4) if stats["processed"] else 0.0,
+            "max_lag": round(stats["lag_max"], 4),
+            "error": str(self.error) if self.error else None,
+        }
+
+
+class CameraScheduler:
+    """Time-slice one model across many video sources
+
+    Each round visits the sources round-robin, starting one place further on
+    every batch, and takes at most one frame per source, so a busy feed can
+    never starve the others. A source is skipped while its FPS budget (a
+    token bucket) is spent. Frames from different sources are batched into
+    a single infer(frames) call, which must return one result per frame.
+
+    Results are handed to on_result(source_name, frame_index, frame, result)
+    on a separate dispatch thread behind a bounded queue of queue_size. The
+    model only runs ahead of on_result by that queue, so on_result must be
+    quick: blocking work (HTTP calls, alerts) belongs on its own thread. An
+    exception from on_result is logged and counted in that source's
+    handler_errors; it does not stop the other feeds.
+    """
+
+    def __init__(self, infer, batch_size=8, on_result=None, queue_size=16):
+        self.infer = infer
+        self.batch_size = batch_size
+        self.on_result = on_result
+        self.queue_size = queue_size
+        self.sources = []
+        self._cond = threading.Condition()
+        self._stop = threading.Event()
+        self._next = 0
+        self.stats = {"batches": 0, "frames": 0, "inference_time": 0.0}
+
+    def add_source(self, name, uri, fps_budget=5.0, buffer_size=2, realtime=True, capture_factory=cv2.VideoCapture):
+        source = VideoSource(name, uri, fps_budget=fps_budget, buffer_size=buffer_size, realtime=realtime,
+                             capture_factory=capture_factory)
+        self.sources.append(source)
+        return source
+
+    def stop(self):
+        self._stop.set()
+        with self._cond:
+            self._cond.notify_all()
+
+    def _next_batch(self):
+        """Round-robin up to batch_size frames from sources within budget"""
+        batch = []
+        n = len(self.sources)
+        with self._cond:
+            while len(batch) < self.batch_size:
+                took = False
+                for offset in range(n):
+                    source = self.sources[(self._next + offset) % n]
+                    item = source.take()
+                    if item is not None:
+                        batch.append((source, item))
+                        took = True
+                        if len(batch) == self.batch_size:
+                            break
+                if not took:
+                    break
+            self._next = (self._next + 1) % n
+            if batch:
+                # Readers waiting on a full buffer (realtime=False) can go on
+                self._cond.notify_all()
+        return batch
+
+    def _dispatch(self, results):
+        while True:
+            item = results.get()
+            if item is _SENTINEL:
+                break
+            source, index, frame, result = item
+            try:
+                self.on_result(source.name, index, frame, result)
+            except Exception as e:
+                source.stats["handler_errors"] += 1
+                print(f"⚠️  [{source.name}] Result handler failed on frame {index}: {type(e).__name__}: {e}")
+
+    def run(self, duration=None):
+        """Process every source until all end, stop() is called or duration passes
+
+        Returns a report with batch statistics and, per source, frames read,
+        processed and dropped, achieved FPS and capture-to-result lag.
+        """
+        if not self.sources:
+            raise ValueError("no video sources added")
+        self._stop.clear()
+        results = queue.Queue(maxsize=self.queue_size)
+        readers = [threading.Thread(target=s.read_loop, args=(self._cond, self._stop), daemon=True,
+                                    name=f"camera-{s.name}") for s in self.sources]
+        dispatcher = None
+        if self.on_result is not None:
+            dispatcher = threading.Thread(target=self._dispatch, args=(results,), daemon=True,
+                                          name="camera-dispatch")
+            dispatcher.start()
+
+        start = time.perf_counter()
+        deadline = time.monotonic() + duration if duration else None
+        for t in readers:
+            t.start()
+        try:
+            while not self._stop.is_set():
+                if deadline is not None and time.monotonic() >= deadline:
+                    break
+                batch = self._next_batch()
+                if not batch:
+                    with self._cond:
+                        if all(s.done() for s in self.sources):
+                            break
+                        # Nothing ready or every ready source is over budget
+                        self._cond.wait(timeout=0.005)
+                    continue
+
+                infer_start = time.perf_counter()
+                outputs = self.infer([frame for _, (_, _, frame) in batch])
+                self.stats["inference_time"] += time.perf_counter() - infer_start
+                self.stats["batches"] += 1
+                self.stats["frames"] += len(batch)
+
+                now = time.monotonic()
+                for (source, (index, captured, frame)), result in zip(batch, outputs):
+                    source.record(now - captured)
+                    if dispatcher is not None:
+                        results.put((source, index, frame, result))
+        finally:
+            self.stop()
+            for t in readers:
+                # A stalled network stream may never return from read()
+                t.join(timeout=5)
+            if dispatcher is not None:
+                results.put(_SENTINEL)
+                dispatcher.join()
+        wall_time = time.perf_counter() - start
+
+        batches = self.stats["batches"]
+        return {
+            "wall_time": round(wall_time, 4),
+            "batches": batches,
+            "frames": self.stats["frames"],
+            "avg_batch_size": round(self.stats["frames"] / batches, 2) if batches else 0.0,
+            "inference_time": round(self.stats["inference_time"], 4),
+            "sources": [s.report(wall_time) for s in self.sources],
+        }
@@ -0,0 +1,155 @@
+import datetime
+import sys
+
+from pymongo import ASCENDING, DESCENDING
+
+# collection -> list of (keys, options)
+INDEXES = {
+    "vehicles": [
+        ([("vehicle_no", ASCENDING)], {"unique": True}),                # also the /data keyset sort
+        ([("owner_id", ASCENDING)], {}),
+    ],
+    "owners": [
+        ([("owner_id", ASCENDING)], {"unique": True}),                  # also the /data keyset sort
+    ],
+    "rules": [
+        # active first so the RuleIndex load ({"active": True}) uses it too
+        ([("active", ASCENDING), ("violation_class", ASCENDING)], {}),
+    ],
+    "challans": [
+        ([("challan_no", ASCENDING)], {"unique": True}),
+        # IngestionService dedupes retried detector payloads on this key
+        ([("idempotency_key", ASCENDING)], {"unique": True, "sparse": True}),
+        ([("issued_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("status", ASCENDING), ("issued_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("vehicle_no", ASCENDING), ("issued_at", DESCENDING), ("_id", DESCENDING)], {}),
+    ],
+    "violations": [
+        ([("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("vehicle_no", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("source", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("idempotency_key", ASCENDING)], {"unique": True, "sparse": True}),
+    ],
+    "manual_reviews": [
+        ([("idempotency_key", ASCENDING)], {"unique": True, "sparse": True}),
+    ],
+    "notification_outbox": [
+        ([("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+        ([("status", ASCENDING), ("claimed_at", ASCENDING)], {}),
+    ],
+}
+
+
+def hot_queries():
+    """The queries the web app issues on every request, as explainable find commands"""
+    now = datetime.datetime.utcnow()
+    desc = [("_id", -1)]
+    return [
+        ("vehicles", {"vehicle_no": {"$in": ["MH01AB1234"]}}, None),      # OwnerResolver $match
+        ("owners", {"owner_id": "OWN001"}, None),                         # OwnerResolver $lookup
+        ("rules", {"active": True}, None),                                # RuleIndex load
+        ("rules", {"violation_class": "NoHelmet", "active": True}, None),
+        ("challans", {"challan_no": "CH0"}, None),                        # /upload result lookup
+        ("challans", {"idempotency_key": "0" * 64}, None),                # ingestion retry lookup
+        ("challans", {}, [("issued_at", -1)] + desc),                     # /data, /api/challans
+        ("challans", {"status": "issued"}, [("issued_at", -1)] + desc),
+        ("challans", {"vehicle_no": "MH01AB1234"}, [("issued_at", -1)] + desc),
+        ("violations", {}, [("timestamp", -1)] + desc),                   # /data, /api/violations
+        ("violations", {"vehicle_no": "MH01AB1234"}, [("timestamp", -1)] + desc),
+        ("owners", {}, [("owner_id", 1)]),                               # /data, /api/owners
+        ("vehicles", {}, [("vehicle_no", 1)]),
+        ("notification_outbox", {"$or": [                                 # NotificationDispatcher claim
+            {"status": "pending", "next_attempt_at": {"$lte": now}},
+            {"status": "sending", "claimed_at": {"$lte": now}},
+        ]}, [("next_attempt_at", 1)]),
+    ]
+
+
+def ensure_indexes(db):
+    """Create every index the app relies on; safe to run repeatedly"""
+    created = []
+    for collection, specs in INDEXES.items():
+        for keys, options in specs:
+            created.append(db[collection].create_index(keys, **options))
+    return created
+
+
+def _stages(plan):
+    yield plan.get("stage")
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _stages(plan[key])
+    for child in plan.get("inputStages", []):
+        yield from _stages(child)
+
+
+def explain(db, collection, query, sort=None):
+    """Return the winning plan of a find command"""
+    command = {"find": collection, "filter": query}
+    if sort:
+        command["sort"] = dict(sort)
+    result = db.command("explain", command, verbosity="queryPlanner")
+    return result["queryPlanner"]["winningPlan"]
+
+
+def redundant_indexes(indexes=INDEXES):
+    """(collection, keys) of indexes that only extend a unique index's keys
+
+    The unique prefix already fixes the order, so such an index serves no
+    query or sort the unique one cannot and only costs writes and RAM.
+    """
+    redundant = []
+    for collection, specs in indexes.items():
+        unique = [keys for keys, options in specs if options.get("unique")]
+        for keys, options in specs:
+            if any(len(keys) > len(u) and keys[:len(u)] == u for u in unique):
+                redundant.append((collection, keys))
+    return redundant
+
+
+def verify_query_plans(db):
+    """Return a list of (collection, query, sort) hot queries that do a
+    collection scan or, for a sorted query without $or, sort in memory
+
+    Keyset pages must read their order off an index; an $or is planned per
+    branch, so its sort may legitimately be a merge in memory.
+    """
+    scans = []
+    for collection, query, sort in hot_queries():
+        stages = set(_stages(explain(db, collection, query, sort)))
+        if "COLLSCAN" in stages or (sort and "$or" not in query and "SORT" in stages):
+            scans.append((collection, query, sort))
+    return scans
+
+
+def main(argv=None):
+    import argparse
+    import os
+    from dotenv import load_dotenv
+    from pymongo import MongoClient
+
+    parser = argparse.ArgumentParser(description="Create echallan indexes and check query plans")
+    parser.add_argument("--uri", default=None, help="MongoDB URI (default: MONGO_URI)")
+    parser.add_argument("--db", default="echallan")
+    parser.add_argument("--verify", action="store_true", help="fail if a hot query does a collection scan")
+    args = parser.parse_args(argv)
+
+    load_dotenv()
+    db = MongoClient(args.uri or os.getenv('MONGO_URI'))[args.db]
+    names = ensure_indexes(db)
+    print(f"✅ Ensured {len(names)} indexes")
+
+    if args.verify:
+        scans = verify_query_plans(db)
+        for collection, query, sort in scans:
+            print(f"❌ Collection scan or in-memory sort on {collection}: filter={query} sort={sort}")
+        for collection, keys in redundant_indexes():
+            print(f"❌ Redundant index on {collection}: {keys} extends a unique index")
+        if scans or redundant_indexes():
+            return 1
+        print("✅ No hot query does a collection scan or an in-memory sort")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,62 +1,237 @@
-from ultralytics import YOLO
 import cv2
 import os
 from pathlib import Path
-import easyocr
+import queue
 import requests
+import threading
 import time
 from datetime import datetime
 from pymongo import MongoClient
-
-
-def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confidence=0.25):
-    """Detect helmets in images or videos using trained YOLO model"""
+from image_store import get_image_store
+from inference_engine import get_engine
+from video_pipeline import run_video_pipeline
+from camera_scheduler import CameraScheduler
+from tracker import IoUTracker
+from plate_voting import PlateTrackAggregator
+from profiler import profiled
+
+VIOLATION_CLASSES = ["nohelmet", "without_helmet", "no_helmet"]
+PLATE_CLASSES = ["vehicle_registration_plate", "license_plate", "number_plate"]
+# A track must be seen this many times before it can raise a violation
+MIN_TRACK_HITS = 2
+
+
+def _boxes_to_detections(result):
+    """Convert YOLO boxes to detection dicts with pixel bboxes"""
+    detections = []
+    if result.boxes is None:
+        return detections
+    for box in result.boxes:
+        cls = int(box.cls.item())
+        detections.append({
+            "class": result.names[cls],
+            "confidence": box.conf.item(),
+            "bbox": [float(v) for v in box.xyxy[0].tolist()]
+        })
+    return detections
+
+
+def send_detection_to_flask(detection_data, vehicle_no=None, source="camera_1"):
+    payload = {
+        "source": source,
+        "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        "detection": detection_data,
+        "vehicle_no": vehicle_no,
+        "image_path": detection_data.get('image_path')
+    }
+    try:
+        r = requests.post("http://localhost:5000/detect", json=payload, timeout=5)
+        print(f"📤 Sent detection to Flask: {r.json()}")
+    except Exception as e:
+        print(f"❌ Failed to send to Flask: {e}")
+
+
+class DetectionSender:
+    """Posts violation events to /detect from a background thread
+
+    Events are raised on the camera scheduler's dispatch thread; posting
+    there would make every slow or unreachable /detect call back up the
+    results queue and stall the shared model for all cameras. send()
+    only queues; when queue_size events are already waiting the event is
+    dropped and counted rather than blocking.
+    """
+
+    def __init__(self, queue_size=1000):
+        self._queue = queue.Queue(maxsize=queue_size)
+        self.stats = {"queued": 0, "sent": 0, "dropped": 0}
+        self._thread = threading.Thread(target=self._work, name="detection-sender", daemon=True)
+        self._thread.start()
+
+    def send(self, detection_data, vehicle_no=None, source="camera_1"):
+        try:
+            self._queue.put_nowait((detection_data, vehicle_no, source))
+            self.stats["queued"] += 1
+        except queue.Full:
+            self.stats["dropped"] += 1
+            print(f"⚠️  [{source}] Send queue full; dropped violation event")
+
+    def _work(self):
+        while True:
+            item = self._queue.get()
+            try:
+                if item is None:
+                    return
+                send_detection_to_flask(*item)
+                self.stats["sent"] += 1
+            finally:
+                self._queue.task_done()
+
+    def close(self):
+        """Send everything queued, then stop the thread"""
+        self._queue.put(None)
+        self._thread.join()
+
+
+class ViolationTracks:
+    """Per-stream rider and plate tracking; one violation event per rider track
+
+    observe() takes each inferred frame in order. When a rider track showing
+    a violation expires (or at finish()), its best frame is saved, the plate
+    track seen nearest to it is read once from its sharpest crops, and the
+    event is sent to /detect (through send(detection_data, vehicle_no,
+    source=...) when given, e.g. a DetectionSender).
+    """
+
+    def __init__(self, plate_ocr, output_dir, video_path, source="camera_1", frame_stride=1, send=None):
+        self.output_dir = output_dir
+        self.send = send
+        self.video_path = video_path
+        self.source = source
+        self.image_store = get_image_store()
+        # Frame indices count skipped frames too, so keep a track alive for at
+        # least two processed frames whatever the stride
+        self.tracker = IoUTracker(max_age=max(15, 2 * max(1, frame_stride)))
+        self.events = []
+        # Plates are read once per track from its sharpest, largest crops
+        self.plates = PlateTrackAggregator(plate_ocr, top_k=5)
+        self.plate_tracks = {}
+        self.plate_readings = {}
+
+    def plate_for(self, track):
+        """Voted plate reading of the plate track seen nearest to a rider"""
+        overlapping = [p for p in self.plate_tracks.values()
+                       if p.first_frame <= track.last_frame and p.last_frame >= track.first_frame]
+        if not overlapping:
+            return None, None
+        rx = (track.best_bbox[0] + track.best_bbox[2]) / 2
+        ry = (track.best_bbox[1] + track.best_bbox[3]) / 2
+        nearest = min(overlapping, key=lambda p: ((p.bbox[0] + p.bbox[2]) / 2 - rx) ** 2
+                                                 + ((p.bbox[1] + p.bbox[3]) / 2 - ry) ** 2)
+        if nearest.track_id not in self.plate_readings:
+            self.plate_readings[nearest.track_id] = self.plates.read(nearest.track_id)
+        return nearest, self.plate_readings[nearest.track_id]
+
+    def emit(self, track):
+        if track.class_name.lower() not in VIOLATION_CLASSES or track.hits < MIN_TRACK_HITS:
+            return
+        image_path = self.image_store.save_image(track.best_image, self.output_dir)
+        detection_data = {
+            "timestamp": datetime.now().isoformat(),
+            "image_path": image_path,
+            "video_path": self.video_path,
+            "track_id": track.track_id,
+            "detections": [track.as_detection()]
+        }
+        vehicle_no = None
+        plate_track, reading = self.plate_for(track)
+        if plate_track is not None and reading[0]:
+            plate_text, plate_conf, crops_read = reading
+            plate_det = plate_track.as_detection()
+            plate_det.update({"plate_text": plate_text, "plate_confidence": plate_conf, "plate_reads": crops_read})
+            detection_data["detections"].append(plate_det)
+            vehicle_no = plate_text
+        print(f"🔴 [{self.source}] Track {track.track_id}: {track.class_name} over {track.hits} frames "
+              f"(best {track.best_confidence:.2f} at frame {track.best_frame_index}), plate: {vehicle_no or 'N/A'}")
+        (self.send or send_detection_to_flask)(detection_data, vehicle_no, source=self.source)
+        self.events.append(detection_data)
+
+    def observe(self, frame_index, result, annotated_frame=None):
+        """Feed one inferred frame; annotated_frame is rendered on demand if None"""
+        for track, det, improved in self.tracker.update(frame_index, _boxes_to_detections(result)):
+            class_name = track.class_name.lower()
+            if improved and class_name in VIOLATION_CLASSES:
+                if annotated_frame is None:
+                    annotated_frame = result.plot()
+                track.best_image = annotated_frame
+            elif class_name in PLATE_CLASSES:
+                self.plate_tracks[track.track_id] = track
+                x1, y1, x2, y2 = [int(v) for v in det["bbox"]]
+                self.plates.add(track.track_id, result.orig_img[max(0, y1):y2, max(0, x1):x2])
+        for track in self.tracker.expire(frame_index):
+            self.emit(track)
+        self._retire_plates()
+
+    def _retire_plates(self):
+        """Free plate tracks the tracker has aged out, with their crops and readings
+
+        A retired plate is kept while a live rider track overlaps it in time,
+        since that rider's emit() may still pick it; after that nothing can.
+        """
+        live = self.tracker.tracks
+        riders = [t.first_frame for t in live.values() if t.class_name.lower() in VIOLATION_CLASSES]
+        horizon = min(riders) if riders else None
+        retired = [track_id for track_id, plate in self.plate_tracks.items()
+                   if track_id not in live and (horizon is None or plate.last_frame < horizon)]
+        for track_id in retired:
+            del self.plate_tracks[track_id]
+            self.plate_readings.pop(track_id, None)
+            self.plates.discard(track_id)
+
+    def finish(self):
+        for track in self.tracker.flush():
+            self.emit(track)
+        self._retire_plates()
+
+
+@profiled("detect_helmets")
+def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confidence=0.25, frame_stride=1,
+                   backend=None):
+    """Detect helmets in images or videos using trained YOLO model
+
+    For videos, frame_stride=N runs detection on every Nth frame only.
+    backend overrides the engine's default runtime ("torch" or "onnx").
+    """
 
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
-    # Initialize EasyOCR reader
-    reader = easyocr.Reader(['en'])
+    # Shared model and plate OCR, loaded once per process
+    engine = get_engine()
+    plate_ocr = engine.get_plate_ocr()
+    image_store = get_image_store()
 
     # Initialize MongoDB client
     client = MongoClient("mongodb://localhost:27018/")
     db = client["helmet_detection_db"]
     collection = db["detections"]
 
-    # Load the trained model (or use pre-trained if not found)
+    # Trained weights; the engine falls back to pre-trained YOLOv8n if missing
     model_path = "runs/detect/helmet_detection/weights/best.pt"
-    if os.path.exists(model_path):
-        print(f"📱 Loading trained model: {model_path}")
-        model = YOLO(model_path)
-    else:
+    if not os.path.exists(model_path):
         print("⚠️  Trained model not found, using pre-trained YOLOv8n")
-        model = YOLO("yolov8n.pt")
-
-    def send_detection_to_flask(detection_data, vehicle_no=None):
-        payload = {
-            "source": "camera_1",
-            "timestamp": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
-            "detection": detection_data,
-            "vehicle_no": vehicle_no,
-            "image_path": detection_data.get('image_path')
-        }
-        try:
-            r = requests.post("http://localhost:5000/detect", json=payload, timeout=5)
-            print(f"📤 Sent detection to Flask: {r.json()}")
-        except Exception as e:
-            print(f"❌ Failed to send to Flask: {e}")
 
     # Process image
     if image_path:
         print(f"🖼️  Processing image: {image_path}")
 
         img = cv2.imread(image_path)
-        results = model(image_path, conf=confidence)  # Lowered confidence
+        results = engine.predict(image_path, confidence=confidence, model_path=model_path,
+                                 backend=backend)  # Lowered confidence
 
         for i, result in enumerate(results):
-            output_path = os.path.join(output_dir, f"helmet_detection_{Path(image_path).stem}.jpg")
-            result.save(filename=output_path)
-            print(f"✅ Detection saved to: {output_path}")
+            # Rendered and written in the background; the path is final already
+            output_path = image_store.save_result(result, output_dir)
+            print(f"✅ Detection queued for: {output_path}")
 
             detection_data = {
                 "timestamp": datetime.now().isoformat(),
@@ -68,6 +243,7 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
             print(f"🧠 Model classes: {result.names}")
             print(f"📦 Raw detection data:\n{result.boxes.data}")
 
+            plate_jobs = []
             if boxes is not None and len(boxes) > 0:
                 print(f"📊 Found {len(boxes)} objects:")
                 for j, box in enumerate(boxes):
@@ -76,25 +252,17 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
                     class_name = result.names[cls]
                     print(f"   - {class_name}: {conf:.2f} confidence")
 
-                    # OCR if license plate detected
+                    det = {
+                        "class": class_name,
+                        "confidence": conf
+                    }
+                    detection_data["detections"].append(det)
+
+                    # Collect plate crops; OCR runs once for all of them below
                     if class_name.lower() in ["vehicle_registration_plate", "license_plate", "number_plate"]:
                         xyxy = box.xyxy[0].cpu().numpy().astype(int)
                         x1, y1, x2, y2 = xyxy
-                        cropped_plate = img[y1:y2, x1:x2]
-                        ocr_result = reader.readtext(cropped_plate)
-                        plate_text = " ".join([res[1] for res in ocr_result]) if ocr_result else "N/A"
-                        print(f"   🔍 OCR License Plate Text: {plate_text}")
-
-                        detection_data["detections"].append({
-                            "class": class_name,
-                            "confidence": conf,
-                            "plate_text": plate_text
-                        })
-                    else:
-                        detection_data["detections"].append({
-                            "class": class_name,
-                            "confidence": conf
-                        })
+                        plate_jobs.append((det, img[y1:y2, x1:x2]))
 
                     # Detection summary
                     if class_name.lower() in ["helmet"]:
@@ -104,6 +272,13 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
             else:
                 print("❌ No objects detected")
 
+            if plate_jobs:
+                readings = plate_ocr.read_many([crop for _, crop in plate_jobs])
+                for (det, _), (plate_text, ocr_conf) in zip(plate_jobs, readings):
+                    det["plate_text"] = plate_text
+                    det["plate_confidence"] = ocr_conf
+                    print(f"   🔍 OCR License Plate Text: {plate_text}")
+
             # Send detection to Flask
             vehicle_no = None
             for det in detection_data["detections"]:
@@ -124,43 +299,119 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
         frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
         frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
         fps = int(cap.get(cv2.CAP_PROP_FPS))
+        # Only every frame_stride-th frame is kept, so slow the output down to match
+        out_fps = max(1, round(fps / max(1, frame_stride)))
 
         output_video_path = os.path.join(output_dir, f"helmet_detection_{Path(video_path).stem}.mp4")
-        out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), fps, (frame_width, frame_height))
+        out = cv2.VideoWriter(output_video_path, cv2.VideoWriter_fourcc(*'mp4v'), out_fps, (frame_width, frame_height))
 
-        frame_count = 0
-        while cap.isOpened():
-            ret, frame = cap.read()
-            if not ret:
-                break
+        def on_progress(frame_index, frames_written):
+            if frames_written % 30 == 0:
+                print(f"📹 Processed {frames_written} frames...")
 
-            frame_count += 1
-            results = model(frame, conf=confidence)
-            annotated_frame = results[0].plot()
-            out.write(annotated_frame)
+        # One violation event per tracked rider, not per frame
+        violations = ViolationTracks(plate_ocr, output_dir, video_path, frame_stride=frame_stride)
 
-            if frame_count % 30 == 0:
-                print(f"📹 Processed {frame_count} frames...")
+        try:
+            report = run_video_pipeline(
+                cap,
+                infer=lambda frame: engine.predict(frame, confidence=confidence, model_path=model_path,
+                                                   backend=backend)[0],
+                annotate=lambda frame, result: result.plot(),
+                write=out.write,
+                frame_stride=frame_stride,
+                on_progress=on_progress,
+                on_annotated=lambda frame_index, annotated_frame, result:
+                    violations.observe(frame_index, result, annotated_frame),
+            )
+        finally:
+            cap.release()
+            out.release()
+
+        violations.finish()
+        report["violation_events"] = violations.events
+        report["plate_tracks"] = len(violations.plate_tracks)
+        report["plate_ocr_crops"] = violations.plates.ocr_crops
 
-        cap.release()
-        out.release()
         print(f"✅ Video processing completed: {output_video_path}")
+        print(f"⏱️  {report['frames']} frames in {report['wall_time']:.2f}s ({report['fps']:.1f} fps)")
+        for stage in report["stages"]:
+            print(f"   - {stage['stage']}: {stage['items']} items, {stage['items_per_sec']:.1f}/s")
+        return report
 
     else:
         print("❌ Please provide either image_path or video_path")
 
 
-def process_video(video_path, output_dir="outputs"):
+def process_video(video_path, output_dir="outputs", frame_stride=1, backend=None):
     """Process video file for helmet detection"""
-    detect_helmets(video_path=video_path, output_dir=output_dir)
+    return detect_helmets(video_path=video_path, output_dir=output_dir, frame_stride=frame_stride,
+                          backend=backend)
+
 
+def monitor_sources(sources, output_dir="outputs", confidence=0.25, batch_size=8, duration=None,
+                    camera_fps=25.0, backend=None):
+    """Watch many cameras or video files with one shared model
+
+    sources is a list of (name, uri, fps_budget); uri is a local file or
+    anything cv2.VideoCapture opens (RTSP/HTTP). CameraScheduler batches
+    frames from every source through the shared model within each source's
+    FPS budget; each source keeps its own tracks, so violations are raised
+    per camera with the camera name as the /detect source.
+    """
+    os.makedirs(output_dir, exist_ok=True)
 
-def process_image(image_path, output_dir="outputs"):
+    engine = get_engine()
+    plate_ocr = engine.get_plate_ocr()
+    model_path = "runs/detect/helmet_detection/weights/best.pt"
+
+    tracks = {}
+    # /detect is posted off the dispatch thread so it cannot stall inference
+    sender = DetectionSender()
+    scheduler = CameraScheduler(
+        infer=lambda frames: engine.predict(frames, confidence=confidence, model_path=model_path, backend=backend),
+        batch_size=batch_size,
+        on_result=lambda name, frame_index, frame, result: tracks[name].observe(frame_index, result),
+    )
+    for name, uri, fps_budget in sources:
+        scheduler.add_source(name, uri, fps_budget=fps_budget)
+        # At fps_budget of camera_fps, about one frame in this many is inferred
+        stride = max(1, round(camera_fps / fps_budget)) if fps_budget else 1
+        tracks[name] = ViolationTracks(plate_ocr, output_dir, str(uri), source=name, frame_stride=stride,
+                                       send=sender.send)
+
+    print(f"🎥 Monitoring {len(tracks)} source(s), batch size {batch_size}")
+    report = scheduler.run(duration=duration)
+    for violations in tracks.values():
+        violations.finish()
+    sender.close()
+
+    print(f"⏱️  {report['frames']} frames in {report['batches']} batches "
+          f"(avg {report['avg_batch_size']:.1f}) over {report['wall_time']:.2f}s")
+    for source in report["sources"]:
+        source["violation_events"] = len(tracks[source["source"]].events)
+        print(f"   - {source['source']}: {source['processed']}/{source['frames_read']} frames, "
+              f"{source['dropped']} dropped, {source['fps']:.1f} fps, lag {source['mean_lag']:.3f}s "
+              f"(max {source['max_lag']:.3f}s), {source['violation_events']} violation(s)")
+    return report
+
+
+def process_image(image_path, output_dir="outputs", backend=None):
     """Process image file for helmet detection"""
-    detect_helmets(image_path=image_path, output_dir=output_dir)
+    detect_helmets(image_path=image_path, output_dir=output_dir, backend=backend)
 
 
 if __name__ == "__main__":
     print("🎯 Helmet Detection System")
     print("=" * 50)
     detect_helmets(image_path="new.jpeg")
+
+    stats = get_engine().report()
+    print(f"⏱️  Model load: {stats['model_load_time']:.2f}s, OCR load: {stats['ocr_load_time']:.2f}s, "
+          f"inference: {stats['inference_time']:.2f}s over {stats['inferences']} call(s)")
+
+    store = get_image_store()
+    store.flush()
+    images = store.report()
+    print(f"🖼️  Images written off the critical path: {images['written']}, "
+          f"render: {images['render_time']:.2f}s, encode: {images['encode_time']:.2f}s")
@@ -1,12 +1,12 @@
-from ultralytics import YOLO
 import cv2
 import os
 from pathlib import Path
-import easyocr
 import requests
 import time
 from datetime import datetime
 from pymongo import MongoClient
+from image_store import get_image_store
+from inference_engine import get_engine
 
 def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confidence=0.5):
     """Detect helmets in images or videos using trained YOLO model"""
@@ -14,22 +14,19 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
     # Create output directory
     os.makedirs(output_dir, exist_ok=True)
 
-    # Initialize EasyOCR reader
-    reader = easyocr.Reader(['en'])
+    # Shared model and plate OCR, loaded once per process
+    engine = get_engine()
+    plate_ocr = engine.get_plate_ocr()
 
     # Initialize MongoDB client (using port 27018 to avoid conflicts with other projects)
     client = MongoClient("mongodb://localhost:27018/")
     db = client["helmet_detection_db"]
     collection = db["detections"]
 
-    # Load the trained model (or use pre-trained if no trained model exists)
+    # Trained weights; the engine falls back to pre-trained YOLOv8n if missing
     model_path = "runs/detect/helmet_detection_fixed/weights/best.pt"
-    if os.path.exists(model_path):
-        print(f"📱 Loading trained model: {model_path}")
-        model = YOLO(model_path)
-    else:
+    if not os.path.exists(model_path):
         print("⚠️  Trained model not found, using pre-trained YOLOv8n")
-        model = YOLO("yolov8n.pt")
 
     def send_detection_to_flask(detection_data, vehicle_no=None):
         payload = {
@@ -53,15 +50,14 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
         img = cv2.imread(image_path)
 
         # Run detection
-        results = model(image_path, conf=confidence)  # Confidence threshold
+        results = engine.predict(image_path, confidence=confidence, model_path=model_path)  # Confidence threshold
 
         # Process results
         for i, result in enumerate(results):
-            # Save annotated image
-            output_path = os.path.join(output_dir, f"helmet_detection_{Path(image_path).stem}.jpg")
-            result.save(filename=output_path)
+            # Rendered and written in the background; the path is final already
+            output_path = get_image_store().save_result(result, output_dir)
 
-            print(f"✅ Detection saved to: {output_path}")
+            print(f"✅ Detection queued for: {output_path}")
 
             # Prepare data for DB
             detection_data = {
@@ -72,6 +68,7 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
 
             # Print detection info
             boxes = result.boxes
+            plate_jobs = []     # (detection, crop), OCR'd in one batch below
             if boxes is not None:
                 print(f"📊 Found {len(boxes)} objects:")
                 for j, box in enumerate(boxes):
@@ -80,23 +77,17 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
                     class_name = result.names[cls]
                     print(f"   - {class_name}: {conf:.2f} confidence")
 
-                    # Crop license plate and run OCR
+                    # Crop license plate for OCR
                     if class_name == "Vehicle_registration_plate":
                         # Get bounding box coordinates
                         xyxy = box.xyxy[0].cpu().numpy().astype(int)
                         x1, y1, x2, y2 = xyxy
-                        cropped_plate = img[y1:y2, x1:x2]
-
-                        # OCR on cropped plate
-                        ocr_result = reader.readtext(cropped_plate)
-                        plate_text = " ".join([res[1] for res in ocr_result]) if ocr_result else "N/A"
-                        print(f"   🔍 OCR License Plate Text: {plate_text}")
-
-                        detection_data["detections"].append({
+                        det = {
                             "class": class_name,
-                            "confidence": conf,
-                            "plate_text": plate_text
-                        })
+                            "confidence": conf
+                        }
+                        detection_data["detections"].append(det)
+                        plate_jobs.append((det, img[max(0, y1):y2, max(0, x1):x2]))
                     else:
                         detection_data["detections"].append({
                             "class": class_name,
@@ -111,6 +102,13 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
             else:
                 print("❌ No objects detected")
 
+            # OCR every plate crop of the frame in one call
+            if plate_jobs:
+                readings = plate_ocr.read_many([crop for _, crop in plate_jobs])
+                for (det, _), (plate_text, _) in zip(plate_jobs, readings):
+                    det["plate_text"] = plate_text
+                    print(f"   🔍 OCR License Plate Text: {plate_text}")
+
             # Send detection to Flask app
             vehicle_no = None
             for det in detection_data["detections"]:
@@ -147,7 +145,7 @@ def detect_helmets(image_path=None, video_path=None, output_dir="outputs", confi
             frame_count += 1
 
             # Run detection on frame
-            results = model(frame, conf=0.5)
+            results = engine.predict(frame, confidence=0.5, model_path=model_path)
 
             # Annotate frame
             annotated_frame = results[0].plot()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""
+Export the trained helmet model for the ONNX Runtime CPU backend
+"""
+
+import argparse
+import os
+import sys
+
+from inference_engine import DEFAULT_MODEL_PATH
+
+
+def export_onnx(weights=DEFAULT_MODEL_PATH, imgsz=640, opset=12, dynamic=True, simplify=True):
+    """Export weights to ONNX next to them (best.pt -> best.onnx); returns the path
+
+    dynamic=True keeps the batch axis free so batched process_images and
+    the camera scheduler can use the exported model too.
+    """
+    from ultralytics import YOLO
+
+    if not os.path.exists(weights):
+        raise FileNotFoundError(f"weights not found: {weights}")
+    print(f"📦 Exporting {weights} to ONNX (imgsz={imgsz}, opset={opset}, dynamic={dynamic})")
+    return YOLO(weights).export(format="onnx", imgsz=imgsz, opset=opset, dynamic=dynamic,
+                                simplify=simplify, device="cpu")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Export the helmet model to ONNX for CPU inference")
+    parser.add_argument("--weights", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--opset", type=int, default=12)
+    parser.add_argument("--static", action="store_true", help="fix the batch size to 1")
+    parser.add_argument("--no-simplify", action="store_true")
+    args = parser.parse_args(argv)
+
+    path = export_onnx(args.weights, imgsz=args.imgsz, opset=args.opset, dynamic=not args.static,
+                       simplify=not args.no_simplify)
+    print(f"✅ Exported to {path}")
+    print("   Select it with INFERENCE_BACKEND=onnx or --backend onnx")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,216 @@
+import atexit
+import hashlib
+import os
+import queue
+import threading
+import time
+
+from metrics import track
+
+# OpenCV and numpy are imported where used: the web tier imports this module
+# but only inference workers ever encode, so they need not pay for cv2
+FORMATS = {
+    "jpg": lambda cv2, quality: [cv2.IMWRITE_JPEG_QUALITY, quality],
+    "webp": lambda cv2, quality: [cv2.IMWRITE_WEBP_QUALITY, quality],
+    # PNG is lossless; quality maps onto compression effort instead
+    "png": lambda cv2, quality: [cv2.IMWRITE_PNG_COMPRESSION, max(0, min(9, (100 - quality) // 10))],
+}
+THUMBNAIL_DIR = "thumbs"
+
+
+def content_key(image, *extra):
+    """128-bit BLAKE2 hex digest of an image's pixels plus extra bytes"""
+    import numpy as np
+
+    h = hashlib.blake2b(digest_size=16)
+    h.update(str(image.shape).encode())
+    h.update(np.ascontiguousarray(image).data)
+    for part in extra:
+        h.update(part)
+    return h.hexdigest()
+
+
+def _boxes_bytes(result):
+    import numpy as np
+
+    boxes = getattr(result, "boxes", None)
+    if boxes is None:
+        return b""
+    data = boxes.data
+    if hasattr(data, "cpu"):
+        data = data.cpu().numpy()
+    return np.asarray(data).tobytes()
+
+
+def thumbnail(image, size):
+    """Downscale image so its longer side is at most size pixels"""
+    import cv2
+
+    h, w = image.shape[:2]
+    scale = size / float(max(h, w))
+    if scale >= 1:
+        return image
+    return cv2.resize(image, (max(1, int(w * scale)), max(1, int(h * scale))), interpolation=cv2.INTER_AREA)
+
+
+class ImageStore:
+    """Background renderer and writer for annotated detection images
+
+    save_result() and save_image() return the final path immediately and
+    hand rendering (result.plot()) and encoding to worker threads through a
+    bounded queue, so detection and ingestion never wait on image encoding.
+    When the queue is full, callers block until a slot frees up.
+
+    Files are content-addressed: the name is a digest of the source pixels,
+    the boxes and the output settings, so re-processing the same image
+    reuses the existing file. A thumbnail goes to <output_dir>/thumbs/.
+    Writes are atomic (temp file + rename), so a path that exists is complete.
+    """
+
+    def __init__(self, fmt="jpg", quality=90, thumbnail_size=320, queue_size=64, workers=1):
+        fmt = fmt.lower().replace("jpeg", "jpg")
+        if fmt not in FORMATS:
+            raise ValueError(f"unsupported image format {fmt!r}; expected one of {sorted(FORMATS)}")
+        self.fmt = fmt
+        self.quality = quality
+        self.thumbnail_size = thumbnail_size
+        self._settings = f"{fmt}:{quality}".encode()
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._pending = set()
+        self._cond = threading.Condition()
+        self._threads = [threading.Thread(target=self._work, name=f"image-store-{i}", daemon=True)
+                         for i in range(workers)]
+        for thread in self._threads:
+            thread.start()
+        self.stats = {
+            "queued": 0,
+            "written": 0,
+            "reused": 0,
+            "errors": 0,
+            "bytes": 0,
+            "render_time": 0.0,
+            "encode_time": 0.0,
+            "enqueue_wait": 0.0,
+            "max_queue_depth": 0,
+        }
+
+    def path_for(self, output_dir, key):
+        return os.path.join(output_dir, f"{key}.{self.fmt}")
+
+    def thumbnail_path(self, path):
+        """Where the thumbnail of an image written by this store lives"""
+        directory, name = os.path.split(path)
+        return os.path.join(directory, THUMBNAIL_DIR, name)
+
+    def _submit(self, path, render):
+        with self._cond:
+            if path in self._pending or os.path.exists(path):
+                self.stats["reused"] += 1
+                return path
+            self._pending.add(path)
+        start = time.perf_counter()
+        self._queue.put((path, render))
+        with self._cond:
+            self.stats["enqueue_wait"] += time.perf_counter() - start
+            self.stats["queued"] += 1
+            self.stats["max_queue_depth"] = max(self.stats["max_queue_depth"], self._queue.qsize())
+        return path
+
+    def save_result(self, result, output_dir):
+        """Queue result.plot() for writing; returns the path it will have"""
+        key = content_key(result.orig_img, _boxes_bytes(result), self._settings)
+        return self._submit(self.path_for(output_dir, key), result.plot)
+
+    def save_image(self, image, output_dir):
+        """Queue an already rendered BGR image for writing; returns its path"""
+        key = content_key(image, self._settings)
+        return self._submit(self.path_for(output_dir, key), lambda: image)
+
+    def _write(self, path, image):
+        import cv2
+
+        ok, buf = cv2.imencode(f".{self.fmt}", image, FORMATS[self.fmt](cv2, self.quality))
+        if not ok:
+            raise ValueError(f"could not encode {path}")
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(buf.tobytes())
+        os.replace(tmp, path)
+        return len(buf)
+
+    def _work(self):
+        while True:
+            path, render = self._queue.get()
+            try:
+                with track("image_write"):
+                    start = time.perf_counter()
+                    image = render()
+                    rendered = time.perf_counter()
+                    size = self._write(path, image)
+                    if self.thumbnail_size:
+                        size += self._write(self.thumbnail_path(path), thumbnail(image, self.thumbnail_size))
+                with self._cond:
+                    self.stats["written"] += 1
+                    self.stats["bytes"] += size
+                    self.stats["render_time"] += rendered - start
+                    self.stats["encode_time"] += time.perf_counter() - rendered
+            except Exception as e:
+                print(f"❌ Failed to write {path}: {e}")
+                with self._cond:
+                    self.stats["errors"] += 1
+            finally:
+                with self._cond:
+                    self._pending.discard(path)
+                    self._cond.notify_all()
+                self._queue.task_done()
+
+    def wait(self, path, timeout=None):
+        """Block until path (or the image a thumbnail path belongs to) is no
+        longer queued; True if it exists on disk"""
+        # A thumbnail is written right after its image, under the same queue entry
+        directory, name = os.path.split(path)
+        pending = path
+        if os.path.basename(directory) == THUMBNAIL_DIR:
+            pending = os.path.join(os.path.dirname(directory), name)
+        with self._cond:
+            self._cond.wait_for(lambda: path not in self._pending and pending not in self._pending,
+                                timeout=timeout)
+        return os.path.exists(path)
+
+    def flush(self):
+        """Block until every queued image has been written"""
+        self._queue.join()
+
+    def report(self):
+        with self._cond:
+            stats = dict(self.stats)
+        stats["queue_depth"] = self._queue.qsize()
+        stats["format"] = self.fmt
+        stats["quality"] = self.quality
+        return stats
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_image_store():
+    """Return the process-wide ImageStore, configured from the environment
+
+    IMAGE_FORMAT (jpg, webp, png), IMAGE_QUALITY (1-100), THUMBNAIL_SIZE
+    (longest side in pixels, 0 disables) and IMAGE_QUEUE_SIZE.
+    """
+    global _store
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                _store = ImageStore(
+                    fmt=os.getenv("IMAGE_FORMAT", "jpg"),
+                    quality=int(os.getenv("IMAGE_QUALITY", "90")),
+                    thumbnail_size=int(os.getenv("THUMBNAIL_SIZE", "320")),
+                    queue_size=int(os.getenv("IMAGE_QUEUE_SIZE", "64")),
+                )
+                # Scripts exit right after detecting; finish their writes first
+                atexit.register(_store.flush)
+    return _store
@@ -0,0 +1,214 @@
+import os
+import threading
+import time
+
+from metrics import track
+
+
+DEFAULT_MODEL_PATH = "runs/detect/helmet_detection/weights/best.pt"
+FALLBACK_MODEL_PATH = "yolov8n.pt"
+# torch runs the .pt weights; onnx runs the exported .onnx beside them (see
+# export_model.py) and onnx-int8 the quantized model promoted by quantize_model.py
+BACKENDS = ("torch", "onnx", "onnx-int8")
+BACKEND_SUFFIXES = {"onnx": ".onnx", "onnx-int8": ".int8.onnx"}
+
+
+class InferenceEngine:
+    """Process-wide cache of YOLO models and EasyOCR readers.
+
+    Models are loaded lazily on first use and cached by weights path. The
+    file's mtime is checked on every lookup so a retrained best.pt is picked
+    up without restarting the process; if the new weights fail to load, the
+    previously loaded model keeps serving.
+
+    backend picks the runtime: "torch" for the .pt weights, "onnx" for the
+    exported model served by ONNX Runtime on CPU, or "onnx-int8" for its
+    quantized version once it has passed the accuracy gate. It defaults to the
+    INFERENCE_BACKEND environment variable and can be overridden per call.
+    Thread counts come from TORCH_NUM_THREADS, ORT_INTRA_OP_THREADS and
+    ORT_INTER_OP_THREADS.
+    """
+
+    def __init__(self, backend=None):
+        self.backend = self._check_backend(backend or os.getenv("INFERENCE_BACKEND", "torch"))
+        self.torch_threads = int(os.getenv("TORCH_NUM_THREADS", "0"))
+        self.ort_intra_op_threads = int(os.getenv("ORT_INTRA_OP_THREADS", "0"))
+        self.ort_inter_op_threads = int(os.getenv("ORT_INTER_OP_THREADS", "1"))
+        self._lock = threading.RLock()
+        self._models = {}       # resolved path -> (mtime, model, inference lock)
+        self._readers = {}      # tuple(languages) -> easyocr.Reader
+        self._plate_ocr = {}    # tuple(languages) -> PlateOCR
+        self._missing_exports = set()
+        self.stats = {
+            "model_loads": 0,
+            "model_load_time": 0.0,
+            "ocr_loads": 0,
+            "ocr_load_time": 0.0,
+            "inferences": 0,
+            "inference_time": 0.0,
+        }
+
+    @staticmethod
+    def _check_backend(backend):
+        if backend not in BACKENDS:
+            raise ValueError(f"unknown inference backend {backend!r}; expected one of {BACKENDS}")
+        return backend
+
+    def resolve_model_path(self, model_path=None, backend=None):
+        """Return the weights to load, falling back to pre-trained YOLOv8n
+
+        For a non-torch backend the exported file next to the weights is
+        used (best.pt -> best.onnx, best.int8.onnx); if it does not exist
+        yet, the .pt weights serve instead.
+        """
+        model_path = model_path or DEFAULT_MODEL_PATH
+        if not os.path.exists(model_path):
+            model_path = FALLBACK_MODEL_PATH
+        suffix = BACKEND_SUFFIXES.get(self._check_backend(backend or self.backend))
+        if suffix and not model_path.endswith(suffix):
+            exported = os.path.splitext(model_path)[0] + suffix
+            if os.path.exists(exported):
+                return exported
+            with self._lock:
+                if exported not in self._missing_exports:
+                    self._missing_exports.add(exported)
+                    print(f"⚠️  {exported} not found (run export_model.py or quantize_model.py); using {model_path}")
+        return model_path
+
+    def model_version(self, model_path=None, backend=None):
+        """Identify the weights that would serve model_path, without loading them"""
+        path = self.resolve_model_path(model_path, backend)
+        if not os.path.exists(path):
+            return path
+        st = os.stat(path)
+        return f"{path}:{st.st_size}:{st.st_mtime_ns}"
+
+    def _load(self, path, mtime):
+        from ultralytics import YOLO
+
+        print(f"📱 Loading model: {path}")
+        start = time.perf_counter()
+        if path.endswith(".onnx"):
+            model = YOLO(path, task="detect")
+            self._tune_onnx(model, path)
+        else:
+            if self.torch_threads:
+                import torch
+
+                torch.set_num_threads(self.torch_threads)
+            model = YOLO(path)
+        elapsed = time.perf_counter() - start
+        self.stats["model_loads"] += 1
+        self.stats["model_load_time"] += elapsed
+        print(f"   ⏱️  Loaded in {elapsed:.2f}s")
+        entry = (mtime, model, threading.Lock())
+        self._models[path] = entry
+        return entry
+
+    def _tune_onnx(self, model, path):
+        """Replace the ONNX Runtime session Ultralytics built with a tuned one
+
+        Ultralytics creates its session with default options on the first
+        prediction, so run a tiny warm-up to build it, then swap in a CPU
+        session with full graph optimization and our thread counts. Inference
+        is already serialized per model, so inter-op parallelism stays at 1.
+        """
+        import numpy as np
+        import onnxruntime as ort
+
+        model.predict(np.zeros((64, 64, 3), dtype=np.uint8), verbose=False)
+        backend = getattr(getattr(model, "predictor", None), "model", None)
+        if backend is None or not hasattr(backend, "session"):
+            print("⚠️  Could not tune the ONNX Runtime session; using Ultralytics defaults")
+            return
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+        options.intra_op_num_threads = self.ort_intra_op_threads or os.cpu_count() or 1
+        options.inter_op_num_threads = self.ort_inter_op_threads
+        backend.session = ort.InferenceSession(path, options, providers=["CPUExecutionProvider"])
+
+    def _entry(self, model_path=None, backend=None):
+        path = self.resolve_model_path(model_path, backend)
+        mtime = os.path.getmtime(path) if os.path.exists(path) else None
+        with self._lock:
+            cached = self._models.get(path)
+            if cached is not None and cached[0] == mtime:
+                return cached
+            if cached is None:
+                return self._load(path, mtime)
+            # Weights changed on disk: swap only once the new model loads
+            try:
+                return self._load(path, mtime)
+            except Exception as e:
+                print(f"⚠️  Reload of {path} failed, keeping previous model: {e}")
+                return cached
+
+    def get_model(self, model_path=None, backend=None):
+        """Return the cached YOLO model for model_path, loading it if needed"""
+        return self._entry(model_path, backend)[1]
+
+    def get_reader(self, languages=("en",)):
+        """Return a cached EasyOCR reader for the given languages"""
+        key = tuple(languages)
+        with self._lock:
+            reader = self._readers.get(key)
+            if reader is None:
+                import easyocr
+
+                start = time.perf_counter()
+                reader = easyocr.Reader(list(key))
+                self.stats["ocr_loads"] += 1
+                self.stats["ocr_load_time"] += time.perf_counter() - start
+                self._readers[key] = reader
+            return reader
+
+    def get_plate_ocr(self, languages=("en",)):
+        """Return the cached batched plate OCR stage for the given languages"""
+        key = tuple(languages)
+        with self._lock:
+            plate_ocr = self._plate_ocr.get(key)
+            if plate_ocr is None:
+                from plate_ocr import PlateOCR
+
+                plate_ocr = PlateOCR(self.get_reader(key))
+                self._plate_ocr[key] = plate_ocr
+            return plate_ocr
+
+    def predict(self, source, confidence=0.25, model_path=None, backend=None, **kwargs):
+        """Run the cached model on source and record inference time"""
+        _, model, infer_lock = self._entry(model_path, backend)
+        # Ultralytics predictors keep per-call state, so one call at a time
+        with infer_lock, track("inference"):
+            start = time.perf_counter()
+            results = model(source, conf=confidence, **kwargs)
+            elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["inferences"] += 1
+            self.stats["inference_time"] += elapsed
+        return results
+
+    def report(self):
+        """Return load vs. inference timing as a plain dict"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["backend"] = self.backend
+            stats["loaded_models"] = sorted(self._models)
+        stats["avg_inference_time"] = (
+            stats["inference_time"] / stats["inferences"] if stats["inferences"] else 0.0
+        )
+        return stats
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_engine():
+    """Return the process-wide InferenceEngine"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = InferenceEngine()
+    return _engine
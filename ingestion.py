@@ -0,0 +1,352 @@
+import datetime
+import hashlib
+import json
+import uuid
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+
+from metrics import instrument, track
+from plate_index import normalize_plate
+
+PLATE_CLASSES = ["vehicle_registration_plate", "license_plate", "number_plate"]
+# detection_data fields describing how it was served, not what was seen
+DELIVERY_FIELDS = ("cached",)
+
+
+def normalize_detections(detection):
+    """Return the list of detection dicts inside any accepted payload shape"""
+    # detection can be:
+    # - A single detection dict: {"class":"NoHelmet","confidence":0.6}
+    # - A list of detection dicts: [{"class":"NoHelmet","confidence":0.6}]
+    # - A detection data dict with "detections" list: {"detections": [{"class":"NoHelmet","confidence":0.6}], ...}
+    if isinstance(detection, dict):
+        if 'detections' in detection:
+            # New format from detect_helmet.py
+            return detection['detections']
+        # Single detection dict
+        return [detection]
+    if isinstance(detection, list):
+        # List of detections
+        return detection
+    return []
+
+
+def plate_from_detection(detection):
+    """First OCR'd plate text in a detection payload, or None"""
+    for det in normalize_detections(detection):
+        if str(det.get("class", "")).lower() in PLATE_CLASSES and det.get("plate_text") not in (None, "", "N/A"):
+            return det["plate_text"]
+    return None
+
+
+def idempotency_key(data):
+    """Key identifying the event a payload reports, stable across resends
+
+    A client-supplied idempotency_key wins. Otherwise it is the SHA-256 of
+    the source, the event time and the detection content. The event time is
+    the detection's own timestamp (set once when the frame was processed),
+    not the payload's, which build_detection_payload and the detectors
+    restamp on every send; bare detections fall back to the payload's.
+    Without either there is no key: identical content at different times is
+    a new event, and the two cannot be told apart.
+    """
+    if data.get('idempotency_key'):
+        return str(data['idempotency_key'])
+    detection = data.get('detection')
+    event_time = (detection.get('timestamp') if isinstance(detection, dict) else None) or data.get('timestamp')
+    if not event_time:
+        return None
+    if isinstance(detection, dict):
+        # How the detection was produced (a result cache hit) is not part of the event
+        detection = {k: v for k, v in detection.items() if k not in DELIVERY_FIELDS}
+    content = [data.get('source', 'unknown'), event_time, data.get('vehicle_no'), detection]
+    return hashlib.sha256(json.dumps(content, sort_keys=True, default=str).encode()).hexdigest()
+
+
+class IngestionService:
+    """The /detect pipeline: log the event, match rules, issue a challan, notify
+
+    Used directly by the HTTP route and by in-process callers such as
+    /upload, so detections produced inside the web process never make an
+    HTTP round-trip back to it.
+
+    Writes are idempotent: each document carries the payload's
+    idempotency_key (unique index, see db_schema), so a retried payload
+    returns the original challan instead of issuing and notifying twice.
+    """
+
+    def __init__(self, db, rule_index, owner_resolver, notifier, plate_index=None):
+        self.db = db
+        self.rule_index = rule_index
+        self.owner_resolver = owner_resolver
+        self.notifier = notifier
+        self.plate_index = plate_index
+
+    def resolve_vehicle(self, vehicle_no):
+        """Return (vehicle_no, owner_doc, candidates) for an OCR'd plate
+
+        Exact matches go straight to the owner resolver; otherwise the plate
+        index corrects the reading only if it differs from one registered
+        plate by OCR confusions alone. Any other near-miss (a different digit
+        or state code) may be another vehicle, so it is not charged: owner_doc
+        is None and candidates lists the ranked near-misses for manual review.
+        """
+        vehicle_no = normalize_plate(vehicle_no) or None
+        owner_doc = self.owner_resolver.resolve(vehicle_no)
+        if owner_doc or not vehicle_no or self.plate_index is None:
+            return vehicle_no, owner_doc, []
+        candidates = self.plate_index.lookup(vehicle_no)
+        match = self.plate_index.best_match(vehicle_no)
+        if match:
+            owner_doc = self.owner_resolver.resolve(match)
+            if owner_doc:
+                return match, owner_doc, candidates
+        return vehicle_no, None, candidates
+
+    @instrument("find_applicable_rules")
+    def find_applicable_rules(self, detection):
+        # Served from the in-process index; no database round-trip per detection
+        return self.rule_index.match(normalize_detections(detection))
+
+    def build_challan(self, vehicle_no, owner_id, rules_triggered, detection, extra=None):
+        """Challan document for the triggered rules, not yet written"""
+        challan_no = f"CH{datetime.datetime.utcnow().strftime('%Y%m%d%H%M%S')}-{str(uuid.uuid4())[:6]}"
+        violations = []
+        total = 0
+        for r in rules_triggered:
+            violations.append({"rule_id": r['rule_id'], "penalty": r['penalty'], "conf": detection.get('confidence', 0.0)})
+            total += r['penalty']
+        challan = {
+            "challan_no": challan_no,
+            "vehicle_no": vehicle_no,
+            "owner_id": owner_id,
+            "violations": violations,
+            "total_penalty": total,
+            "status": "issued",
+            "issued_at": datetime.datetime.utcnow(),
+            "notified": False,
+            "notification_log": []
+        }
+        challan.update(extra or {})
+        return challan
+
+    @instrument("create_challan")
+    def create_challan(self, vehicle_no, owner_id, rules_triggered, detection, extra=None):
+        challan = self.build_challan(vehicle_no, owner_id, rules_triggered, detection, extra)
+        self.db.challans.insert_one(challan)
+        return challan
+
+    def _plan(self, data):
+        """Build every document one payload produces, without writing any
+
+        Returns a dict with the idempotency key, the violation log, and
+        either a challan (plus the SMS to send) or a manual review, and the
+        response.
+        """
+        detection = data.get('detection')
+        src = data.get('source', 'unknown')
+        key = idempotency_key(data)
+        # may be None; fall back to plate text OCR'd by the detector
+        vehicle_no = data.get('vehicle_no') or plate_from_detection(detection)
+
+        plan = {"key": key, "challan": None, "sms": None, "review": None}
+        tag = {"idempotency_key": key} if key else {}
+
+        # Raw violation log
+        plan["violation"] = dict({
+            "timestamp": datetime.datetime.utcnow(),
+            "source": src,
+            "vehicle_no": vehicle_no,
+            "detection": detection,
+            "image_path": data.get('image_path'),
+            "processed": False
+        }, **tag)
+
+        # Find rules
+        rules = self.find_applicable_rules(detection)
+        if not rules:
+            plan["response"] = {"status": "ok", "message": "no rule triggered"}
+            return plan
+
+        # Resolve owner via vehicle_no (if present), fuzzy-matching OCR slips
+        ocr_vehicle_no = normalize_plate(vehicle_no) or None
+        vehicle_no, owner_doc, candidates = self.resolve_vehicle(vehicle_no)
+
+        # Create challan only if we have owner/vehicle or allow anonymous challans
+        if owner_doc:
+            # Keep the raw reading when the plate index corrected it
+            extra = dict(tag)
+            if ocr_vehicle_no != vehicle_no:
+                extra["ocr_vehicle_no"] = ocr_vehicle_no
+            challan = self.build_challan(vehicle_no, owner_doc['owner_id'], rules, detection, extra)
+            plan["challan"] = challan
+
+            # SMS to the owner (if phone present); workers send it and update the challan
+            phone = owner_doc.get('phone')
+            if phone:
+                plan["sms"] = (phone, f"Violation: {rules[0]['violation_class']} detected for {vehicle_no}. "
+                                      f"Penalty INR {challan['total_penalty']}. Challan No: {{challan_no}}.")
+            plan["response"] = {"status": "challan_created", "challan_no": challan['challan_no']}
+            return plan
+
+        # Option: create challan with vehicle_no null and mark for manual review
+        plan["review"] = dict({
+            "vehicle_no": vehicle_no,
+            "candidates": [{"vehicle_no": plate, "distance": d} for plate, d in candidates],
+            "detection": detection,
+            "status": "manual_review",
+            "created_at": datetime.datetime.utcnow()
+        }, **tag)
+        plan["response"] = {"status": "manual_review", "message": "owner not found; logged for review"}
+        return plan
+
+    def _sms_entry(self, plan, challan_no):
+        """Outbox entry for a plan's SMS; its _id makes re-queuing a no-op"""
+        phone, body = plan["sms"]
+        return self.notifier.outbox_entry(challan_no, "sms", phone, body.format(challan_no=challan_no),
+                                          entry_id=f"{challan_no}:sms")
+
+    def _write(self, collection, doc, key):
+        """Insert doc, or upsert it on key; False if key was already stored"""
+        if key is None:
+            collection.insert_one(doc)
+            return True
+        fields = {k: v for k, v in doc.items() if k != "idempotency_key"}
+        try:
+            result = collection.update_one({"idempotency_key": key}, {"$setOnInsert": fields}, upsert=True)
+        except DuplicateKeyError:
+            # A concurrent retry won the upsert race
+            return False
+        return result.upserted_id is not None
+
+    def _duplicate_response(self, plan):
+        if plan["challan"] is not None:
+            existing = self.db.challans.find_one({"idempotency_key": plan["key"]}, {"challan_no": 1})
+            if existing is None:
+                # Rejected by another unique index (challan_no), not a retry
+                return {"status": "error", "message": "duplicate challan_no"}
+            return {"status": "challan_created", "challan_no": existing["challan_no"], "duplicate": True}
+        return dict(plan["response"], duplicate=True)
+
+    def ingest(self, data):
+        """Process one detector payload; returns the response dict
+
+        Payload shape (see receive_detection in app.py):
+        {"source", "timestamp", "detection", "vehicle_no", "image_path"}
+        The violation log, the challan and its SMS outbox entry are three
+        writes, each keyed so a retry cannot duplicate it. The challan's
+        notified flag and notification_log are set later by the
+        NotificationDispatcher once the SMS is delivered.
+        """
+        plan = self._plan(data)
+        key = plan["key"]
+        self._write(self.db.violations, plan["violation"], key)
+        if plan["challan"] is not None:
+            response = plan["response"]
+            with track("create_challan"):
+                created = self._write(self.db.challans, plan["challan"], key)
+            if not created:
+                response = self._duplicate_response(plan)
+            if plan["sms"] and response["status"] == "challan_created":
+                # Re-queued on retries too, in case the first attempt died before queuing
+                try:
+                    self.db.notification_outbox.insert_one(self._sms_entry(plan, response["challan_no"]))
+                    self.notifier.notify()
+                except DuplicateKeyError:
+                    pass
+            return response
+        if plan["review"] is not None and not self._write(self.db.manual_reviews, plan["review"], key):
+            return self._duplicate_response(plan)
+        return plan["response"]
+
+    def _prefetch_owners(self, payloads):
+        """Warm the owner cache for a batch with at most two queries
+
+        Best-effort: an item whose plate cannot be read is skipped here and
+        fails on its own in _plan().
+        """
+        plates = set()
+        for d in payloads:
+            try:
+                plates.add(normalize_plate(d.get('vehicle_no') or plate_from_detection(d.get('detection'))))
+            except Exception:
+                continue
+        plates.discard("")
+        owners = self.owner_resolver.resolve_many(plates)
+        if self.plate_index is not None:
+            matches = {self.plate_index.best_match(p) for p, owner in owners.items() if owner is None}
+            matches.discard(None)
+            if matches:
+                self.owner_resolver.resolve_many(matches)
+
+    def _insert_many(self, collection, docs, item_indices, results, keys=None):
+        """insert_many(ordered=False); mark the items whose document failed
+
+        Returns the items rejected because their idempotency key (or, for the
+        outbox, their deterministic _id) was already stored.
+        """
+        duplicates = []
+        if not docs:
+            return duplicates
+        try:
+            collection.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for error in e.details.get("writeErrors", []):
+                i = item_indices[error["index"]]
+                if error.get("code") == 11000 and (keys is None or keys[error["index"]]):
+                    duplicates.append(i)
+                else:
+                    results[i] = {"status": "error", "message": error.get("errmsg", "write failed")}
+        return duplicates
+
+    def ingest_batch(self, payloads):
+        """Process many detector payloads with one bulk write per collection
+
+        Returns one response dict per payload, in order, shaped like ingest().
+        Keyed documents are bulk-inserted against the idempotency_key unique
+        index; duplicate-key rejections are retries (or repeats within the
+        batch) and resolve to the challan already stored.
+        """
+        self._prefetch_owners(payloads)
+
+        results, plans = [], []
+        for data in payloads:
+            try:
+                plan = self._plan(data)
+            except Exception as e:
+                plan = None
+                results.append({"status": "error", "message": str(e)})
+            else:
+                results.append(plan["response"])
+            plans.append(plan)
+
+        for collection, field in (("violations", "violation"), ("challans", "challan"), ("manual_reviews", "review")):
+            indices = [i for i, plan in enumerate(plans)
+                       if plan is not None and plan[field] is not None and results[i]["status"] != "error"]
+            duplicates = self._insert_many(self.db[collection], [plans[i][field] for i in indices], indices,
+                                           results, keys=[plans[i]["key"] for i in indices])
+            if collection == "violations":
+                continue
+            by_key = {}
+            if collection == "challans" and duplicates:
+                keys = [plans[i]["key"] for i in duplicates]
+                by_key = {doc["idempotency_key"]: doc["challan_no"] for doc in self.db.challans.find(
+                    {"idempotency_key": {"$in": keys}}, {"challan_no": 1, "idempotency_key": 1})}
+            for i in duplicates:
+                if collection == "challans" and plans[i]["key"] not in by_key:
+                    # Rejected by another unique index (challan_no), not a retry
+                    results[i] = {"status": "error", "message": "duplicate challan_no"}
+                elif collection == "challans":
+                    results[i] = {"status": "challan_created", "challan_no": by_key[plans[i]["key"]], "duplicate": True}
+                else:
+                    results[i] = dict(results[i], duplicate=True)
+
+        # Queue SMS for every written challan; retries hit the deterministic _id
+        outbox = [(i, self._sms_entry(plan, results[i]["challan_no"])) for i, plan in enumerate(plans)
+                  if plan is not None and plan["sms"] and results[i]["status"] == "challan_created"]
+        if outbox:
+            duplicates = self._insert_many(self.db.notification_outbox, [entry for _, entry in outbox],
+                                           [i for i, _ in outbox], results)
+            if len(duplicates) < len(outbox):
+                self.notifier.notify()
+        return results
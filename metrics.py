@@ -0,0 +1,272 @@
+import bisect
+import functools
+import threading
+import time
+
+
+# Seconds; spans a cached rule lookup (~µs) to a cold YOLO + EasyOCR upload
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=()):
+    pairs = [f'{n}="{_escape(v)}"' for n, v in zip(names, values)] + [f'{n}="{v}"' for n, v in extra]
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    """A metric family; labels(...) returns the child holding the values
+
+    Children are created once and can be kept by the caller, so the hot
+    path is one lock and an add, with no label lookup per observation.
+    """
+
+    kind = None
+
+    def __init__(self, name, help, labelnames=()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._children = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        values = tuple(str(v) for v in values)
+        if len(values) != len(self.labelnames):
+            raise ValueError(f"{self.name} expects labels {self.labelnames}, got {values}")
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(values, self._child())
+        return child
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in sorted(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+
+class _Value:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1):
+        with self._lock:
+            self.value += amount
+
+    def dec(self, amount=1):
+        with self._lock:
+            self.value -= amount
+
+    def set(self, value):
+        self.value = value
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _child(self):
+        return _Value()
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{_labels(self.labelnames, values)} {_number(child.value)}"]
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+
+class _Buckets:
+    __slots__ = ("bounds", "counts", "sum", "count", "_lock")
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)   # last slot is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect.bisect_left(self.bounds, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def merge(self, counts, total):
+        """Add bucket counts and a sum observed elsewhere (same bounds)"""
+        with self._lock:
+            for i, n in enumerate(counts):
+                self.counts[i] += n
+            self.sum += total
+            self.count += sum(counts)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def _child(self):
+        return _Buckets(self.buckets)
+
+    def _render_child(self, values, child):
+        with child._lock:
+            counts, total, count = list(child.counts), child.sum, child.count
+        lines = []
+        cumulative = 0
+        for bound, n in zip(self.buckets + (float("inf"),), counts):
+            cumulative += n
+            lines.append(f"{self.name}_bucket{_labels(self.labelnames, values, [('le', _number(bound))])} {cumulative}")
+        lines.append(f"{self.name}_sum{_labels(self.labelnames, values)} {_number(total)}")
+        lines.append(f"{self.name}_count{_labels(self.labelnames, values)} {count}")
+        return lines
+
+
+class Registry:
+    """Named metric families rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _register(self, cls, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, *args, **kwargs)
+            elif not isinstance(metric, cls):
+                raise ValueError(f"{name} is already registered as a {metric.kind}")
+            return metric
+
+    def counter(self, name, help, labelnames=()):
+        return self._register(Counter, name, help, labelnames)
+
+    def gauge(self, name, help, labelnames=()):
+        return self._register(Gauge, name, help, labelnames)
+
+    def histogram(self, name, help, labelnames=(), buckets=DEFAULT_BUCKETS):
+        return self._register(Histogram, name, help, labelnames, buckets)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+STAGE_SECONDS = REGISTRY.histogram("echallan_stage_seconds", "Time spent in each pipeline stage", ("stage",))
+STAGE_CALLS = REGISTRY.counter("echallan_stage_calls_total", "Pipeline stage calls by outcome",
+                               ("stage", "outcome"))
+STAGE_IN_PROGRESS = REGISTRY.gauge("echallan_stage_in_progress", "Pipeline stage calls currently running",
+                                   ("stage",))
+
+
+class track:
+    """Time a block as a pipeline stage: duration histogram, calls by
+    outcome ("ok"/"error") and an in-flight gauge
+
+    Usable as a context manager or, via instrument(), as a decorator.
+    """
+
+    __slots__ = ("_seconds", "_ok", "_error", "_in_progress", "_start")
+
+    def __init__(self, stage):
+        self._seconds = STAGE_SECONDS.labels(stage)
+        self._ok = STAGE_CALLS.labels(stage, "ok")
+        self._error = STAGE_CALLS.labels(stage, "error")
+        self._in_progress = STAGE_IN_PROGRESS.labels(stage)
+
+    def __enter__(self):
+        self._in_progress.inc()
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._seconds.observe(time.perf_counter() - self._start)
+        self._in_progress.dec()
+        (self._error if exc_type else self._ok).inc()
+        return False
+
+
+def instrument(stage):
+    """Decorator form of track(stage); label children are resolved once"""
+    def decorate(fn):
+        seconds = STAGE_SECONDS.labels(stage)
+        ok = STAGE_CALLS.labels(stage, "ok")
+        error = STAGE_CALLS.labels(stage, "error")
+        in_progress = STAGE_IN_PROGRESS.labels(stage)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            in_progress.inc()
+            start = time.perf_counter()
+            try:
+                value = fn(*args, **kwargs)
+            except BaseException:
+                error.inc()
+                raise
+            finally:
+                seconds.observe(time.perf_counter() - start)
+                in_progress.dec()
+            ok.inc()
+            return value
+        return wrapper
+    return decorate
+
+
+def stage_totals():
+    """This process's stage figures: {stage: {"buckets", "sum", "ok", "error"}}
+
+    Taken before and after a unit of work in another process, their
+    stage_delta() can be shipped back and folded in with record_stages().
+    """
+    totals = {}
+    for (stage,), child in list(STAGE_SECONDS._children.items()):
+        with child._lock:
+            totals[stage] = {"buckets": list(child.counts), "sum": child.sum, "ok": 0, "error": 0}
+    for (stage, outcome), child in list(STAGE_CALLS._children.items()):
+        if stage in totals:
+            totals[stage][outcome] = child.value
+    return totals
+
+
+def stage_delta(before, after):
+    """What happened per stage between two stage_totals(); idle stages are left out"""
+    delta = {}
+    for stage, now in after.items():
+        then = before.get(stage) or {"buckets": [0] * len(now["buckets"]), "sum": 0.0, "ok": 0, "error": 0}
+        buckets = [a - b for a, b in zip(now["buckets"], then["buckets"])]
+        if any(buckets):
+            delta[stage] = {"buckets": buckets, "sum": now["sum"] - then["sum"],
+                            "ok": now["ok"] - then["ok"], "error": now["error"] - then["error"]}
+    return delta
+
+
+def record_stages(delta):
+    """Fold a stage_delta() measured in another process into this registry"""
+    for stage, d in delta.items():
+        STAGE_SECONDS.labels(stage).merge(d["buckets"], d["sum"])
+        for outcome in ("ok", "error"):
+            if d[outcome]:
+                STAGE_CALLS.labels(stage, outcome).inc(d[outcome])
@@ -0,0 +1,220 @@
+import datetime
+import threading
+import time
+import uuid
+
+
+class MockTransport:
+    """Transport that records messages instead of sending them"""
+
+    name = "mock"
+
+    def __init__(self, fail_times=0):
+        self.sent = []
+        self.fail_times = fail_times
+        self._lock = threading.Lock()
+
+    def send(self, to, body):
+        with self._lock:
+            if self.fail_times > 0:
+                self.fail_times -= 1
+                raise RuntimeError("mock transport failure")
+            self.sent.append((to, body))
+        return {"status": "mocked"}
+
+
+class FunctionTransport:
+    """Wrap a send(to, body) -> dict function as a named transport"""
+
+    def __init__(self, name, fn):
+        self.name = name
+        self._fn = fn
+
+    def send(self, to, body):
+        return self._fn(to, body)
+
+
+class RateLimiter:
+    """Token bucket allowing rate sends per second with bursts up to burst"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.burst = max(1, burst)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def try_acquire(self):
+        """Take a token if one is available; never blocks"""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return True
+            return False
+
+
+class NotificationDispatcher:
+    """Outbox-backed notification sender with a pool of worker threads
+
+    enqueue() writes a pending entry to db.notification_outbox and returns
+    straight away. Workers claim due entries, send them through the
+    transport for their method, and record the outcome on both the outbox
+    entry and the challan. Failed sends are retried with exponential
+    backoff up to max_attempts; entries left in "sending" by a crashed
+    worker are reclaimed after lease seconds.
+    """
+
+    def __init__(self, db, transports, workers=4, rate_limits=None, max_attempts=5,
+                 base_backoff=2.0, poll_interval=1.0, lease=60.0, autostart=True):
+        self.db = db
+        self.transports = dict(transports)     # method -> transport
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.base_backoff = base_backoff
+        self.poll_interval = poll_interval
+        self.lease = lease
+        self.autostart = autostart
+        self.limiters = {name: RateLimiter(rate) for name, rate in (rate_limits or {}).items()}
+        self._wakeup = threading.Event()
+        self._stop = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+
+    def outbox_entry(self, challan_no, method, to, body, entry_id=None):
+        """Build a pending outbox document without writing it
+
+        Pass a deterministic entry_id to make re-queuing the same message a
+        duplicate-key no-op.
+        """
+        now = datetime.datetime.utcnow()
+        return {
+            "_id": entry_id or str(uuid.uuid4()),
+            "challan_no": challan_no,
+            "method": method,
+            "to": to,
+            "body": body,
+            "status": "pending",
+            "attempts": 0,
+            "next_attempt_at": now,
+            "created_at": now,
+        }
+
+    def enqueue(self, challan_no, method, to, body):
+        """Write a pending notification to the outbox and wake a worker"""
+        entry = self.outbox_entry(challan_no, method, to, body)
+        self.db.notification_outbox.insert_one(entry)
+        self.notify()
+        return entry
+
+    def notify(self):
+        """Wake the workers after outbox entries were written elsewhere"""
+        if self.autostart:
+            self.start()
+        self._wakeup.set()
+
+    def start(self):
+        """Start the worker threads (idempotent)"""
+        with self._start_lock:
+            if self._threads:
+                return
+            self._stop.clear()
+            for i in range(self.workers):
+                t = threading.Thread(target=self._run, name=f"notify-{i}", daemon=True)
+                t.start()
+                self._threads.append(t)
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wakeup.set()
+        for t in self._threads:
+            t.join(timeout)
+        self._threads = []
+
+    def _claim(self):
+        now = datetime.datetime.utcnow()
+        stale = now - datetime.timedelta(seconds=self.lease)
+        return self.db.notification_outbox.find_one_and_update(
+            {"$or": [
+                {"status": "pending", "next_attempt_at": {"$lte": now}},
+                {"status": "sending", "claimed_at": {"$lte": stale}},
+            ]},
+            {"$set": {"status": "sending", "claimed_at": now}},
+            sort=[("next_attempt_at", 1)],
+        )
+
+    def _deliver(self, entry):
+        transport = self.transports[entry["method"]]
+        limiter = self.limiters.get(transport.name)
+        if limiter is not None:
+            limiter.acquire()
+
+        attempts = entry.get("attempts", 0) + 1
+        try:
+            status = transport.send(entry["to"], entry["body"])
+        except Exception as e:
+            now = datetime.datetime.utcnow()
+            if attempts >= self.max_attempts:
+                update = {"status": "failed", "attempts": attempts, "error": str(e)}
+            else:
+                delay = self.base_backoff * (2 ** (attempts - 1))
+                update = {"status": "pending", "attempts": attempts, "error": str(e),
+                          "next_attempt_at": now + datetime.timedelta(seconds=delay)}
+            self.db.notification_outbox.update_one({"_id": entry["_id"]}, {"$set": update})
+            if update["status"] == "failed":
+                self._log(entry, {"status": "failed", "error": str(e)}, notified=False)
+            return False
+
+        self.db.notification_outbox.update_one(
+            {"_id": entry["_id"]},
+            {"$set": {"status": "sent", "attempts": attempts, "sent_at": datetime.datetime.utcnow(),
+                      "result": status}})
+        self._log(entry, status, notified=True)
+        return True
+
+    def _log(self, entry, status, notified):
+        update = {"$push": {"notification_log": {"method": entry["method"], "to": entry["to"],
+                                                 "ts": datetime.datetime.utcnow(), "status": status}}}
+        if notified:
+            update["$set"] = {"notified": True}
+        self.db.challans.update_one({"challan_no": entry["challan_no"]}, update)
+
+    def process_one(self):
+        """Claim and deliver one due entry; returns False when none are due"""
+        entry = self._claim()
+        if entry is None:
+            return False
+        self._deliver(entry)
+        return True
+
+    def drain(self):
+        """Deliver every due entry on the calling thread (tests, CLI)"""
+        count = 0
+        while self.process_one():
+            count += 1
+        return count
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                if self.process_one():
+                    continue
+            except Exception as e:
+                print(f"❌ Notification worker error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
@@ -0,0 +1,115 @@
+import threading
+import time
+from collections import OrderedDict
+
+_MISSING = object()
+
+
+class OwnerResolver:
+    """Resolve vehicle_no -> owner document with one $lookup and an LRU+TTL cache
+
+    Unknown plates are cached too (as None, for negative_ttl seconds), so
+    repeated misreads do not hit the database on every event.
+    """
+
+    def __init__(self, db, max_size=10000, ttl=300.0, negative_ttl=60.0):
+        self.db = db
+        self.max_size = max_size
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._cache = OrderedDict()     # vehicle_no -> (expires_at, owner or None)
+        self._lock = threading.Lock()
+        self.stats = {
+            "hits": 0,
+            "misses": 0,
+            "negative_hits": 0,
+            "queries": 0,
+            "query_time": 0.0,
+            "max_query_time": 0.0,
+        }
+
+    def _pipeline(self, vehicle_nos):
+        return [
+            {"$match": {"vehicle_no": {"$in": list(vehicle_nos)}}},
+            {"$lookup": {"from": "owners", "localField": "owner_id",
+                         "foreignField": "owner_id", "as": "owner"}},
+            {"$project": {"_id": 0, "vehicle_no": 1, "owner": 1}},
+        ]
+
+    def _query(self, vehicle_nos):
+        start = time.perf_counter()
+        found = {}
+        for doc in self.db.vehicles.aggregate(self._pipeline(vehicle_nos)):
+            owners = doc.get("owner") or []
+            found[doc["vehicle_no"]] = owners[0] if owners else None
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.stats["queries"] += 1
+            self.stats["query_time"] += elapsed
+            self.stats["max_query_time"] = max(self.stats["max_query_time"], elapsed)
+        return found
+
+    def _get_cached(self, vehicle_no, now):
+        entry = self._cache.get(vehicle_no)
+        if entry is None:
+            return _MISSING
+        expires_at, owner = entry
+        if expires_at < now:
+            del self._cache[vehicle_no]
+            return _MISSING
+        self._cache.move_to_end(vehicle_no)
+        return owner
+
+    def _store(self, vehicle_no, owner, now):
+        ttl = self.ttl if owner is not None else self.negative_ttl
+        self._cache[vehicle_no] = (now + ttl, owner)
+        self._cache.move_to_end(vehicle_no)
+        while len(self._cache) > self.max_size:
+            self._cache.popitem(last=False)
+
+    def resolve(self, vehicle_no):
+        """Return the owner document for vehicle_no, or None if unknown"""
+        if not vehicle_no:
+            return None
+        return self.resolve_many([vehicle_no])[vehicle_no]
+
+    def resolve_many(self, vehicle_nos):
+        """Resolve many plates with at most one query; returns {vehicle_no: owner or None}"""
+        now = time.monotonic()
+        result, pending = {}, []
+        with self._lock:
+            for vehicle_no in dict.fromkeys(v for v in vehicle_nos if v):
+                owner = self._get_cached(vehicle_no, now)
+                if owner is _MISSING:
+                    self.stats["misses"] += 1
+                    pending.append(vehicle_no)
+                else:
+                    self.stats["hits"] += 1
+                    if owner is None:
+                        self.stats["negative_hits"] += 1
+                    result[vehicle_no] = owner
+
+        if pending:
+            found = self._query(pending)
+            with self._lock:
+                for vehicle_no in pending:
+                    owner = found.get(vehicle_no)
+                    self._store(vehicle_no, owner, now)
+                    result[vehicle_no] = owner
+        return result
+
+    def invalidate(self, vehicle_no=None):
+        """Drop one plate (or everything) from the cache"""
+        with self._lock:
+            if vehicle_no is None:
+                self._cache.clear()
+            else:
+                self._cache.pop(vehicle_no, None)
+
+    def report(self):
+        """Cache and query latency stats as a plain dict"""
+        with self._lock:
+            stats = dict(self.stats)
+            stats["cached"] = len(self._cache)
+        stats["avg_query_time"] = stats["query_time"] / stats["queries"] if stats["queries"] else 0.0
+        return stats
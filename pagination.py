@@ -0,0 +1,156 @@
+import base64
+import datetime
+import json
+
+from bson import ObjectId
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Listing name -> how to sort, project and filter it. Sorting is on (sort
+# field, _id) so the keyset cursor is unique even when timestamps tie; a
+# sort field under a unique index ("unique") is sorted on alone, so that
+# index serves the sort.
+LISTINGS = {
+    "challans": {
+        "collection": "challans",
+        "sort": "issued_at",
+        "direction": -1,
+        "projection": {"challan_no": 1, "vehicle_no": 1, "owner_id": 1, "total_penalty": 1,
+                       "status": 1, "issued_at": 1, "notified": 1},
+        "filters": {"status": "status", "vehicle": "vehicle_no"},
+        "date_field": "issued_at",
+    },
+    "violations": {
+        "collection": "violations",
+        "sort": "timestamp",
+        "direction": -1,
+        "projection": {"timestamp": 1, "source": 1, "vehicle_no": 1, "detection": 1,
+                       "image_path": 1, "processed": 1},
+        "filters": {"vehicle": "vehicle_no", "source": "source"},
+        "date_field": "timestamp",
+    },
+    "owners": {
+        "collection": "owners",
+        "sort": "owner_id",
+        "direction": 1,
+        "unique": True,
+        "projection": {"owner_id": 1, "name": 1, "phone": 1, "email": 1},
+        "filters": {"owner": "owner_id"},
+        "date_field": None,
+    },
+    "vehicles": {
+        "collection": "vehicles",
+        "sort": "vehicle_no",
+        "direction": 1,
+        "unique": True,
+        "projection": {"vehicle_no": 1, "owner_id": 1, "make": 1, "model": 1, "color": 1},
+        "filters": {"vehicle": "vehicle_no", "owner": "owner_id"},
+        "date_field": None,
+    },
+}
+
+
+def _encode_value(value):
+    if isinstance(value, datetime.datetime):
+        return {"dt": value.isoformat()}
+    if isinstance(value, ObjectId):
+        return {"oid": str(value)}
+    return value
+
+
+def _decode_value(value):
+    if isinstance(value, dict):
+        if "dt" in value:
+            return datetime.datetime.fromisoformat(value["dt"])
+        if "oid" in value:
+            return ObjectId(value["oid"])
+    return value
+
+
+def encode_cursor(doc, sort_field):
+    """Opaque cursor pointing just past doc"""
+    raw = json.dumps([_encode_value(doc.get(sort_field)), _encode_value(doc["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor):
+    """Return (sort value, _id) from a cursor; raises ValueError if malformed"""
+    try:
+        value, doc_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return _decode_value(value), _decode_value(doc_id)
+    except Exception as e:
+        raise ValueError(f"invalid cursor: {cursor}") from e
+
+
+def _parse_date(text, end_of_day=False):
+    value = datetime.datetime.fromisoformat(text)
+    if end_of_day and len(text) == 10:
+        value += datetime.timedelta(days=1)
+    return value
+
+
+def build_query(spec, args):
+    """Mongo filter for the request args a listing supports
+
+    args is any mapping (e.g. request.args). Dates are ISO strings; a bare
+    "to" date includes that whole day. Raises ValueError on bad dates.
+    """
+    query = {}
+    for arg, field in spec["filters"].items():
+        value = args.get(arg)
+        if value:
+            query[field] = value
+    date_field = spec["date_field"]
+    if date_field:
+        bounds = {}
+        if args.get("from"):
+            bounds["$gte"] = _parse_date(args["from"])
+        if args.get("to"):
+            bounds["$lt"] = _parse_date(args["to"], end_of_day=True)
+        if bounds:
+            query[date_field] = bounds
+    return query
+
+
+def fetch_page(db, listing, args=None, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    """Return (docs, next_cursor) for one page of a listing
+
+    Uses keyset pagination on (sort field, _id), or the sort field alone
+    when it is unique, so every page costs the same whatever its position
+    in the collection.
+    """
+    spec = LISTINGS[listing]
+    sort_field, direction = spec["sort"], spec["direction"]
+    sort = [(sort_field, direction)] if spec.get("unique") else [(sort_field, direction), ("_id", direction)]
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+
+    query = build_query(spec, args or {})
+    if cursor:
+        value, doc_id = decode_cursor(cursor)
+        op = "$lt" if direction < 0 else "$gt"
+        if spec.get("unique"):
+            after = {sort_field: {op: value}}
+        else:
+            after = {"$or": [{sort_field: {op: value}}, {sort_field: value, "_id": {op: doc_id}}]}
+        query = {"$and": [query, after]} if query else after
+
+    docs = list(db[spec["collection"]]
+                .find(query, spec["projection"])
+                .sort(sort)
+                .limit(limit + 1))
+    next_cursor = encode_cursor(docs[limit - 1], sort_field) if len(docs) > limit else None
+    return docs[:limit], next_cursor
+
+
+def to_jsonable(value):
+    """Convert Mongo documents to JSON-safe structures"""
+    if isinstance(value, dict):
+        return {k: to_jsonable(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [to_jsonable(v) for v in value]
+    if isinstance(value, datetime.datetime):
+        return value.isoformat()
+    if isinstance(value, ObjectId):
+        return str(value)
+    return value
@@ -0,0 +1,182 @@
+import re
+import threading
+import time
+
+# Characters EasyOCR commonly swaps on Indian plates, as letter <-> digit pairs
+CONFUSIONS = [("O", "0"), ("D", "0"), ("Q", "0"), ("I", "1"), ("L", "1"), ("Z", "2"),
+              ("B", "8"), ("S", "5"), ("G", "6"), ("T", "7"), ("A", "4")]
+CONFUSION_COST = 0.3
+
+_TO_DIGIT = {letter: digit for letter, digit in CONFUSIONS}
+_TO_LETTER = {}
+for _letter, _digit in CONFUSIONS:
+    _TO_LETTER.setdefault(_digit, _letter)
+_CHEAP = {(a, b) for a, b in CONFUSIONS} | {(b, a) for a, b in CONFUSIONS}
+
+# SS DD [L..LLL] NNNN (e.g. MH01AB1234) and the Bharat series YY BH NNNN L[L]
+STANDARD_PLATE = re.compile(r"^[A-Z]{2}[0-9]{1,2}[A-Z]{0,3}[0-9]{4}$")
+BH_PLATE = re.compile(r"^[0-9]{2}BH[0-9]{4}[A-Z]{1,2}$")
+
+
+def normalize_plate(text):
+    """Uppercase and drop everything but letters and digits"""
+    return re.sub(r"[^A-Z0-9]", "", (text or "").upper())
+
+
+def is_valid_plate(plate):
+    return bool(STANDARD_PLATE.match(plate) or BH_PLATE.match(plate))
+
+
+def coerce_to_grammar(plate):
+    """Fix letter/digit confusions where the plate layout fixes the character class
+
+    State code letters, district digits and the trailing four digits are
+    coerced; the ambiguous series in the middle is coerced to letters. Returns
+    plate unchanged if it is too short to place in the layout.
+    """
+    if len(plate) < 7:
+        return plate
+    chars = list(plate)
+    if plate[2:4] in ("BH", "8H") and len(plate) in (9, 10):
+        # Bharat series: YY BH NNNN L[L]
+        layout = "DDLLDDDD" + "L" * (len(plate) - 8)
+    else:
+        digits_district = 2 if len(plate) >= 8 and (plate[3].isdigit() or plate[3] in _TO_DIGIT) else 1
+        series = len(plate) - 2 - digits_district - 4
+        if series < 0 or series > 3:
+            return plate
+        layout = "LL" + "D" * digits_district + "L" * series + "DDDD"
+    for i, kind in enumerate(layout):
+        if kind == "D":
+            chars[i] = _TO_DIGIT.get(chars[i], chars[i])
+        else:
+            chars[i] = _TO_LETTER.get(chars[i], chars[i])
+    return "".join(chars)
+
+
+def confusion_distance(a, b):
+    """Edit distance where OCR-confusable substitutions cost CONFUSION_COST"""
+    previous = [float(j) for j in range(len(b) + 1)]
+    for i, ca in enumerate(a, 1):
+        current = [float(i)]
+        for j, cb in enumerate(b, 1):
+            if ca == cb:
+                sub = 0.0
+            elif (ca, cb) in _CHEAP:
+                sub = CONFUSION_COST
+            else:
+                sub = 1.0
+            current.append(min(previous[j] + 1, current[j - 1] + 1, previous[j - 1] + sub))
+        previous = current
+    return previous[-1]
+
+
+def confusions_only(reading, plate):
+    """True if reading differs from plate only by OCR-confusable substitutions"""
+    return len(reading) == len(plate) and all(a == b or (a, b) in _CHEAP for a, b in zip(reading, plate))
+
+
+def canonical_key(plate):
+    """Collapse each confusable letter/digit pair onto one symbol
+
+    Two readings that differ only by OCR confusions share a canonical key.
+    """
+    return "".join(_TO_DIGIT.get(c, c) for c in plate)
+
+
+def _deletions(key):
+    """key plus every string obtained by deleting one character"""
+    return {key} | {key[:i] + key[i + 1:] for i in range(len(key))}
+
+
+class PlateIndex:
+    """In-memory index of registered plates for fuzzy OCR lookups
+
+    Plates are indexed by canonical key (see canonical_key) and by every
+    single-character deletion of it, so a reading with any number of OCR
+    confusions plus one other edit is found with a handful of dict lookups.
+    Candidates are ranked by confusion-weighted edit distance. best_match
+    only auto-corrects readings whose every difference is an OCR confusion
+    ("MH01A81234" -> "MH01AB1234"); a real edit such as MH01AB1235 may be a
+    different, unregistered vehicle and is left to manual review with the
+    lookup() candidates. With db given, plates are loaded from db.vehicles
+    and reloaded after ttl seconds.
+    """
+
+    def __init__(self, plates=(), db=None, ttl=300.0):
+        self.db = db
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._loaded_at = None
+        self._reset(plates)
+
+    def _reset(self, plates):
+        self._plates = set()
+        self._deletes = {}      # deletion variant of canonical key -> plates
+        for plate in plates:
+            self._add(normalize_plate(plate))
+
+    def _add(self, plate):
+        if not plate or plate in self._plates:
+            return
+        self._plates.add(plate)
+        for variant in _deletions(canonical_key(plate)):
+            self._deletes.setdefault(variant, set()).add(plate)
+
+    def add(self, plate):
+        with self._lock:
+            self._add(normalize_plate(plate))
+
+    def __len__(self):
+        return len(self._plates)
+
+    def _ensure_loaded(self):
+        if self.db is None:
+            return
+        now = time.monotonic()
+        if self._loaded_at is not None and now - self._loaded_at < self.ttl:
+            return
+        with self._lock:
+            if self._loaded_at is not None and now - self._loaded_at < self.ttl:
+                return
+            self._reset(doc["vehicle_no"] for doc in self.db.vehicles.find({}, {"vehicle_no": 1, "_id": 0})
+                        if doc.get("vehicle_no"))
+            self._loaded_at = now
+
+    def lookup(self, text, max_distance=1.5, limit=5):
+        """Ranked [(plate, distance)] for an OCR reading, best first"""
+        self._ensure_loaded()
+        raw = normalize_plate(text)
+        if not raw:
+            return []
+        if raw in self._plates:
+            return [(raw, 0.0)]
+        coerced = coerce_to_grammar(raw)
+
+        candidates = set()
+        for variant in _deletions(canonical_key(raw)):
+            candidates.update(self._deletes.get(variant, ()))
+
+        ranked = []
+        for plate in candidates:
+            distance = min(confusion_distance(raw, plate), confusion_distance(coerced, plate))
+            if distance <= max_distance:
+                ranked.append((plate, round(distance, 3)))
+        ranked.sort(key=lambda item: (item[1], item[0]))
+        return ranked[:limit]
+
+    def best_match(self, text):
+        """The registered plate text is an OCR misreading of, or None
+
+        Only plates reachable through confusable substitutions alone qualify
+        (distance a multiple of CONFUSION_COST); a tie between two is None.
+        """
+        raw = normalize_plate(text)
+        ranked = [(plate, distance) for plate, distance
+                  in self.lookup(raw, max_distance=CONFUSION_COST * len(raw), limit=None)
+                  if confusions_only(raw, plate)]
+        if not ranked:
+            return None
+        if len(ranked) > 1 and ranked[1][1] == ranked[0][1]:
+            return None
+        return ranked[0][0]
@@ -0,0 +1,137 @@
+import threading
+from collections import OrderedDict
+
+import cv2
+import numpy as np
+
+from metrics import track
+
+PLATE_HEIGHT = 64
+# Skew outside this range is more likely a bad crop than a tilted plate
+MAX_DESKEW_ANGLE = 20.0
+
+
+def phash(image, hash_size=8):
+    """64-bit DCT perceptual hash of an image (BGR or grayscale)"""
+    gray = image if image.ndim == 2 else cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+    small = cv2.resize(gray, (hash_size * 4, hash_size * 4), interpolation=cv2.INTER_AREA)
+    dct = cv2.dct(np.float32(small))[:hash_size, :hash_size]
+    bits = (dct > np.median(dct)).flatten()
+    return int("".join("1" if b else "0" for b in bits), 2)
+
+
+def deskew(gray):
+    """Rotate a grayscale plate so its text baseline is horizontal"""
+    _, mask = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
+    points = cv2.findNonZero(mask)
+    if points is None or len(points) < 10:
+        return gray
+    angle = cv2.minAreaRect(points)[-1]
+    # minAreaRect reports angles in [0, 90) or [-90, 0) depending on OpenCV version
+    if angle > 45:
+        angle -= 90
+    elif angle < -45:
+        angle += 90
+    if abs(angle) < 0.5 or abs(angle) > MAX_DESKEW_ANGLE:
+        return gray
+    h, w = gray.shape
+    matrix = cv2.getRotationMatrix2D((w / 2, h / 2), angle, 1.0)
+    return cv2.warpAffine(gray, matrix, (w, h), flags=cv2.INTER_CUBIC, borderMode=cv2.BORDER_REPLICATE)
+
+
+def preprocess(crop, height=PLATE_HEIGHT):
+    """Grayscale, deskew and resize a plate crop to a fixed height"""
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    gray = deskew(gray)
+    h, w = gray.shape
+    width = max(1, int(round(w * height / float(h))))
+    interpolation = cv2.INTER_AREA if h > height else cv2.INTER_CUBIC
+    return cv2.resize(gray, (width, height), interpolation=interpolation)
+
+
+def _background(gray):
+    """Plate background level: the median of the crop's border pixels"""
+    border = np.concatenate([gray[0], gray[-1], gray[:, 0], gray[:, -1]])
+    return int(np.median(border))
+
+
+def _pad_to_width(images):
+    """Right-pad normalized crops to a common width so they batch together
+
+    The padding is flat plate background; replicating the last column would
+    smear a character cut by the crop edge into extra glyphs.
+    """
+    width = max(img.shape[1] for img in images)
+    padded = []
+    for img in images:
+        extra = width - img.shape[1]
+        if extra:
+            img = cv2.copyMakeBorder(img, 0, 0, 0, extra, cv2.BORDER_CONSTANT, value=_background(img))
+        padded.append(img)
+    return padded
+
+
+class PlateOCR:
+    """Batched EasyOCR over plate crops, memoized by perceptual hash
+
+    read_many() normalizes every crop, skips the ones whose hash is already
+    cached, and recognizes the rest in a single readtext_batched call.
+    Results are (text, confidence) with text "N/A" when nothing was read.
+    """
+
+    def __init__(self, reader, height=PLATE_HEIGHT, cache_size=4096):
+        self.reader = reader
+        self.height = height
+        self.cache_size = cache_size
+        self._cache = OrderedDict()     # phash -> (text, confidence)
+        self._lock = threading.Lock()
+        self.stats = {"crops": 0, "cache_hits": 0, "ocr_calls": 0, "ocr_crops": 0}
+
+    def _recognize(self, crops):
+        images = _pad_to_width([preprocess(c, self.height) for c in crops])
+        batches = self.reader.readtext_batched(images, batch_size=len(images))
+        results = []
+        for ocr_result in batches:
+            if ocr_result:
+                text = " ".join(res[1] for res in ocr_result)
+                confidence = float(sum(res[2] for res in ocr_result) / len(ocr_result))
+                results.append((text, confidence))
+            else:
+                results.append(("N/A", 0.0))
+        return results
+
+    def read_many(self, crops):
+        """Return (text, confidence) for each crop, in order"""
+        results = [None] * len(crops)
+        keys = [phash(c) if c is not None and c.size else None for c in crops]
+        pending = OrderedDict()         # phash -> indices; identical crops OCR once
+        with self._lock:
+            self.stats["crops"] += len(crops)
+            for i, key in enumerate(keys):
+                if key is None:
+                    results[i] = ("N/A", 0.0)
+                    continue
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    self.stats["cache_hits"] += 1
+                    results[i] = cached
+                else:
+                    pending.setdefault(key, []).append(i)
+
+        if pending:
+            with track("ocr"):
+                recognized = self._recognize([crops[indices[0]] for indices in pending.values()])
+            with self._lock:
+                self.stats["ocr_calls"] += 1
+                self.stats["ocr_crops"] += len(pending)
+                for (key, indices), result in zip(pending.items(), recognized):
+                    for i in indices:
+                        results[i] = result
+                    self._cache[key] = result
+                while len(self._cache) > self.cache_size:
+                    self._cache.popitem(last=False)
+        return results
+
+    def read(self, crop):
+        return self.read_many([crop])[0]
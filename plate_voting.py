@@ -0,0 +1,84 @@
+import heapq
+import itertools
+from collections import Counter, defaultdict
+
+import cv2
+
+from plate_index import normalize_plate
+
+
+def sharpness(crop):
+    """Variance of the Laplacian; higher means a crisper crop"""
+    gray = crop if crop.ndim == 2 else cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
+    return float(cv2.Laplacian(gray, cv2.CV_64F).var())
+
+
+def vote(readings):
+    """Combine (text, confidence) readings into (plate, confidence)
+
+    The most supported length wins; then each character position is voted
+    on, weighted by reading confidence. The result's confidence is the mean
+    share of weight behind each chosen character, scaled by the mean OCR
+    confidence of the readings that took part.
+    """
+    readings = [(normalize_plate(text), conf) for text, conf in readings]
+    readings = [(text, max(conf, 1e-3)) for text, conf in readings if text and text != "NA"]
+    if not readings:
+        return None, 0.0
+
+    by_length = Counter()
+    for text, conf in readings:
+        by_length[len(text)] += conf
+    length = max(by_length, key=lambda n: (by_length[n], n))
+    voters = [(text, conf) for text, conf in readings if len(text) == length]
+
+    chars, shares = [], []
+    for i in range(length):
+        weights = defaultdict(float)
+        for text, conf in voters:
+            weights[text[i]] += conf
+        char, weight = max(weights.items(), key=lambda item: item[1])
+        chars.append(char)
+        shares.append(weight / sum(weights.values()))
+
+    mean_conf = sum(conf for _, conf in voters) / len(voters)
+    return "".join(chars), round(sum(shares) / len(shares) * mean_conf, 4)
+
+
+class PlateTrackAggregator:
+    """Keep the top_k best plate crops per track and OCR only those
+
+    Crops are scored by sharpness times area, so large, in-focus views win.
+    read() OCRs a track's kept crops in one batched call and votes them
+    into a single plate string.
+    """
+
+    def __init__(self, plate_ocr, top_k=5):
+        self.plate_ocr = plate_ocr
+        self.top_k = top_k
+        self._crops = defaultdict(list)     # track_id -> min-heap of (score, seq, crop)
+        self._seq = itertools.count()
+        self.ocr_crops = 0
+
+    def add(self, track_id, crop):
+        if crop is None or crop.size == 0:
+            return
+        score = sharpness(crop) * crop.shape[0] * crop.shape[1]
+        heap = self._crops[track_id]
+        entry = (score, next(self._seq), crop.copy())
+        if len(heap) < self.top_k:
+            heapq.heappush(heap, entry)
+        elif score > heap[0][0]:
+            heapq.heapreplace(heap, entry)
+
+    def read(self, track_id):
+        """(plate, confidence, crops_read) for a track, from its kept crops"""
+        crops = [crop for _, _, crop in sorted(self._crops.get(track_id, []), reverse=True)]
+        if not crops:
+            return None, 0.0, 0
+        self.ocr_crops += len(crops)
+        plate, confidence = vote(self.plate_ocr.read_many(crops))
+        return plate, confidence, len(crops)
+
+    def discard(self, track_id):
+        self._crops.pop(track_id, None)
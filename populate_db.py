@@ -1,6 +1,8 @@
 from pymongo import MongoClient
 from dotenv import load_dotenv
 import os
+from rule_index import bump_rules_version
+from db_schema import ensure_indexes
 
 load_dotenv()
 MONGO_URI = os.getenv('MONGO_URI')
@@ -76,5 +78,7 @@ rules = [
 db.owners.insert_many(owners)
 db.vehicles.insert_many(vehicles)
 db.rules.insert_many(rules)
+bump_rules_version(db)
+ensure_indexes(db)
 
 print("Mock data inserted successfully!")
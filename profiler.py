@@ -0,0 +1,169 @@
+import cProfile
+import functools
+import glob
+import os
+import pstats
+import random
+import threading
+import time
+import uuid
+
+
+class SamplingProfiler:
+    """Opt-in cProfile capture for a random fraction of calls
+
+    sample_rate=0 (the default) disables it; a disabled check is one float
+    comparison. Sampled calls are profiled on the calling thread and dumped
+    to directory as <name>-<time>-<ms>ms-<id>.prof; only the newest max_dumps
+    files are kept. At most one call is profiled at a time: the profiler
+    hook is process-wide on recent interpreters, and an overlapping sample
+    would also skew the one already running.
+    """
+
+    def __init__(self, directory=".profiles", sample_rate=0.0, max_dumps=50):
+        self.directory = directory
+        self.sample_rate = 0.0
+        self.max_dumps = max_dumps
+        self._busy = threading.Lock()
+        self._lock = threading.Lock()
+        self.stats = {"sampled": 0, "skipped_busy": 0, "dumps_removed": 0, "errors": 0}
+        self.configure(sample_rate=sample_rate)
+
+    def configure(self, sample_rate=None, max_dumps=None):
+        if sample_rate is not None:
+            sample_rate = float(sample_rate)
+            if not 0.0 <= sample_rate <= 1.0:
+                raise ValueError("sample_rate must be between 0 and 1")
+            self.sample_rate = sample_rate
+        if max_dumps is not None:
+            if int(max_dumps) < 1:
+                raise ValueError("max_dumps must be at least 1")
+            self.max_dumps = int(max_dumps)
+            self._prune()
+
+    def _should_sample(self):
+        rate = self.sample_rate
+        return rate > 0.0 and (rate >= 1.0 or random.random() < rate)
+
+    def call(self, name, fn, *args, **kwargs):
+        """Run fn, profiling it if this call is sampled"""
+        if not self._should_sample():
+            return fn(*args, **kwargs)
+        if not self._busy.acquire(blocking=False):
+            with self._lock:
+                self.stats["skipped_busy"] += 1
+            return fn(*args, **kwargs)
+        try:
+            profile = cProfile.Profile()
+            start = time.perf_counter()
+            profile.enable()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                profile.disable()
+                self._dump(name, profile, time.perf_counter() - start)
+        finally:
+            self._busy.release()
+
+    def _dump(self, name, profile, elapsed):
+        stamp = time.strftime("%Y%m%dT%H%M%S")
+        path = os.path.join(self.directory, f"{name}-{stamp}-{int(elapsed * 1000)}ms-{uuid.uuid4().hex[:6]}.prof")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            tmp = f"{path}.tmp"
+            profile.dump_stats(tmp)
+            os.replace(tmp, path)
+            with self._lock:
+                self.stats["sampled"] += 1
+            self._prune()
+        except OSError as e:
+            print(f"⚠️  Could not write profile {path}: {e}")
+            with self._lock:
+                self.stats["errors"] += 1
+
+    def dumps(self, name=None):
+        """Dump paths, newest first, optionally only those for name"""
+        paths = glob.glob(os.path.join(self.directory, "*.prof"))
+        if name:
+            paths = [p for p in paths if os.path.basename(p).startswith(f"{name}-")]
+        return sorted(paths, key=lambda p: (os.path.getmtime(p), p), reverse=True)
+
+    def _prune(self):
+        with self._lock:
+            for path in self.dumps()[self.max_dumps:]:
+                try:
+                    os.remove(path)
+                    self.stats["dumps_removed"] += 1
+                except OSError:
+                    pass
+
+    def summary(self, paths=None, limit=20, sort="cumulative"):
+        """Top functions over the given dumps (default: all), merged
+
+        Returns dicts with function, file, line, ncalls, tottime and cumtime,
+        sorted by sort ("cumulative" or "tottime").
+        """
+        if sort not in ("cumulative", "tottime"):
+            raise ValueError("sort must be 'cumulative' or 'tottime'")
+        paths = self.dumps() if paths is None else list(paths)
+        if not paths:
+            return {"dumps": 0, "functions": []}
+        stats = pstats.Stats(*paths)
+        column = 3 if sort == "cumulative" else 2
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][column], reverse=True)[:limit]
+        return {
+            "dumps": len(paths),
+            "total_time": round(stats.total_tt, 6),
+            "functions": [{
+                "function": func,
+                "file": filename,
+                "line": line,
+                "ncalls": nc,
+                "tottime": round(tt, 6),
+                "cumtime": round(ct, 6),
+            } for (filename, line, func), (_, nc, tt, ct, _) in rows],
+        }
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+        stats.update({
+            "enabled": self.sample_rate > 0.0,
+            "sample_rate": self.sample_rate,
+            "max_dumps": self.max_dumps,
+            "directory": self.directory,
+            "dumps": len(self.dumps()),
+        })
+        return stats
+
+
+_profiler = None
+_profiler_lock = threading.Lock()
+
+
+def get_profiler():
+    """Return the process-wide SamplingProfiler, configured from the environment
+
+    PROFILE_SAMPLE_RATE (0-1, default 0 = off), PROFILE_DIR (default
+    .profiles) and PROFILE_MAX_DUMPS (default 50).
+    """
+    global _profiler
+    if _profiler is None:
+        with _profiler_lock:
+            if _profiler is None:
+                _profiler = SamplingProfiler(
+                    directory=os.getenv("PROFILE_DIR", ".profiles"),
+                    sample_rate=float(os.getenv("PROFILE_SAMPLE_RATE", "0")),
+                    max_dumps=int(os.getenv("PROFILE_MAX_DUMPS", "50")),
+                )
+    return _profiler
+
+
+def profiled(name):
+    """Decorator: profile a sampled fraction of calls under name"""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            return get_profiler().call(name, fn, *args, **kwargs)
+        return wrapper
+    return decorate
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+"""
+INT8 post-training quantization of the helmet model, with an accuracy gate
+"""
+
+import argparse
+import json
+import os
+import re
+import sys
+
+import cv2
+import numpy as np
+
+from inference_engine import BACKEND_SUFFIXES, DEFAULT_MODEL_PATH
+from tracker import iou
+
+CALIBRATION_DIR = "datasets/helmet/images/val"
+DATA_YAML = "datasets/helmet/data.yaml"
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp")
+# Classes whose recall may not regress: a missed NoHelmet is a missed challan
+GUARDED_CLASSES = ("NoHelmet",)
+
+
+def letterbox(img, size=640):
+    """Resize keeping aspect ratio, pad to size x size, return a 1x3xHxW float blob"""
+    h, w = img.shape[:2]
+    scale = min(size / h, size / w)
+    nh, nw = int(round(h * scale)), int(round(w * scale))
+    canvas = np.full((size, size, 3), 114, dtype=np.uint8)
+    top, left = (size - nh) // 2, (size - nw) // 2
+    canvas[top:top + nh, left:left + nw] = cv2.resize(img, (nw, nh), interpolation=cv2.INTER_LINEAR)
+    blob = cv2.cvtColor(canvas, cv2.COLOR_BGR2RGB).transpose(2, 0, 1)[None]
+    return np.ascontiguousarray(blob, dtype=np.float32) / 255.0
+
+
+def list_images(directory, limit=None):
+    paths = sorted(os.path.join(directory, f) for f in os.listdir(directory) if f.lower().endswith(IMAGE_EXTENSIONS))
+    return paths[:limit] if limit else paths
+
+
+def label_path_for(image_path):
+    """datasets/helmet/images/val/x.jpg -> datasets/helmet/labels/val/x.txt"""
+    parts = image_path.replace("\\", "/").rsplit("/images/", 1)
+    stem = os.path.splitext(parts[-1])[0]
+    return f"{parts[0]}/labels/{stem}.txt" if len(parts) == 2 else os.path.splitext(image_path)[0] + ".txt"
+
+
+def load_labels(label_path, width, height):
+    """YOLO-format labels as [(class_id, [x1, y1, x2, y2])] in pixels"""
+    if not os.path.exists(label_path):
+        return []
+    boxes = []
+    with open(label_path) as f:
+        for line in f:
+            fields = line.split()
+            if len(fields) < 5:
+                continue
+            cls, cx, cy, bw, bh = int(fields[0]), *(float(v) for v in fields[1:5])
+            boxes.append((cls, [(cx - bw / 2) * width, (cy - bh / 2) * height,
+                                (cx + bw / 2) * width, (cy + bh / 2) * height]))
+    return boxes
+
+
+def match_recall(predictions, ground_truth, iou_threshold=0.5):
+    """Per-class (true positives, ground-truth count) for one image
+
+    predictions and ground_truth are [(class_id, bbox)]; predictions are
+    matched greedily, best confidence first (pass them sorted), to the
+    unmatched ground-truth box of the same class with the highest IoU.
+    """
+    counts = {}
+    matched = set()
+    for cls, _ in ground_truth:
+        tp, total = counts.get(cls, (0, 0))
+        counts[cls] = (tp, total + 1)
+    for cls, box in predictions:
+        best, best_iou = None, iou_threshold
+        for j, (gt_cls, gt_box) in enumerate(ground_truth):
+            if gt_cls != cls or j in matched:
+                continue
+            overlap = iou(box, gt_box)
+            if overlap >= best_iou:
+                best, best_iou = j, overlap
+        if best is not None:
+            matched.add(best)
+            tp, total = counts[cls]
+            counts[cls] = (tp + 1, total)
+    return counts
+
+
+def evaluate(model_path, images, data_yaml=DATA_YAML, confidence=0.25, imgsz=640):
+    """mAP (Ultralytics val) and per-class recall at the serving confidence
+
+    Recall is measured at confidence, the threshold detections are actually
+    served with, rather than at the F1-optimal one Ultralytics reports.
+    """
+    from ultralytics import YOLO
+
+    model = YOLO(model_path, task="detect")
+    metrics = model.val(data=data_yaml, split="val", imgsz=imgsz, batch=1, device="cpu", plots=False,
+                        verbose=False)
+    names = model.names
+
+    totals = {}
+    for path in images:
+        img = cv2.imread(path)
+        if img is None:
+            continue
+        ground_truth = load_labels(label_path_for(path), img.shape[1], img.shape[0])
+        result = model.predict(img, conf=confidence, imgsz=imgsz, device="cpu", verbose=False)[0]
+        predictions = []
+        if result.boxes is not None:
+            for box in sorted(result.boxes, key=lambda b: -b.conf.item()):
+                predictions.append((int(box.cls.item()), box.xyxy[0].tolist()))
+        for cls, (tp, total) in match_recall(predictions, ground_truth).items():
+            seen_tp, seen_total = totals.get(cls, (0, 0))
+            totals[cls] = (seen_tp + tp, seen_total + total)
+
+    return {
+        "model": model_path,
+        "map50": round(float(metrics.box.map50), 4),
+        "map50_95": round(float(metrics.box.map), 4),
+        "recall": {names[cls]: round(tp / total, 4) if total else None for cls, (tp, total) in sorted(totals.items())},
+        "instances": {names[cls]: total for cls, (_, total) in sorted(totals.items())},
+    }
+
+
+def gate(baseline, candidate, max_recall_drop=0.02, max_map_drop=0.02, guarded=GUARDED_CLASSES):
+    """Return (passed, reasons) for promoting candidate over baseline"""
+    reasons = []
+    for cls in guarded:
+        before, after = baseline["recall"].get(cls), candidate["recall"].get(cls)
+        if before is None:
+            reasons.append(f"no {cls} instances in the validation split; cannot check its recall")
+        elif after is None or before - after > max_recall_drop:
+            reasons.append(f"{cls} recall dropped from {before:.3f} to {after or 0.0:.3f} "
+                           f"(limit {max_recall_drop:.3f})")
+    if baseline["map50"] - candidate["map50"] > max_map_drop:
+        reasons.append(f"mAP50 dropped from {baseline['map50']:.3f} to {candidate['map50']:.3f} "
+                       f"(limit {max_map_drop:.3f})")
+    return not reasons, reasons
+
+
+def _head_nodes(onnx_path):
+    """Nodes of the last /model.N/ block (the Detect head), kept in float"""
+    import onnx
+
+    nodes = [n.name for n in onnx.load(onnx_path).graph.node]
+    blocks = [int(m.group(1)) for m in (re.match(r"/model\.(\d+)/", name) for name in nodes) if m]
+    if not blocks:
+        return []
+    prefix = f"/model.{max(blocks)}/"
+    return [name for name in nodes if name.startswith(prefix)]
+
+
+def quantize(onnx_path, output_path, calibration_images, imgsz=640, keep_head_float=True):
+    """Static INT8 quantization (QDQ, per-channel weights) calibrated on images"""
+    import onnxruntime as ort
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod, QuantFormat, QuantType,
+                                          quantize_static)
+
+    input_name = ort.InferenceSession(onnx_path, providers=["CPUExecutionProvider"]).get_inputs()[0].name
+
+    class ImageReader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(calibration_images)
+
+        def get_next(self):
+            for path in self._paths:
+                img = cv2.imread(path)
+                if img is not None:
+                    return {input_name: letterbox(img, imgsz)}
+            return None
+
+    print(f"🧮 Calibrating on {len(calibration_images)} image(s)")
+    quantize_static(
+        onnx_path, output_path, ImageReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        # Box regression and class scores are sensitive to INT8 rounding
+        nodes_to_exclude=_head_nodes(onnx_path) if keep_head_float else [],
+    )
+    return output_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Quantize the helmet model to INT8 and gate its promotion")
+    parser.add_argument("--weights", default=DEFAULT_MODEL_PATH)
+    parser.add_argument("--data", default=DATA_YAML)
+    parser.add_argument("--calibration", default=CALIBRATION_DIR)
+    parser.add_argument("--max-images", type=int, default=300, help="calibration images to use")
+    parser.add_argument("--imgsz", type=int, default=640)
+    parser.add_argument("--confidence", type=float, default=0.25, help="serving threshold for recall")
+    parser.add_argument("--max-recall-drop", type=float, default=0.02, help="allowed NoHelmet recall drop")
+    parser.add_argument("--max-map-drop", type=float, default=0.02, help="allowed mAP50 drop")
+    parser.add_argument("--quantize-head", action="store_true", help="also quantize the Detect head")
+    args = parser.parse_args(argv)
+
+    base = os.path.splitext(args.weights)[0]
+    fp32_path = base + BACKEND_SUFFIXES["onnx"]
+    int8_path = base + BACKEND_SUFFIXES["onnx-int8"]
+    candidate_path = base + ".int8.candidate.onnx"
+
+    if not os.path.exists(fp32_path):
+        from export_model import export_onnx
+
+        fp32_path = export_onnx(args.weights, imgsz=args.imgsz)
+
+    images = list_images(args.calibration)
+    if not images:
+        print(f"❌ No images in {args.calibration}")
+        return 1
+    quantize(fp32_path, candidate_path, images[:args.max_images], imgsz=args.imgsz,
+             keep_head_float=not args.quantize_head)
+
+    print("📏 Evaluating FP32 baseline and INT8 candidate on the validation split")
+    baseline = evaluate(fp32_path, images, args.data, args.confidence, args.imgsz)
+    candidate = evaluate(candidate_path, images, args.data, args.confidence, args.imgsz)
+    for report in (baseline, candidate):
+        recall = ", ".join(f"{cls} {r:.3f}" for cls, r in report["recall"].items() if r is not None)
+        print(f"   {report['model']}: mAP50 {report['map50']:.3f}, mAP50-95 {report['map50_95']:.3f}, "
+              f"recall {recall}")
+
+    passed, reasons = gate(baseline, candidate, args.max_recall_drop, args.max_map_drop)
+    with open(base + ".int8.json", "w") as f:
+        json.dump({"baseline": baseline, "candidate": candidate, "promoted": passed, "reasons": reasons}, f, indent=2)
+    if not passed:
+        for reason in reasons:
+            print(f"❌ {reason}")
+        print(f"🚫 Not promoted; candidate left at {candidate_path}")
+        return 1
+
+    os.replace(candidate_path, int8_path)
+    print(f"✅ Promoted to {int8_path}; select it with INFERENCE_BACKEND=onnx-int8")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,142 @@
+import copy
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+
+
+def cache_key(image_bytes, model_version, confidence):
+    """SHA-256 of the image bytes, bound to the model version and threshold"""
+    digest = hashlib.sha256(image_bytes).hexdigest()
+    return hashlib.sha256(f"{digest}:{model_version}:{confidence:.4f}".encode()).hexdigest()
+
+
+class ResultCache:
+    """Two-tier cache of detection results keyed by cache_key()
+
+    Tier one is an in-memory LRU of max_entries results. Tier two is one
+    JSON file per result under directory, evicted oldest-first (by mtime,
+    refreshed on every disk hit) once the files exceed max_bytes. A disk
+    hit is promoted back into memory. Values must be JSON-serializable;
+    get() hands out deep copies so callers can mutate them freely.
+    """
+
+    def __init__(self, max_entries=1024, directory=".cache/results", max_bytes=256 * 1024 * 1024):
+        self.max_entries = max_entries
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "stores": 0, "disk_evictions": 0}
+        self._disk_bytes = 0
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+            self._disk_bytes = sum(entry.stat().st_size for entry in os.scandir(directory)
+                                   if entry.name.endswith(".json"))
+
+    def _path(self, key):
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key, value):
+        self._memory[key] = value
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """The cached value for key, or None"""
+        with self._lock:
+            value = self._memory.get(key)
+            if value is not None:
+                self._memory.move_to_end(key)
+                self.stats["memory_hits"] += 1
+                return copy.deepcopy(value)
+        value = self._read_disk(key)
+        with self._lock:
+            if value is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            self._remember(key, value)
+        return copy.deepcopy(value)
+
+    def _read_disk(self, key):
+        if not self.directory:
+            return None
+        path = self._path(key)
+        try:
+            with open(path) as f:
+                value = json.load(f)
+            os.utime(path)
+            return value
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, value):
+        value = copy.deepcopy(value)
+        with self._lock:
+            self._remember(key, value)
+            self.stats["stores"] += 1
+        if self.directory:
+            self._write_disk(key, value)
+
+    def _write_disk(self, key, value):
+        path = self._path(key)
+        data = json.dumps(value, default=str).encode()
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        with self._lock:
+            previous = os.path.getsize(path) if os.path.exists(path) else 0
+            os.replace(tmp, path)
+            self._disk_bytes += len(data) - previous
+            if self._disk_bytes > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        """Delete least recently used files until 90% of max_bytes is left"""
+        entries = sorted((e for e in os.scandir(self.directory) if e.name.endswith(".json")),
+                         key=lambda e: e.stat().st_mtime)
+        target = self.max_bytes * 0.9
+        for entry in entries:
+            if self._disk_bytes <= target:
+                break
+            try:
+                size = entry.stat().st_size
+                os.remove(entry.path)
+            except OSError:
+                continue
+            self._disk_bytes -= size
+            self.stats["disk_evictions"] += 1
+
+    def report(self):
+        with self._lock:
+            stats = dict(self.stats)
+            stats["memory_entries"] = len(self._memory)
+            stats["disk_bytes"] = self._disk_bytes
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_result_cache():
+    """Return the process-wide ResultCache, configured from the environment
+
+    RESULT_CACHE_SIZE (in-memory entries), RESULT_CACHE_DIR (empty string
+    disables the disk tier) and RESULT_CACHE_MAX_MB.
+    """
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ResultCache(
+                    max_entries=int(os.getenv("RESULT_CACHE_SIZE", "1024")),
+                    directory=os.getenv("RESULT_CACHE_DIR", ".cache/results"),
+                    max_bytes=int(float(os.getenv("RESULT_CACHE_MAX_MB", "256")) * 1024 * 1024),
+                )
+    return _cache
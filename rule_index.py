@@ -0,0 +1,87 @@
+import bisect
+import threading
+import time
+
+RULES_VERSION_ID = "rules_version"
+
+
+def bump_rules_version(db):
+    """Signal every RuleIndex on db that the rules collection changed"""
+    db.meta.update_one({"_id": RULES_VERSION_ID}, {"$inc": {"version": 1}}, upsert=True)
+
+
+class RuleIndex:
+    """In-process copy of the active rules, keyed by violation class
+
+    Each class's rules are presorted by min_confidence, so matching a
+    detection is a bisect rather than a database query. The index is
+    rebuilt when it is older than ttl seconds and the rules version in
+    db.meta has moved (or no version is kept), or when invalidate() is called.
+    """
+
+    def __init__(self, db, ttl=60.0):
+        self.db = db
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._index = None          # violation_class -> (thresholds, rules)
+        self._version = None
+        self._checked_at = 0.0
+        self.reloads = 0
+
+    def _current_version(self):
+        doc = self.db.meta.find_one({"_id": RULES_VERSION_ID})
+        return doc.get("version") if doc else None
+
+    def _build(self, version):
+        grouped = {}
+        for rule in self.db.rules.find({"active": True}):
+            grouped.setdefault(rule.get("violation_class"), []).append(rule)
+        index = {}
+        for class_name, rules in grouped.items():
+            rules.sort(key=lambda r: r.get("min_confidence", 0.0))
+            index[class_name] = ([r.get("min_confidence", 0.0) for r in rules], rules)
+        self._index = index
+        self._version = version
+        self.reloads += 1
+
+    def _ensure_fresh(self):
+        now = time.monotonic()
+        if self._index is not None and now - self._checked_at < self.ttl:
+            return
+        with self._lock:
+            if self._index is not None and now - self._checked_at < self.ttl:
+                return
+            version = self._current_version()
+            if self._index is None or version is None or version != self._version:
+                self._build(version)
+            self._checked_at = now
+
+    def invalidate(self):
+        """Force a rebuild on the next lookup"""
+        with self._lock:
+            self._index = None
+
+    def rules_for(self, class_name, confidence):
+        """Active rules for class_name whose min_confidence <= confidence"""
+        self._ensure_fresh()
+        entry = self._index.get(class_name)
+        if not entry:
+            return []
+        thresholds, rules = entry
+        return rules[:bisect.bisect_right(thresholds, confidence)]
+
+    def match(self, detections):
+        """Applicable rules for a whole detection list, in detection order"""
+        self._ensure_fresh()
+        index = self._index
+        applicable = []
+        for det in detections:
+            class_name = det.get('class')
+            if not class_name:
+                continue
+            entry = index.get(class_name)
+            if not entry:
+                continue
+            thresholds, rules = entry
+            applicable.extend(rules[:bisect.bisect_right(thresholds, det.get('confidence', 0.0))])
+        return applicable
@@ -0,0 +1,29 @@
+#!/usr/bin/env python3
+"""
+Tests for the per-stage pipeline benchmark report
+"""
+
+import json
+
+import pytest
+
+import bench_pipeline
+
+
+def test_summarize_cold_and_warm():
+    summary = bench_pipeline.summarize(10.0, [1.0, 2.0, 3.0])
+    assert summary == {"cold_ms": 10.0, "samples": 3, "warm_median_ms": 2.0, "warm_p90_ms": 3.0}
+    assert bench_pipeline.summarize(5.0, []) == {"cold_ms": 5.0, "samples": 0}
+
+
+def test_ingestion_stage_report_is_json():
+    pytest.importorskip("mongomock")
+    report = bench_pipeline.run(stages=["ingestion", "annotation"], image_paths=[], repeats=2)
+
+    stages = json.loads(json.dumps(report))["stages"]
+    assert stages["ingestion"]["samples"] == 2
+    assert stages["ingestion"]["store"] == "mongomock"
+    assert "warm_median_ms" in stages["ingestion_no_rule"]
+    # Without inference results there is nothing to annotate
+    assert "skipped" in stages["annotation"]
+    assert report["meta"]["repeats"] == 2
@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+Tests for the multi-source camera scheduler, replaying local video files
+"""
+
+import time
+
+import cv2
+import numpy as np
+import pytest
+
+from camera_scheduler import CameraScheduler
+
+
+class FakeCapture:
+    """cv2.VideoCapture stand-in whose frames are filled with a source id"""
+
+    def __init__(self, source_id, n_frames):
+        self.source_id = source_id
+        self.n_frames = n_frames
+        self.pos = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.pos >= self.n_frames:
+            return False, None
+        self.pos += 1
+        return True, np.full((4, 4, 3), self.source_id, np.uint8)
+
+    def get(self, prop):
+        return 25.0
+
+    def release(self):
+        pass
+
+
+def write_video(path, n_frames, value, fps=25.0):
+    out = cv2.VideoWriter(str(path), cv2.VideoWriter_fourcc(*"MJPG"), fps, (64, 48))
+    for _ in range(n_frames):
+        out.write(np.full((48, 64, 3), value, np.uint8))
+    out.release()
+
+
+def test_replays_local_files_through_one_shared_model(tmp_path):
+    paths = []
+    for i, value in enumerate((40, 200)):
+        paths.append(tmp_path / f"cam{i}.avi")
+        write_video(paths[-1], 12, value)
+
+    calls = []
+    seen = {}
+
+    def infer(frames):
+        calls.append(len(frames))
+        return [int(f.mean()) for f in frames]
+
+    scheduler = CameraScheduler(infer, batch_size=4,
+                                on_result=lambda name, index, frame, result: seen.setdefault(name, []).append(index))
+    for i, path in enumerate(paths):
+        scheduler.add_source(f"cam{i}", str(path), fps_budget=None, realtime=False)
+    report = scheduler.run()
+
+    assert sum(calls) == 24
+    assert max(calls) > 1
+    assert seen["cam0"] == list(range(12))
+    assert seen["cam1"] == list(range(12))
+    assert [s["processed"] for s in report["sources"]] == [12, 12]
+    assert all(s["dropped"] == 0 for s in report["sources"])
+
+
+def test_batches_take_one_frame_per_source_per_round():
+    scheduler = CameraScheduler(lambda frames: frames, batch_size=4)
+    busy = scheduler.add_source("busy", "a", fps_budget=None)
+    quiet = scheduler.add_source("quiet", "b", fps_budget=None)
+    busy._buffer.extend(("busy", i) for i in range(10))
+    quiet._buffer.extend(("quiet", i) for i in range(1))
+
+    first = [item for _, item in scheduler._next_batch()]
+    assert first == [("busy", 0), ("quiet", 0), ("busy", 1), ("busy", 2)]
+
+    quiet._buffer.extend(("quiet", i) for i in range(1, 3))
+    second = [item for _, item in scheduler._next_batch()]
+    # The round starts one source further on each batch
+    assert second == [("quiet", 1), ("busy", 3), ("quiet", 2), ("busy", 4)]
+
+
+def test_fps_budget_limits_each_source():
+    scheduler = CameraScheduler(lambda frames: frames, batch_size=4)
+    scheduler.add_source("capped", "a", fps_budget=40, realtime=False,
+                         capture_factory=lambda uri: FakeCapture(1, 12))
+    start = time.perf_counter()
+    report = scheduler.run()
+    assert time.perf_counter() - start >= 11 / 40 * 0.9
+    assert report["sources"][0]["processed"] == 12
+
+
+def test_realtime_sources_drop_frames_when_the_model_lags():
+    def slow_infer(frames):
+        time.sleep(0.01)
+        return frames
+
+    scheduler = CameraScheduler(slow_infer, batch_size=1)
+    scheduler.add_source("cam", "rtsp://cam", fps_budget=None, realtime=True, buffer_size=2,
+                         capture_factory=lambda uri: FakeCapture(1, 500))
+    report = scheduler.run()
+    source = report["sources"][0]
+    assert source["dropped"] > 0
+    assert source["processed"] + source["dropped"] == source["frames_read"]
+    assert source["max_lag"] >= source["mean_lag"] > 0
+
+
+def test_result_handler_errors_do_not_stop_other_feeds():
+    seen = []
+
+    def on_result(name, index, frame, result):
+        if name == "bad":
+            raise RuntimeError("boom")
+        seen.append(index)
+
+    scheduler = CameraScheduler(lambda frames: frames, on_result=on_result)
+    for name, value in (("bad", 1), ("good", 2)):
+        scheduler.add_source(name, name, fps_budget=None, realtime=False,
+                             capture_factory=lambda uri, value=value: FakeCapture(value, 50))
+    report = scheduler.run()
+    by_name = {s["source"]: s for s in report["sources"]}
+    assert by_name["bad"]["handler_errors"] == 50
+    assert by_name["good"]["handler_errors"] == 0
+    assert seen == list(range(50))
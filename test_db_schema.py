@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+"""
+Index bootstrap and query-plan checks; needs a local mongod
+(MONGO_TEST_URI, default mongodb://localhost:27017) and is skipped otherwise
+"""
+
+import os
+
+import pytest
+from pymongo import MongoClient
+from pymongo.errors import PyMongoError
+
+from db_schema import INDEXES, ensure_indexes, hot_queries, redundant_indexes, verify_query_plans
+
+
+@pytest.fixture
+def db():
+    client = MongoClient(os.getenv("MONGO_TEST_URI", "mongodb://localhost:27017"),
+                         serverSelectionTimeoutMS=500)
+    try:
+        client.admin.command("ping")
+    except PyMongoError:
+        pytest.skip("no local mongod")
+    db = client["echallan_schema_test"]
+    client.drop_database(db.name)
+    yield db
+    client.drop_database(db.name)
+    client.close()
+
+
+def test_hot_queries_collection_scan_without_indexes(db):
+    for collection, _, _ in hot_queries():
+        db[collection].insert_one({"seed": True})
+    assert verify_query_plans(db)
+
+
+def test_ensure_indexes_is_idempotent_and_removes_scans(db):
+    first = ensure_indexes(db)
+    assert ensure_indexes(db) == first
+    assert verify_query_plans(db) == []
+
+
+def test_no_index_extends_a_unique_one():
+    assert redundant_indexes() == []
+    extended = dict(INDEXES, owners=INDEXES["owners"] + [([("owner_id", 1), ("_id", 1)], {})])
+    assert redundant_indexes(extended) == [("owners", [("owner_id", 1), ("_id", 1)])]
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+"""
+Tests for the background annotated-image writer
+"""
+
+import os
+import threading
+
+import cv2
+import numpy as np
+import pytest
+
+from image_store import ImageStore, thumbnail
+
+
+class FakeBoxes:
+    def __init__(self, data):
+        self.data = data
+
+
+class FakeResult:
+    """Stand-in for an ultralytics Results object"""
+
+    def __init__(self, image, boxes, gate=None):
+        self.orig_img = image
+        self.boxes = FakeBoxes(np.asarray(boxes, dtype=np.float32))
+        self.gate = gate
+        self.plots = 0
+
+    def plot(self):
+        if self.gate is not None:
+            self.gate.wait()
+        self.plots += 1
+        out = self.orig_img.copy()
+        for x1, y1, x2, y2, *_ in self.boxes.data.astype(int):
+            cv2.rectangle(out, (x1, y1), (x2, y2), (0, 0, 255), 2)
+        return out
+
+
+def frame(seed=0, shape=(480, 640, 3)):
+    return np.random.default_rng(seed).integers(0, 255, shape, dtype=np.uint8)
+
+
+def test_save_returns_before_rendering_and_writes_in_background(tmp_path):
+    gate = threading.Event()
+    store = ImageStore(thumbnail_size=0)
+    result = FakeResult(frame(), [[10, 10, 100, 100, 0.9, 0]], gate=gate)
+
+    path = store.save_result(result, str(tmp_path))
+    assert not os.path.exists(path)
+    assert result.plots == 0
+
+    gate.set()
+    assert store.wait(path, timeout=5)
+    assert cv2.imread(path).shape == (480, 640, 3)
+    assert store.report()["written"] == 1
+
+
+def test_waiting_on_a_thumbnail_waits_for_its_image(tmp_path):
+    gate = threading.Event()
+    store = ImageStore(thumbnail_size=160)
+    path = store.save_result(FakeResult(frame(), [[10, 10, 100, 100, 0.9, 0]], gate=gate), str(tmp_path))
+    thumb = store.thumbnail_path(path)
+
+    threading.Timer(0.2, gate.set).start()
+    assert store.wait(thumb, timeout=5)
+    assert cv2.imread(thumb).shape[1] == 160
+
+
+def test_filenames_are_content_addressed(tmp_path):
+    store = ImageStore(thumbnail_size=0)
+    a = store.save_result(FakeResult(frame(1), [[0, 0, 5, 5, 0.9, 0]]), str(tmp_path))
+    b = store.save_result(FakeResult(frame(1), [[0, 0, 5, 5, 0.9, 0]]), str(tmp_path))
+    c = store.save_result(FakeResult(frame(1), [[0, 0, 6, 6, 0.9, 0]]), str(tmp_path))
+    store.flush()
+    assert a == b != c
+    assert store.report()["written"] == 2
+    assert store.report()["reused"] == 1
+
+
+@pytest.mark.parametrize("fmt", ["jpg", "webp", "png"])
+def test_formats_and_thumbnails(tmp_path, fmt):
+    store = ImageStore(fmt=fmt, quality=80, thumbnail_size=160)
+    path = store.save_image(frame(2), str(tmp_path))
+    store.flush()
+    assert path.endswith(f".{fmt}")
+    assert cv2.imread(path).shape == (480, 640, 3)
+    assert cv2.imread(store.thumbnail_path(path)).shape == (120, 160, 3)
+
+
+def test_unknown_format_is_rejected():
+    with pytest.raises(ValueError):
+        ImageStore(fmt="tiff")
+
+
+def test_thumbnail_never_upscales():
+    small = frame(3, shape=(50, 80, 3))
+    assert thumbnail(small, 320) is small
@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+"""
+Tests for model path and backend resolution in the inference engine
+"""
+
+import pytest
+
+from inference_engine import FALLBACK_MODEL_PATH, InferenceEngine
+
+
+def test_torch_backend_uses_pt_weights(tmp_path):
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"pt")
+    (tmp_path / "best.onnx").write_bytes(b"onnx")
+    assert InferenceEngine(backend="torch").resolve_model_path(str(weights)) == str(weights)
+
+
+def test_onnx_backend_uses_exported_model(tmp_path):
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"pt")
+    (tmp_path / "best.onnx").write_bytes(b"onnx")
+    engine = InferenceEngine(backend="onnx")
+    assert engine.resolve_model_path(str(weights)) == str(tmp_path / "best.onnx")
+    # A per-call backend overrides the engine default
+    assert engine.resolve_model_path(str(weights), backend="torch") == str(weights)
+    assert engine.model_version(str(weights)) != engine.model_version(str(weights), backend="torch")
+
+
+def test_onnx_backend_falls_back_to_weights_when_not_exported(tmp_path):
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"pt")
+    assert InferenceEngine(backend="onnx").resolve_model_path(str(weights)) == str(weights)
+
+
+def test_missing_weights_fall_back_to_pretrained(tmp_path):
+    assert InferenceEngine().resolve_model_path(str(tmp_path / "nope.pt")) == FALLBACK_MODEL_PATH
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        InferenceEngine(backend="tensorrt")
+
+
+def test_int8_backend_uses_only_the_promoted_model(tmp_path):
+    weights = tmp_path / "best.pt"
+    weights.write_bytes(b"pt")
+    (tmp_path / "best.onnx").write_bytes(b"onnx")
+    (tmp_path / "best.int8.candidate.onnx").write_bytes(b"candidate")
+    engine = InferenceEngine(backend="onnx-int8")
+    assert engine.resolve_model_path(str(weights)) == str(weights)
+    (tmp_path / "best.int8.onnx").write_bytes(b"int8")
+    assert engine.resolve_model_path(str(weights)) == str(tmp_path / "best.int8.onnx")
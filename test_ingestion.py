@@ -0,0 +1,209 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process /detect ingestion service (needs mongomock)
+"""
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from db_schema import ensure_indexes
+from ingestion import IngestionService
+from notifications import MockTransport, NotificationDispatcher
+from owner_resolver import OwnerResolver
+from plate_index import PlateIndex
+from rule_index import RuleIndex
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["echallan"]
+    db.owners.insert_one({"owner_id": "OWN001", "name": "Aadita Nag", "phone": "+916901578022"})
+    db.vehicles.insert_one({"vehicle_no": "MH01AB1234", "owner_id": "OWN001"})
+    db.rules.insert_many([
+        {"rule_id": "no_helmet_riding", "violation_class": "NoHelmet", "min_confidence": 0.45,
+         "penalty": 500, "active": True},
+    ])
+    return db
+
+
+@pytest.fixture
+def transport():
+    return MockTransport()
+
+
+@pytest.fixture
+def service(db, transport):
+    notifier = NotificationDispatcher(db, {"sms": transport}, autostart=False)
+    return IngestionService(db, RuleIndex(db), OwnerResolver(db), notifier, PlateIndex(db=db))
+
+
+def payload(detection, vehicle_no=None):
+    return {"source": "test", "timestamp": "2025-10-28T18:00:00Z", "detection": detection,
+            "vehicle_no": vehicle_no, "image_path": "outputs/x.jpg"}
+
+
+def test_no_rule_triggered(service, db):
+    res = service.ingest(payload({"class": "Helmet", "confidence": 0.9}, "MH01AB1234"))
+    assert res["status"] == "ok"
+    assert db.violations.count_documents({}) == 1
+
+
+def test_challan_created_and_sms_queued(service, db, transport):
+    res = service.ingest(payload({"detections": [{"class": "NoHelmet", "confidence": 0.9}]}, "MH01AB1234"))
+    assert res["status"] == "challan_created"
+    challan = db.challans.find_one({"challan_no": res["challan_no"]})
+    assert challan["total_penalty"] == 500
+    assert db.notification_outbox.count_documents({"status": "pending"}) == 1
+
+    service.notifier.drain()
+    assert len(transport.sent) == 1
+    assert db.challans.find_one({"challan_no": res["challan_no"]})["notified"] is True
+
+
+def test_unknown_vehicle_goes_to_manual_review(service, db):
+    res = service.ingest(payload({"class": "NoHelmet", "confidence": 0.9}, "XX00XX0000"))
+    assert res["status"] == "manual_review"
+    assert db.manual_reviews.count_documents({}) == 1
+    assert db.challans.count_documents({}) == 0
+
+
+@pytest.mark.parametrize("reading", ["MH01AB1235", "MP01AB1234"])
+def test_near_miss_plate_goes_to_review_with_candidates(service, db, reading):
+    # One digit or the state code off: possibly an unregistered vehicle
+    res = service.ingest(payload({"detections": [{"class": "NoHelmet", "confidence": 0.9}]}, reading))
+    assert res["status"] == "manual_review"
+    assert db.challans.count_documents({}) == 0
+    assert db.notification_outbox.count_documents({}) == 0
+    review = db.manual_reviews.find_one({})
+    assert review["vehicle_no"] == reading
+    assert review["candidates"][0]["vehicle_no"] == "MH01AB1234"
+
+
+def test_ocr_slip_is_matched_to_registered_plate(service, db):
+    detection = {"detections": [{"class": "NoHelmet", "confidence": 0.9},
+                                {"class": "Vehicle_registration_plate", "confidence": 0.7,
+                                 "plate_text": "MH O1 A8 1234"}]}
+    res = service.ingest(payload(detection))
+    assert res["status"] == "challan_created"
+    challan = db.challans.find_one({"challan_no": res["challan_no"]})
+    assert challan["vehicle_no"] == "MH01AB1234"
+    assert challan["ocr_vehicle_no"] == "MHO1A81234"
+
+
+def test_batch_returns_per_item_results_in_order(service, db):
+    events = [
+        payload({"class": "Helmet", "confidence": 0.9}, "MH01AB1234"),
+        payload({"class": "NoHelmet", "confidence": 0.9}, "MH01AB1234"),
+        payload({"class": "NoHelmet", "confidence": 0.9}, "XX00XX0000"),
+        payload({"class": "NoHelmet", "confidence": 0.9}, "MH01A81234"),
+    ]
+    results = service.ingest_batch(events)
+    assert [r["status"] for r in results] == ["ok", "challan_created", "manual_review", "challan_created"]
+    assert db.violations.count_documents({}) == 4
+    assert db.challans.count_documents({}) == 2
+    assert db.manual_reviews.count_documents({}) == 1
+    assert db.notification_outbox.count_documents({"status": "pending"}) == 2
+
+
+def test_batch_bad_plate_fails_only_its_item(service, db):
+    # A numeric vehicle_no: fine when no rule fires, an error when it must be resolved
+    events = [payload({"class": "NoHelmet", "confidence": 0.9}, "MH01AB1234"),
+              payload({"class": "Helmet", "confidence": 0.9}, 12345),
+              payload({"class": "NoHelmet", "confidence": 0.9}, 12345)]
+    for i, event in enumerate(events):
+        event["timestamp"] = f"2025-10-28T18:00:0{i}Z"
+    results = service.ingest_batch(events)
+    assert [r["status"] for r in results] == ["challan_created", "ok", "error"]
+    assert db.challans.count_documents({}) == 1
+
+
+def test_batch_write_error_marks_only_that_item(service, db):
+    db.challans.create_index("challan_no", unique=True)
+    events = [payload({"class": "NoHelmet", "confidence": 0.9}, "MH01AB1234") for _ in range(2)]
+    events[1]["timestamp"] = "2025-10-28T18:00:01Z"
+    original = service.build_challan
+    service.build_challan = lambda *args, **kwargs: dict(original(*args, **kwargs), challan_no="CH-DUP")
+    results = service.ingest_batch(events)
+    assert results[0]["status"] == "challan_created"
+    assert results[1]["status"] == "error"
+    assert db.challans.count_documents({}) == 1
+    assert db.notification_outbox.count_documents({}) == 1
+
+
+def test_challan_no_collision_is_an_error_not_a_retry(service, db):
+    ensure_indexes(db)
+    events = [payload({"class": "NoHelmet", "confidence": 0.9}, "MH01AB1234") for _ in range(2)]
+    events[1]["timestamp"] = "2025-10-28T18:00:01Z"
+    original = service.build_challan
+    service.build_challan = lambda *args, **kwargs: dict(original(*args, **kwargs), challan_no="CH-DUP")
+    assert service.ingest(events[0])["status"] == "challan_created"
+    assert service.ingest(events[1]) == {"status": "error", "message": "duplicate challan_no"}
+    assert db.challans.count_documents({}) == 1
+    assert db.notification_outbox.count_documents({}) == 1
+
+
+def test_retried_payload_returns_the_original_challan(service, db, transport):
+    ensure_indexes(db)
+    event = payload({"detections": [{"class": "NoHelmet", "confidence": 0.9}]}, "MH01AB1234")
+    first = service.ingest(event)
+    retry = service.ingest(dict(event))
+    assert retry == {"status": "challan_created", "challan_no": first["challan_no"], "duplicate": True}
+    assert db.challans.count_documents({}) == 1
+    assert db.violations.count_documents({}) == 1
+    assert db.notification_outbox.count_documents({}) == 1
+
+    service.notifier.drain()
+    assert len(transport.sent) == 1
+
+
+def test_batch_dedupes_retries_and_repeats(service, db):
+    ensure_indexes(db)
+    event = payload({"class": "NoHelmet", "confidence": 0.9}, "MH01AB1234")
+    first = service.ingest(event)
+    results = service.ingest_batch([dict(event), payload({"class": "NoHelmet", "confidence": 0.9}, "XX00XX0000"),
+                                    payload({"class": "NoHelmet", "confidence": 0.9}, "XX00XX0000")])
+    assert results[0] == {"status": "challan_created", "challan_no": first["challan_no"], "duplicate": True}
+    assert results[1]["status"] == "manual_review" and "duplicate" not in results[1]
+    assert results[2]["duplicate"] is True
+    assert db.challans.count_documents({}) == 1
+    assert db.manual_reviews.count_documents({}) == 1
+    assert db.notification_outbox.count_documents({}) == 1
+
+
+def test_resent_detection_keeps_its_key(service, db, transport, monkeypatch):
+    import time
+
+    import detect_module
+
+    ensure_indexes(db)
+    detection_data = {"timestamp": "2025-10-28T18:00:00.123456", "image_path": "outputs/x.jpg",
+                      "detections": [{"class": "NoHelmet", "confidence": 0.9}]}
+    # build_detection_payload stamps the send time; a retry 6s later differs
+    sent_at = iter([time.gmtime(1761674400), time.gmtime(1761674406)])
+    monkeypatch.setattr(detect_module.time, "gmtime", lambda *args: next(sent_at))
+    first = detect_module.build_detection_payload(detection_data, "MH01AB1234")
+    retry = detect_module.build_detection_payload(detection_data, "MH01AB1234")
+    assert first["timestamp"] != retry["timestamp"]
+
+    original = service.ingest(first)
+    assert service.ingest(retry) == dict(original, duplicate=True)
+    assert db.challans.count_documents({}) == 1
+    assert db.notification_outbox.count_documents({}) == 1
+
+
+def test_client_idempotency_key_wins(service, db):
+    ensure_indexes(db)
+    event = dict(payload({"class": "NoHelmet", "confidence": 0.9}, "MH01AB1234"), idempotency_key="evt-1")
+    service.ingest(event)
+    assert service.ingest(dict(event, timestamp="2025-10-28T18:05:00Z"))["duplicate"] is True
+    assert db.challans.find_one({})["idempotency_key"] == "evt-1"
+
+
+def test_payload_without_timestamp_is_not_deduplicated(service, db):
+    ensure_indexes(db)
+    event = payload({"class": "NoHelmet", "confidence": 0.9}, "MH01AB1234")
+    del event["timestamp"]
+    service.ingest(event)
+    service.ingest(dict(event))
+    assert db.challans.count_documents({}) == 2
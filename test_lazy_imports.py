@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+The web tier must start without importing the ML stack
+"""
+
+import os
+import subprocess
+import sys
+
+import bench_startup
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def test_app_import_loads_no_heavy_modules():
+    for mode in ("web", "full"):
+        report = bench_startup.probe(mode, REPO_DIR)
+        assert report["heavy_modules"] == [], mode
+
+
+def test_detect_module_defers_cv2():
+    code = ("import sys, detect_module, image_store, result_cache; "
+            "print(','.join(m for m in ('cv2', 'numpy', 'ultralytics', 'easyocr') if m in sys.modules))")
+    out = subprocess.run([sys.executable, "-c", code], cwd=REPO_DIR, capture_output=True, text=True, check=True)
+    assert out.stdout.strip() == ""
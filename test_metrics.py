@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for the Prometheus-format metrics registry and stage instrumentation
+"""
+
+import threading
+
+import pytest
+
+from metrics import REGISTRY, Registry, instrument, record_stages, stage_delta, stage_totals, track
+
+
+def _value(text, line_prefix):
+    for line in text.splitlines():
+        if line.startswith(line_prefix + " "):
+            return float(line.rsplit(" ", 1)[1])
+    raise AssertionError(f"{line_prefix} not in output")
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = Registry()
+    hist = registry.histogram("latency_seconds", "Latency", ("stage",), buckets=(0.1, 1.0))
+    child = hist.labels("a")
+    for value in (0.05, 0.1, 0.5, 2.0):
+        child.observe(value)
+
+    text = registry.render()
+    assert "# TYPE latency_seconds histogram" in text
+    assert _value(text, 'latency_seconds_bucket{stage="a",le="0.1"}') == 2    # le is inclusive
+    assert _value(text, 'latency_seconds_bucket{stage="a",le="1.0"}') == 3
+    assert _value(text, 'latency_seconds_bucket{stage="a",le="+Inf"}') == 4
+    assert _value(text, 'latency_seconds_count{stage="a"}') == 4
+    assert _value(text, 'latency_seconds_sum{stage="a"}') == pytest.approx(2.65)
+
+
+def test_counter_gauge_and_label_escaping():
+    registry = Registry()
+    registry.counter("calls_total", "Calls", ("path",)).labels('a"b\\c').inc(3)
+    gauge = registry.gauge("in_flight", "In flight")
+    gauge.labels().inc()
+    gauge.labels().inc()
+    gauge.labels().dec()
+
+    text = registry.render()
+    assert 'calls_total{path="a\\"b\\\\c"} 3' in text
+    assert "in_flight 1" in text
+    with pytest.raises(ValueError):
+        registry.gauge("calls_total", "Calls")
+
+
+def test_instrument_counts_outcomes_and_clears_in_flight():
+    @instrument("test_stage")
+    def work(fail=False):
+        if fail:
+            raise RuntimeError("boom")
+        return 42
+
+    assert work() == 42
+    with pytest.raises(RuntimeError):
+        work(fail=True)
+    with track("test_stage"):
+        pass
+
+    text = REGISTRY.render()
+    assert _value(text, 'echallan_stage_calls_total{stage="test_stage",outcome="ok"}') == 2
+    assert _value(text, 'echallan_stage_calls_total{stage="test_stage",outcome="error"}') == 1
+    assert _value(text, 'echallan_stage_seconds_count{stage="test_stage"}') == 3
+    assert _value(text, 'echallan_stage_in_progress{stage="test_stage"}') == 0
+    assert work.__name__ == "work"
+
+
+def test_concurrent_observations_are_not_lost():
+    registry = Registry()
+    counter = registry.counter("hits_total", "Hits").labels()
+    hist = registry.histogram("h_seconds", "H").labels()
+
+    def hammer():
+        for _ in range(5000):
+            counter.inc()
+            hist.observe(0.001)
+
+    threads = [threading.Thread(target=hammer) for _ in range(4)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    text = registry.render()
+    assert _value(text, "hits_total") == 20000
+    assert _value(text, "h_seconds_count") == 20000
+
+
+def test_stage_delta_round_trips_through_record_stages():
+    before = stage_totals()
+    with track("delta_stage"):
+        pass
+    with pytest.raises(RuntimeError), track("delta_stage"):
+        raise RuntimeError("boom")
+    delta = stage_delta(before, stage_totals())
+    assert set(delta) == {"delta_stage"}
+    assert sum(delta["delta_stage"]["buckets"]) == 2
+    assert delta["delta_stage"]["ok"] == 1 and delta["delta_stage"]["error"] == 1
+
+    # As the parent does with a worker's delta: counts and sums add up
+    record_stages(delta)
+    text = REGISTRY.render()
+    assert _value(text, 'echallan_stage_seconds_count{stage="delta_stage"}') == 4
+    assert _value(text, 'echallan_stage_calls_total{stage="delta_stage",outcome="ok"}') == 2
+    assert stage_delta(stage_totals(), stage_totals()) == {}
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for the notification outbox and dispatcher (needs mongomock)
+"""
+
+import time
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from notifications import MockTransport, NotificationDispatcher, RateLimiter
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["echallan"]
+    db.challans.insert_one({"challan_no": "CH1", "notified": False, "notification_log": []})
+    return db
+
+
+def test_enqueue_then_drain_marks_challan_notified(db):
+    transport = MockTransport()
+    dispatcher = NotificationDispatcher(db, {"sms": transport}, autostart=False)
+    dispatcher.enqueue("CH1", "sms", "+919999999999", "hello")
+
+    assert db.notification_outbox.find_one()["status"] == "pending"
+    assert dispatcher.drain() == 1
+    assert transport.sent == [("+919999999999", "hello")]
+    assert db.notification_outbox.find_one()["status"] == "sent"
+    challan = db.challans.find_one({"challan_no": "CH1"})
+    assert challan["notified"] is True
+    assert challan["notification_log"][0]["status"] == {"status": "mocked"}
+
+
+def test_failures_back_off_then_give_up(db):
+    transport = MockTransport(fail_times=10)
+    dispatcher = NotificationDispatcher(db, {"sms": transport}, max_attempts=2, base_backoff=0,
+                                        autostart=False)
+    dispatcher.enqueue("CH1", "sms", "+91", "hello")
+
+    dispatcher.drain()
+    entry = db.notification_outbox.find_one()
+    assert entry["status"] == "failed" and entry["attempts"] == 2
+    challan = db.challans.find_one({"challan_no": "CH1"})
+    assert challan["notified"] is False
+    assert challan["notification_log"][0]["status"]["status"] == "failed"
+
+
+def test_worker_pool_delivers_in_background(db):
+    transport = MockTransport()
+    dispatcher = NotificationDispatcher(db, {"sms": transport}, workers=2, poll_interval=0.05)
+    for i in range(5):
+        dispatcher.enqueue("CH1", "sms", f"+91{i}", "hello")
+    deadline = time.time() + 5
+    while len(transport.sent) < 5 and time.time() < deadline:
+        time.sleep(0.01)
+    dispatcher.stop()
+    assert sorted(to for to, _ in transport.sent) == [f"+91{i}" for i in range(5)]
+
+
+def test_rate_limiter_spaces_out_sends():
+    limiter = RateLimiter(rate=50, burst=1)
+    start = time.monotonic()
+    for _ in range(6):
+        limiter.acquire()
+    assert time.monotonic() - start >= 0.09
@@ -0,0 +1,60 @@
+#!/usr/bin/env python3
+"""
+Tests for the cached vehicle-to-owner resolver (needs mongomock)
+"""
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from owner_resolver import OwnerResolver
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["echallan"]
+    db.owners.insert_many([
+        {"owner_id": "OWN001", "name": "Aadita Nag", "phone": "+916901578022"},
+        {"owner_id": "OWN002", "name": "Test User", "phone": "+919999999999"},
+    ])
+    db.vehicles.insert_many([
+        {"vehicle_no": "MH01AB1234", "owner_id": "OWN001"},
+        {"vehicle_no": "MH01AA0001", "owner_id": "OWN002"},
+        {"vehicle_no": "MH01ZZ9999", "owner_id": "OWN404"},
+    ])
+    return db
+
+
+def test_resolve_caches_hits_and_misses(db):
+    resolver = OwnerResolver(db)
+    assert resolver.resolve("MH01AB1234")["name"] == "Aadita Nag"
+    assert resolver.resolve("MH01AB1234")["name"] == "Aadita Nag"
+    assert resolver.resolve("XX00XX0000") is None
+    assert resolver.resolve("XX00XX0000") is None
+    assert resolver.resolve(None) is None
+
+    stats = resolver.report()
+    assert stats["queries"] == 2
+    assert stats["hits"] == 2 and stats["negative_hits"] == 1
+
+
+def test_vehicle_without_owner_resolves_to_none(db):
+    assert OwnerResolver(db).resolve("MH01ZZ9999") is None
+
+
+def test_resolve_many_uses_one_query(db):
+    resolver = OwnerResolver(db)
+    owners = resolver.resolve_many(["MH01AB1234", "MH01AA0001", "UNKNOWN", "MH01AB1234"])
+    assert owners["MH01AB1234"]["owner_id"] == "OWN001"
+    assert owners["MH01AA0001"]["owner_id"] == "OWN002"
+    assert owners["UNKNOWN"] is None
+    assert resolver.report()["queries"] == 1
+
+
+def test_lru_eviction_and_ttl(db):
+    resolver = OwnerResolver(db, max_size=1, ttl=0, negative_ttl=0)
+    resolver.resolve("MH01AB1234")
+    resolver.resolve("MH01AA0001")
+    assert resolver.report()["cached"] == 1
+    resolver.resolve("MH01AA0001")
+    assert resolver.report()["queries"] == 3
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for the OCR-confusion-aware plate index
+"""
+
+import random
+import string
+import time
+
+from plate_index import (PlateIndex, coerce_to_grammar, confusion_distance,
+                         is_valid_plate, normalize_plate)
+
+
+def test_normalize_and_grammar():
+    assert normalize_plate(" mh 01-ab 1234 ") == "MH01AB1234"
+    assert is_valid_plate("MH01AB1234")
+    assert is_valid_plate("22BH1234AA")
+    assert not is_valid_plate("MHO1AB1234")
+    assert coerce_to_grammar("MHO1A81234") == "MH01AB1234"
+    assert coerce_to_grammar("22BHI234AA") == "22BH1234AA"
+
+
+def test_confusion_distance_prefers_ocr_slips():
+    assert confusion_distance("MH01AB1234", "MH01AB1234") == 0
+    assert confusion_distance("MHO1AB1234", "MH01AB1234") < confusion_distance("MHX1AB1234", "MH01AB1234")
+
+
+def test_lookup_recovers_common_misreads():
+    index = PlateIndex(["MH01AB1234", "MH01AA0001", "KA05XY9876"])
+    assert index.best_match("MH01AB1234") == "MH01AB1234"
+    assert index.best_match("MHO1A8 1234") == "MH01AB1234"
+    assert index.best_match("MH01AAOOO1") == "MH01AA0001"
+    assert index.best_match("KAO5XY98") is None
+    assert index.best_match("") is None
+    assert index.lookup("MH01AB1234")[0] == ("MH01AB1234", 0.0)
+
+
+def test_real_edits_are_not_auto_corrected():
+    index = PlateIndex(["MH01AB1234", "KA05XY9876"])
+    # A different digit, district, series letter, or a dropped/extra digit is
+    # a different vehicle as far as we know, not an OCR slip
+    for reading in ("MH01AB1235", "MH02AB1234", "MH01XB1234", "MH01AB234", "MH01AB12345", "MP01AB1234", "KA01AB1234"):
+        assert index.best_match(reading) is None, reading
+    # ...but still offered to the reviewer
+    assert index.lookup("MH01AB1235")[0] == ("MH01AB1234", 1.0)
+    # Any number of confusions alone is still corrected
+    assert index.best_match("MHOIA8I234") == "MH01AB1234"
+
+
+def test_ambiguous_reading_has_no_best_match():
+    index = PlateIndex(["MH01AB1234", "MH01AB1235"])
+    assert index.best_match("MH01AB123") is None
+
+
+def test_lookup_is_fast_on_a_realistic_registry():
+    rng = random.Random(0)
+    plates = ["MH%02d%s%04d" % (rng.randint(1, 50), "".join(rng.choices(string.ascii_uppercase, k=2)),
+                                rng.randint(0, 9999)) for _ in range(5000)]
+    index = PlateIndex(plates)
+    target = plates[1234]
+    misread = target.replace("0", "O").replace("8", "B")
+    start = time.perf_counter()
+    for _ in range(50):
+        match = index.best_match(misread)
+    per_lookup = (time.perf_counter() - start) / 50
+    assert match == target
+    assert per_lookup < 0.005
@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+"""
+Tests for plate crop normalization and the batched, hash-memoized OCR stage
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+cv2 = pytest.importorskip("cv2")
+
+from plate_ocr import PlateOCR, _pad_to_width, phash, preprocess
+
+
+def plate(text, width=160, height=40, angle=0.0):
+    img = np.full((height, width, 3), 255, np.uint8)
+    cv2.putText(img, text, (5, height - 10), cv2.FONT_HERSHEY_SIMPLEX, 0.9, (0, 0, 0), 2)
+    if angle:
+        matrix = cv2.getRotationMatrix2D((width / 2, height / 2), angle, 1.0)
+        img = cv2.warpAffine(img, matrix, (width, height), borderValue=(255, 255, 255))
+    return img
+
+
+class FakeReader:
+    def __init__(self):
+        self.calls = []
+
+    def readtext_batched(self, images, batch_size=1):
+        self.calls.append(images)
+        return [[([0, 0], f"PLATE{img.shape[1]}", 0.8)] for img in images]
+
+
+def test_preprocess_normalizes_height_and_grayscale():
+    out = preprocess(plate("MH01AB1234", width=200, height=50), height=64)
+    assert out.ndim == 2 and out.shape[0] == 64
+    assert out.shape[1] == 256
+
+
+def test_phash_is_stable_under_small_changes():
+    a = plate("MH01AB1234")
+    b = np.clip(a.astype(int) + 3, 0, 255).astype(np.uint8)
+    c = plate("KA05XY9876")
+    assert phash(a) == phash(b)
+    assert phash(a) != phash(c)
+
+
+def test_read_many_batches_and_memoizes():
+    reader = FakeReader()
+    ocr = PlateOCR(reader)
+    crops = [plate("MH01AB1234"), plate("KA05XY9876", width=120), plate("MH01AB1234")]
+    first = ocr.read_many(crops)
+    assert len(reader.calls) == 1
+    # Identical crops are recognized once and padded to a common width
+    assert len(reader.calls[0]) == 2
+    assert len({img.shape for img in reader.calls[0]}) == 1
+    assert first[0] == first[2]
+
+    again = ocr.read_many(crops + [np.zeros((0, 0, 3), np.uint8)])
+    assert len(reader.calls) == 1
+    assert again[:3] == first and again[3] == ("N/A", 0.0)
+    assert ocr.stats["cache_hits"] == 3
+
+
+def test_padding_is_plate_background_not_the_edge_column():
+    # A glyph stroke touches the right edge of a light plate
+    img = np.full((64, 100), 220, np.uint8)
+    img[10:54, 96:] = 0
+    wide = np.full((64, 140), 220, np.uint8)
+    padded, _ = _pad_to_width([img, wide])
+    assert padded.shape == (64, 140)
+    assert (padded[:, 100:] == 220).all()
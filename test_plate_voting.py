@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for per-track plate crop selection and character voting
+"""
+
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("cv2")
+
+from plate_voting import PlateTrackAggregator, sharpness, vote
+
+
+def test_vote_fixes_single_frame_errors():
+    readings = [("MH01AB1234", 0.9), ("MHO1AB1234", 0.5), ("MH01A81234", 0.6),
+                ("MH 01 AB 1234", 0.8), ("MH01AB123", 0.9), ("N/A", 0.0)]
+    plate, confidence = vote(readings)
+    assert plate == "MH01AB1234"
+    assert 0 < confidence <= 1
+
+
+def test_vote_with_no_readings():
+    assert vote([("N/A", 0.0)]) == (None, 0.0)
+
+
+class FakePlateOCR:
+    def __init__(self):
+        self.batches = []
+
+    def read_many(self, crops):
+        self.batches.append(crops)
+        return [("MH01AB1234", 0.9) for _ in crops]
+
+
+def test_aggregator_keeps_top_k_sharpest_largest_crops():
+    rng = np.random.default_rng(0)
+    ocr = FakePlateOCR()
+    plates = PlateTrackAggregator(ocr, top_k=3)
+    blurry = np.full((20, 60), 128, np.uint8)
+    for size in (20, 30, 40, 50):
+        plates.add(1, rng.integers(0, 255, (size, size * 3), dtype=np.uint8))
+    for _ in range(100):
+        plates.add(1, blurry)
+
+    plate, confidence, crops_read = plates.read(1)
+    assert plate == "MH01AB1234" and crops_read == 3
+    assert len(ocr.batches) == 1
+    assert sorted(c.shape[0] for c in ocr.batches[0]) == [30, 40, 50]
+    assert sharpness(blurry) == 0.0
+    assert plates.read(2) == (None, 0.0, 0)
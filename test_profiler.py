@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""
+Tests for the sampling cProfile hook: sampling, rotation and summaries
+"""
+
+import threading
+
+import pytest
+
+from profiler import SamplingProfiler
+
+
+def _busy_work(n=2000):
+    return sum(i * i for i in range(n))
+
+
+def test_disabled_profiler_writes_nothing(tmp_path):
+    profiler = SamplingProfiler(directory=str(tmp_path))
+    assert profiler.call("detect", _busy_work) == _busy_work()
+    assert profiler.dumps() == []
+    assert profiler.report()["enabled"] is False
+
+
+def test_sampled_calls_rotate_to_max_dumps(tmp_path):
+    profiler = SamplingProfiler(directory=str(tmp_path), sample_rate=1.0, max_dumps=3)
+    for _ in range(5):
+        profiler.call("upload", _busy_work)
+    profiler.call("detect", _busy_work)
+
+    assert len(profiler.dumps()) == 3
+    assert len(profiler.dumps("detect")) == 1
+    report = profiler.report()
+    assert report["sampled"] == 6
+    assert report["dumps_removed"] == 3
+
+
+def test_summary_lists_hot_functions(tmp_path):
+    profiler = SamplingProfiler(directory=str(tmp_path), sample_rate=1.0)
+    profiler.call("detect", _busy_work, 20000)
+
+    summary = profiler.summary(limit=5)
+    assert summary["dumps"] == 1
+    names = [f["function"] for f in summary["functions"]]
+    assert "_busy_work" in names
+    cumtimes = [f["cumtime"] for f in summary["functions"]]
+    assert cumtimes == sorted(cumtimes, reverse=True)
+    with pytest.raises(ValueError):
+        profiler.summary(sort="calls")
+
+
+def test_overlapping_sample_is_skipped_not_nested(tmp_path):
+    profiler = SamplingProfiler(directory=str(tmp_path), sample_rate=1.0)
+    inside, release = threading.Event(), threading.Event()
+
+    def slow():
+        inside.set()
+        release.wait(5)
+
+    t = threading.Thread(target=profiler.call, args=("detect", slow))
+    t.start()
+    inside.wait(5)
+    assert profiler.call("upload", _busy_work) == _busy_work()
+    release.set()
+    t.join()
+
+    assert profiler.report()["skipped_busy"] == 1
+    assert len(profiler.dumps()) == 1
+
+
+def test_configure_validates(tmp_path):
+    profiler = SamplingProfiler(directory=str(tmp_path))
+    with pytest.raises(ValueError):
+        profiler.configure(sample_rate=1.5)
+    with pytest.raises(ValueError):
+        profiler.configure(max_dumps=0)
+    profiler.configure(sample_rate=0.25)
+    assert profiler.sample_rate == 0.25
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+"""
+Tests for the INT8 promotion gate and its evaluation helpers
+"""
+
+import numpy as np
+
+from quantize_model import gate, label_path_for, letterbox, load_labels, match_recall
+
+
+def report(map50, recall):
+    return {"map50": map50, "map50_95": map50 / 2, "recall": recall}
+
+
+def test_letterbox_keeps_aspect_and_pads():
+    blob = letterbox(np.zeros((100, 200, 3), np.uint8), size=64)
+    assert blob.shape == (1, 3, 64, 64)
+    assert blob.dtype == np.float32
+    # 200x100 scales to 64x32, padded above and below with grey
+    assert blob[0, 0, 0, 0] == np.float32(114 / 255.0)
+    assert blob[0, 0, 32, 32] == 0.0
+
+
+def test_labels_are_converted_to_pixel_boxes(tmp_path):
+    path = tmp_path / "a.txt"
+    path.write_text("1 0.5 0.5 0.2 0.4\n")
+    assert load_labels(str(path), 100, 50) == [(1, [40.0, 15.0, 60.0, 35.0])]
+    assert load_labels(str(tmp_path / "missing.txt"), 100, 50) == []
+    assert label_path_for("datasets/helmet/images/val/x.jpg") == "datasets/helmet/labels/val/x.txt"
+
+
+def test_match_recall_matches_each_ground_truth_once():
+    gt = [(0, [0, 0, 10, 10]), (1, [20, 20, 30, 30]), (1, [40, 40, 50, 50])]
+    predictions = [(1, [20, 20, 30, 30]), (1, [21, 21, 30, 30]), (0, [100, 100, 110, 110])]
+    assert match_recall(predictions, gt) == {0: (0, 1), 1: (1, 2)}
+
+
+def test_gate_passes_small_regressions():
+    passed, reasons = gate(report(0.80, {"Helmet": 0.9, "NoHelmet": 0.85}),
+                           report(0.79, {"Helmet": 0.85, "NoHelmet": 0.84}))
+    assert passed and reasons == []
+
+
+def test_gate_refuses_nohelmet_recall_drop():
+    passed, reasons = gate(report(0.80, {"Helmet": 0.9, "NoHelmet": 0.85}),
+                           report(0.80, {"Helmet": 0.9, "NoHelmet": 0.80}))
+    assert not passed
+    assert "NoHelmet recall" in reasons[0]
+
+
+def test_gate_refuses_map_drop_and_missing_classes():
+    passed, reasons = gate(report(0.80, {"Helmet": 0.9}), report(0.70, {"Helmet": 0.9}))
+    assert not passed
+    assert len(reasons) == 2
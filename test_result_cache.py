@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Tests for the two-tier detection result cache and its use in detect_module
+"""
+
+import os
+
+import cv2
+import numpy as np
+
+import detect_module
+from detect_module import build_detection_payload
+from ingestion import idempotency_key
+from result_cache import ResultCache, cache_key
+
+
+def test_key_depends_on_bytes_model_and_confidence():
+    base = cache_key(b"img", "best.pt:1:2", 0.25)
+    assert base == cache_key(b"img", "best.pt:1:2", 0.25)
+    assert base != cache_key(b"img2", "best.pt:1:2", 0.25)
+    assert base != cache_key(b"img", "best.pt:1:3", 0.25)
+    assert base != cache_key(b"img", "best.pt:1:2", 0.5)
+
+
+def test_memory_then_disk_tiers(tmp_path):
+    cache = ResultCache(max_entries=1, directory=str(tmp_path))
+    cache.put("a", {"detections": [1]})
+    cache.put("b", {"detections": [2]})     # pushes "a" out of memory
+
+    assert cache.get("b") == {"detections": [2]}
+    assert cache.get("a") == {"detections": [1]}
+    assert cache.get("c") is None
+    stats = cache.report()
+    assert (stats["memory_hits"], stats["disk_hits"], stats["misses"]) == (1, 1, 1)
+
+    # A fresh process still finds entries on disk
+    assert ResultCache(directory=str(tmp_path)).get("b") == {"detections": [2]}
+
+
+def test_returned_values_are_copies(tmp_path):
+    cache = ResultCache(directory=str(tmp_path))
+    cache.put("a", {"detections": []})
+    cache.get("a")["detections"].append("mutated")
+    assert cache.get("a") == {"detections": []}
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path):
+    cache = ResultCache(max_entries=1, directory=str(tmp_path), max_bytes=2500)
+    payload = {"blob": "x" * 1000}
+    cache.put("old", payload)
+    os.utime(tmp_path / "old.json", (1, 1))
+    cache.put("new", payload)
+    cache.put("newest", payload)
+    assert not (tmp_path / "old.json").exists()
+    assert (tmp_path / "newest.json").exists()
+    assert cache.report()["disk_evictions"] >= 1
+
+
+class FakeResult:
+    boxes = None
+    names = {}
+
+    def __init__(self, image):
+        self.orig_img = image
+
+    def plot(self):
+        return self.orig_img
+
+
+class FakeEngine:
+    def __init__(self):
+        self.predictions = 0
+
+    def model_version(self, model_path=None, backend=None):
+        return "fake:1"
+
+    def get_plate_ocr(self):
+        return None
+
+    def predict(self, source, confidence=0.25, **kwargs):
+        sources = source if isinstance(source, list) else [source]
+        self.predictions += len(sources)
+        return [FakeResult(s if isinstance(s, np.ndarray) else cv2.imread(s)) for s in sources]
+
+
+def test_repeated_upload_skips_inference(tmp_path, monkeypatch):
+    engine = FakeEngine()
+    cache = ResultCache(directory=str(tmp_path / "cache"))
+    monkeypatch.setattr(detect_module, "get_engine", lambda: engine)
+    monkeypatch.setattr(detect_module, "get_result_cache", lambda: cache)
+    image = str(tmp_path / "evidence.jpg")
+    cv2.imwrite(image, np.full((64, 64, 3), 127, np.uint8))
+    out = str(tmp_path / "out")
+
+    first = detect_module.process_image(image, output_dir=out)
+    second = detect_module.process_image(image, output_dir=out)
+    assert engine.predictions == 1
+    assert second["cached"] is True
+    assert second["image_path"] == first["image_path"]
+    # Same evidence, same event: a re-upload must not create a second challan
+    assert second["timestamp"] == first["timestamp"]
+    assert idempotency_key(build_detection_payload(second)) == idempotency_key(build_detection_payload(first))
+
+    detect_module.process_images([image, image], output_dir=out)
+    assert engine.predictions == 1
+    detect_module.process_image(image, output_dir=out, confidence=0.5)
+    assert engine.predictions == 2
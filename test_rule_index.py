@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process rule index (needs mongomock)
+"""
+
+import pytest
+
+mongomock = pytest.importorskip("mongomock")
+
+from rule_index import RuleIndex, bump_rules_version
+
+
+@pytest.fixture
+def db():
+    db = mongomock.MongoClient()["echallan"]
+    db.rules.insert_many([
+        {"rule_id": "no_helmet_riding", "violation_class": "NoHelmet", "min_confidence": 0.45, "penalty": 500, "active": True},
+        {"rule_id": "no_helmet_repeat", "violation_class": "NoHelmet", "min_confidence": 0.8, "penalty": 1000, "active": True},
+        {"rule_id": "retired", "violation_class": "NoHelmet", "min_confidence": 0.1, "penalty": 50, "active": False},
+        {"rule_id": "helmet_detected", "violation_class": "Helmet", "min_confidence": 0.45, "penalty": 0, "active": True},
+    ])
+    return db
+
+
+def test_match_applies_thresholds_across_detection_list(db):
+    index = RuleIndex(db)
+    rules = index.match([
+        {"class": "NoHelmet", "confidence": 0.6},
+        {"class": "NoHelmet", "confidence": 0.9},
+        {"class": "Helmet", "confidence": 0.3},
+        {"class": "Unknown", "confidence": 0.99},
+        {"confidence": 0.99},
+    ])
+    assert [r["rule_id"] for r in rules] == ["no_helmet_riding", "no_helmet_riding", "no_helmet_repeat"]
+
+
+def test_index_is_cached_until_ttl_and_version_change(db):
+    index = RuleIndex(db, ttl=0)
+    bump_rules_version(db)
+    index.match([])
+    index.match([])
+    assert index.reloads == 1
+
+    db.rules.update_one({"rule_id": "no_helmet_repeat"}, {"$set": {"active": False}})
+    bump_rules_version(db)
+    assert [r["rule_id"] for r in index.rules_for("NoHelmet", 0.9)] == ["no_helmet_riding"]
+    assert index.reloads == 2
+
+
+def test_ttl_avoids_database_reads(db):
+    index = RuleIndex(db, ttl=3600)
+    index.match([{"class": "NoHelmet", "confidence": 0.5}])
+    db.rules.delete_many({})
+    assert len(index.match([{"class": "NoHelmet", "confidence": 0.5}])) == 1
+    index.invalidate()
+    assert index.match([{"class": "NoHelmet", "confidence": 0.5}]) == []
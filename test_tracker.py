@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Tests for the IoU/centroid tracker used to dedupe video violations
+"""
+
+from tracker import IoUTracker, iou
+
+
+def det(cls, conf, bbox):
+    return {"class": cls, "confidence": conf, "bbox": bbox}
+
+
+def test_iou():
+    assert iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1.0
+    assert iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0.0
+    assert abs(iou([0, 0, 10, 10], [5, 0, 15, 10]) - 1 / 3) < 1e-9
+
+
+def test_moving_box_keeps_one_track_and_best_frame():
+    tracker = IoUTracker()
+    confs = [0.5, 0.9, 0.6, 0.7]
+    for frame, conf in enumerate(confs):
+        x = frame * 4
+        tracker.update(frame, [det("NoHelmet", conf, [x, 0, x + 20, 40])])
+    tracks = tracker.flush()
+    assert len(tracks) == 1
+    assert tracks[0].hits == 4
+    assert tracks[0].best_confidence == 0.9
+    assert tracks[0].best_frame_index == 1
+
+
+def test_centroid_fallback_matches_fast_motion():
+    tracker = IoUTracker(iou_threshold=0.3, max_centroid_distance=0.75)
+    tracker.update(0, [det("NoHelmet", 0.8, [0, 0, 20, 20])])
+    # Barely overlapping, but the centroid moved less than half a diagonal
+    tracker.update(1, [det("NoHelmet", 0.8, [15, 0, 35, 20])])
+    assert len(tracker.tracks) == 1
+
+
+def test_separate_riders_and_classes_get_separate_tracks():
+    tracker = IoUTracker()
+    tracker.update(0, [det("NoHelmet", 0.8, [0, 0, 20, 20]),
+                       det("NoHelmet", 0.8, [200, 0, 220, 20]),
+                       det("Helmet", 0.8, [0, 0, 20, 20])])
+    assert len(tracker.tracks) == 3
+
+
+def test_expire_retires_stale_tracks():
+    tracker = IoUTracker(max_age=2)
+    tracker.update(0, [det("NoHelmet", 0.8, [0, 0, 20, 20])])
+    assert tracker.expire(2) == []
+    expired = tracker.expire(3)
+    assert len(expired) == 1 and not tracker.tracks
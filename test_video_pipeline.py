@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+"""
+Tests for the staged video pipeline using an in-memory capture
+"""
+
+import pytest
+
+from video_pipeline import run_video_pipeline
+
+
+class FakeCapture:
+    """Minimal stand-in for cv2.VideoCapture yielding integer frames"""
+
+    def __init__(self, n_frames):
+        self.n_frames = n_frames
+        self.pos = 0
+        self.reads = 0
+
+    def isOpened(self):
+        return True
+
+    def read(self):
+        if self.pos >= self.n_frames:
+            return False, None
+        self.pos += 1
+        self.reads += 1
+        return True, self.pos - 1
+
+    def grab(self):
+        if self.pos >= self.n_frames:
+            return False
+        self.pos += 1
+        return True
+
+
+def test_frames_pass_through_all_stages_in_order():
+    written = []
+    report = run_video_pipeline(
+        FakeCapture(50),
+        infer=lambda frame: frame * 10,
+        annotate=lambda frame, result: (frame, result),
+        write=written.append,
+        queue_size=2,
+    )
+    assert written == [(i, i * 10) for i in range(50)]
+    assert report["frames"] == 50
+    assert [s["stage"] for s in report["stages"]] == ["decode", "inference", "annotate", "write"]
+    assert all(s["items"] == 50 for s in report["stages"])
+
+
+def test_frame_stride_skips_decoding():
+    cap = FakeCapture(10)
+    written = []
+    report = run_video_pipeline(cap, infer=lambda f: None, annotate=lambda f, r: f,
+                                write=written.append, frame_stride=3)
+    assert written == [0, 3, 6, 9]
+    assert cap.reads == 4
+    assert report["frame_stride"] == 3
+
+
+def test_stage_error_is_raised():
+    def infer(frame):
+        if frame == 5:
+            raise ValueError("bad frame")
+        return frame
+
+    with pytest.raises(ValueError):
+        run_video_pipeline(FakeCapture(100), infer=infer, annotate=lambda f, r: f,
+                           write=lambda f: None, queue_size=2)
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Tests for per-stream violation tracking in detect_helmet (fake YOLO results)
+"""
+
+import threading
+import time
+
+import numpy as np
+import pytest
+
+import detect_helmet
+from detect_helmet import DetectionSender, ViolationTracks
+
+
+class FakeBox:
+    def __init__(self, cls, conf, bbox):
+        self.cls = np.array([cls])
+        self.conf = np.array([conf])
+        self.xyxy = np.array([bbox], dtype=float)
+
+
+class FakeResult:
+    names = {0: "NoHelmet", 1: "License_Plate"}
+
+    def __init__(self, boxes):
+        self.boxes = [FakeBox(*b) for b in boxes]
+        self.orig_img = np.random.default_rng(len(boxes)).integers(0, 255, (240, 320, 3), dtype=np.uint8)
+
+    def plot(self):
+        return self.orig_img.copy()
+
+
+class FakeOCR:
+    def read_many(self, crops):
+        return [("MH01AB1234", 0.9)] * len(crops)
+
+
+@pytest.fixture
+def sent(monkeypatch):
+    events = []
+    monkeypatch.setattr(detect_helmet, "send_detection_to_flask",
+                        lambda data, vehicle_no=None, source=None: events.append((data, vehicle_no)))
+    return events
+
+
+def test_plate_state_stays_bounded_on_a_long_stream(tmp_path, sent):
+    tracks = ViolationTracks(FakeOCR(), str(tmp_path), "rtsp://cam", frame_stride=1)
+    # A new plate passes every 5 frames at a fresh position, visible for 3 frames
+    for frame in range(2000):
+        plate = frame // 5
+        if frame % 5 < 3:
+            x = (plate * 37) % 250
+            tracks.observe(frame, FakeResult([(1, 0.8, [x, 100, x + 60, 120])]))
+        else:
+            tracks.observe(frame, FakeResult([]))
+        max_age = tracks.tracker.max_age
+        assert len(tracks.plate_tracks) <= max_age // 5 + 2
+        assert len(tracks.plates._crops) <= max_age // 5 + 2
+    tracks.finish()
+    assert tracks.plate_tracks == {} and tracks.plate_readings == {} and not tracks.plates._crops
+
+
+def test_plate_outlives_its_track_while_a_rider_needs_it(tmp_path, sent):
+    tracks = ViolationTracks(FakeOCR(), str(tmp_path), "rtsp://cam", frame_stride=1)
+    rider = (0, 0.9, [100, 20, 160, 140])
+    # Plate seen only in the first frames; the rider stays in view much longer
+    for frame in range(60):
+        boxes = [rider] + ([(1, 0.8, [110, 120, 150, 135])] if frame < 3 else [])
+        tracks.observe(frame, FakeResult(boxes))
+    assert len(tracks.plate_tracks) == 1
+    tracks.finish()
+    assert [vehicle_no for _, vehicle_no in sent] == ["MH01AB1234"]
+    assert tracks.plate_tracks == {}
+
+
+@pytest.mark.parametrize("stride", [1, 4, 8, 30])
+def test_strided_rider_is_one_event(tmp_path, sent, stride):
+    tracks = ViolationTracks(FakeOCR(), str(tmp_path), "video.mp4", frame_stride=stride)
+    assert tracks.tracker.max_age >= max(15, 2 * stride)
+    # Only every stride-th frame is inferred; the rider is in each of them
+    for frame in range(0, 12 * stride, stride):
+        tracks.observe(frame, FakeResult([(0, 0.9, [100, 20, 160, 140])]))
+    tracks.finish()
+    assert len(sent) == 1
+
+
+def test_sender_queues_without_waiting_on_detect(monkeypatch):
+    gate, started = threading.Event(), threading.Event()
+    posted = []
+
+    def slow_post(data, vehicle_no=None, source=None):
+        started.set()
+        gate.wait(5)
+        posted.append(vehicle_no)
+
+    monkeypatch.setattr(detect_helmet, "send_detection_to_flask", slow_post)
+    sender = DetectionSender(queue_size=2)
+    start = time.perf_counter()
+    sender.send({}, "A", source="cam")
+    assert started.wait(5)
+    for plate in ("B", "C", "D"):
+        sender.send({}, plate, source="cam")
+    assert time.perf_counter() - start < 1
+    gate.set()
+    sender.close()
+    # One taken by the thread, two queued, the rest dropped
+    assert posted == ["A", "B", "C"]
+    assert sender.stats["dropped"] == 1
@@ -0,0 +1,158 @@
+#!/usr/bin/env python3
+"""
+Tests for the inference worker pool and its shared-memory frame handoff
+"""
+
+import os
+from multiprocessing import shared_memory
+
+import cv2
+import numpy as np
+import pytest
+
+import result_cache
+import worker_pool
+from metrics import REGISTRY, track
+from profiler import get_profiler
+from worker_pool import InferencePool
+
+
+def fake_detect(images, output_dir, confidence):
+    """Stands in for YOLO + OCR: reports what arrived through shared memory"""
+    out = []
+    for path, image in images:
+        if os.path.basename(path).startswith("crash"):
+            os._exit(3)
+        with track("fake_inference"):
+            pass
+        out.append({"image_path": path, "detections": [], "shape": list(image.shape),
+                    "checksum": int(image.sum()), "pid": os.getpid()})
+    return out
+
+
+def _image(tmp_path, name, value):
+    path = str(tmp_path / name)
+    cv2.imwrite(path, np.full((40, 60, 3), value, dtype=np.uint8))
+    return path
+
+
+@pytest.fixture
+def pool():
+    pools = []
+
+    def make(**kwargs):
+        kwargs.setdefault("use_cache", False)
+        p = InferencePool(workers=1, detect=fake_detect, **kwargs)
+        pools.append(p)
+        return p
+
+    yield make
+    for p in pools:
+        p.shutdown()
+
+
+def test_frames_arrive_through_shared_memory_in_order(tmp_path, pool):
+    paths = [_image(tmp_path, "a.png", 10), str(tmp_path / "missing.png"), _image(tmp_path, "b.png", 20)]
+    p = pool(on_result=lambda results: [dict(r, ingested=True) for r in results])
+
+    job_id = p.submit(paths)
+    names = [shm.name for shm in p._jobs[job_id]["shm"]]
+    job = p.wait(job_id, timeout=60)
+
+    assert job["status"] == "done"
+    a, missing, b = job["results"]
+    assert a["shape"] == [40, 60, 3] and a["checksum"] == 10 * 40 * 60 * 3
+    assert b["checksum"] == 20 * 40 * 60 * 3
+    assert a["pid"] != os.getpid()
+    assert missing["error"] == "could not read image"
+    assert all(r["ingested"] for r in job["results"])
+    # The parent unlinks every block once the job is finished
+    assert len(names) == 2
+    for name in names:
+        with pytest.raises(FileNotFoundError):
+            shared_memory.SharedMemory(name=name)
+
+
+def test_crashed_worker_fails_its_job_and_is_replaced(tmp_path, pool):
+    p = pool()
+    crashed = p.wait(p.submit([_image(tmp_path, "crash.png", 1)]), timeout=60)
+    assert crashed["status"] == "error"
+    assert "exited" in crashed["error"]
+
+    ok = p.wait(p.submit([_image(tmp_path, "ok.png", 2)]), timeout=60)
+    assert ok["status"] == "done"
+    report = p.report()
+    assert report["worker_restarts"] == 1
+    assert report["failed"] == 1 and report["completed"] == 1
+
+
+def test_unknown_job_and_bounded_history(tmp_path, pool):
+    p = pool(max_jobs=1)
+    assert p.get("nope") is None
+    first = p.submit([str(tmp_path / "missing.png")])      # nothing to decode: finishes in submit
+    second = p.submit([str(tmp_path / "missing2.png")])
+    assert p.get(first) is None
+    assert p.get(second)["status"] == "done"
+
+
+def test_worker_stage_timings_reach_the_parent(tmp_path, pool):
+    def count():
+        for line in REGISTRY.render().splitlines():
+            if line.startswith('echallan_stage_seconds_count{stage="fake_inference"}'):
+                return int(line.rsplit(" ", 1)[1])
+        return 0
+
+    p = pool()
+    before = count()
+    job = p.wait(p.submit([_image(tmp_path, "a.png", 1), _image(tmp_path, "b.png", 2)]), timeout=60)
+    assert job["status"] == "done"
+    assert count() == before + 2
+    assert set(job["stage_seconds"]) == {"fake_inference"}
+
+
+def test_workers_follow_the_parent_profiler(tmp_path, pool):
+    profiler = get_profiler()
+    saved = (profiler.directory, profiler.sample_rate)
+    profiler.directory = str(tmp_path / "profiles")
+    profiler.configure(sample_rate=1.0)
+    try:
+        p = pool()
+        assert p.wait(p.submit([_image(tmp_path, "a.png", 1)]), timeout=60)["status"] == "done"
+        assert len(profiler.dumps("inference_worker")) == 1
+    finally:
+        profiler.directory = saved[0]
+        profiler.configure(sample_rate=saved[1])
+
+
+class BrokenCache:
+    """Result cache whose disk writes fail"""
+
+    def get(self, key):
+        return None
+
+    def put(self, key, value):
+        raise OSError("No space left on device")
+
+
+def test_failed_cache_write_still_finishes_the_job(tmp_path, pool, monkeypatch):
+    monkeypatch.setattr(result_cache, "get_result_cache", lambda: BrokenCache())
+    p = pool(use_cache=True)
+    first = p.wait(p.submit([_image(tmp_path, "a.png", 1)]), timeout=60)
+    second = p.wait(p.submit([_image(tmp_path, "b.png", 2)]), timeout=60)
+    assert first["status"] == "done" and second["status"] == "done"
+
+
+def test_collector_survives_a_failing_result(tmp_path, pool, monkeypatch):
+    calls = []
+
+    def record_stages(stages):
+        calls.append(stages)
+        if len(calls) == 1:
+            raise RuntimeError("boom")
+
+    monkeypatch.setattr(worker_pool, "record_stages", record_stages)
+    p = pool()
+    first = p.wait(p.submit([_image(tmp_path, "a.png", 1)]), timeout=60)
+    second = p.wait(p.submit([_image(tmp_path, "b.png", 2)]), timeout=60)
+    assert first["status"] == "error" and "boom" in first["error"]
+    assert second["status"] == "done"
@@ -0,0 +1,133 @@
+import itertools
+
+
+def iou(a, b):
+    """Intersection over union of two [x1, y1, x2, y2] boxes"""
+    ix1, iy1 = max(a[0], b[0]), max(a[1], b[1])
+    ix2, iy2 = min(a[2], b[2]), min(a[3], b[3])
+    inter = max(0.0, ix2 - ix1) * max(0.0, iy2 - iy1)
+    if inter <= 0:
+        return 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / float(area_a + area_b - inter)
+
+
+def _centroid(box):
+    return (box[0] + box[2]) / 2.0, (box[1] + box[3]) / 2.0
+
+
+def _centroid_distance(a, b):
+    """Centroid distance normalised by the mean box diagonal of a and b"""
+    (ax, ay), (bx, by) = _centroid(a), _centroid(b)
+    diag_a = ((a[2] - a[0]) ** 2 + (a[3] - a[1]) ** 2) ** 0.5
+    diag_b = ((b[2] - b[0]) ** 2 + (b[3] - b[1]) ** 2) ** 0.5
+    scale = (diag_a + diag_b) / 2.0 or 1.0
+    return ((ax - bx) ** 2 + (ay - by) ** 2) ** 0.5 / scale
+
+
+class Track:
+    """One object followed across frames"""
+
+    def __init__(self, track_id, detection, frame_index):
+        self.track_id = track_id
+        self.class_name = detection["class"]
+        self.bbox = list(detection["bbox"])
+        self.first_frame = frame_index
+        self.last_frame = frame_index
+        self.hits = 1
+        self.best_confidence = detection["confidence"]
+        self.best_frame_index = frame_index
+        self.best_bbox = list(detection["bbox"])
+        self.best_image = None
+
+    def update(self, detection, frame_index):
+        self.bbox = list(detection["bbox"])
+        self.last_frame = frame_index
+        self.hits += 1
+        if detection["confidence"] > self.best_confidence:
+            self.best_confidence = detection["confidence"]
+            self.best_frame_index = frame_index
+            self.best_bbox = list(detection["bbox"])
+            return True
+        return False
+
+    def as_detection(self):
+        """Best-confidence observation in the detection dict format"""
+        return {
+            "class": self.class_name,
+            "confidence": self.best_confidence,
+            "bbox": self.best_bbox,
+            "track_id": self.track_id,
+            "frame_index": self.best_frame_index,
+            "first_frame": self.first_frame,
+            "last_frame": self.last_frame,
+            "hits": self.hits,
+        }
+
+
+class IoUTracker:
+    """Greedy IoU tracker with a centroid-distance fallback
+
+    Detections are matched to live tracks of the same class by highest IoU;
+    boxes that barely overlap (fast motion, low frame rate, frame_stride > 1)
+    can still match if their centroids are within max_centroid_distance box
+    diagonals. Tracks not seen for max_age frames are retired.
+    """
+
+    def __init__(self, iou_threshold=0.3, max_centroid_distance=0.75, max_age=15):
+        self.iou_threshold = iou_threshold
+        self.max_centroid_distance = max_centroid_distance
+        self.max_age = max_age
+        self.tracks = {}
+        self._ids = itertools.count(1)
+
+    def update(self, frame_index, detections):
+        """Assign detections to tracks; returns a list of (track, detection, improved)
+
+        improved is True when this detection is the track's best so far.
+        """
+        candidates = []
+        for d, det in enumerate(detections):
+            for track in self.tracks.values():
+                if track.class_name != det["class"]:
+                    continue
+                overlap = iou(track.bbox, det["bbox"])
+                if overlap >= self.iou_threshold:
+                    candidates.append((1.0 + overlap, d, track.track_id))
+                else:
+                    distance = _centroid_distance(track.bbox, det["bbox"])
+                    if distance <= self.max_centroid_distance:
+                        candidates.append((1.0 - distance / self.max_centroid_distance, d, track.track_id))
+        candidates.sort(reverse=True)
+
+        matched = []
+        used_dets, used_tracks = set(), set()
+        for _, d, track_id in candidates:
+            if d in used_dets or track_id in used_tracks:
+                continue
+            used_dets.add(d)
+            used_tracks.add(track_id)
+            track = self.tracks[track_id]
+            matched.append((track, detections[d], track.update(detections[d], frame_index)))
+
+        for d, det in enumerate(detections):
+            if d not in used_dets:
+                track = Track(next(self._ids), det, frame_index)
+                self.tracks[track.track_id] = track
+                matched.append((track, det, True))
+
+        return matched
+
+    def expire(self, frame_index):
+        """Remove and return tracks not seen for more than max_age frames"""
+        expired = [t for t in self.tracks.values() if frame_index - t.last_frame > self.max_age]
+        for track in expired:
+            del self.tracks[track.track_id]
+        return expired
+
+    def flush(self):
+        """Remove and return every remaining track (end of stream)"""
+        remaining = list(self.tracks.values())
+        self.tracks.clear()
+        return remaining
@@ -0,0 +1,147 @@
+import queue
+import threading
+import time
+
+_SENTINEL = object()
+
+
+class StageStats:
+    """Item count and busy time for one pipeline stage"""
+
+    def __init__(self, name):
+        self.name = name
+        self.items = 0
+        self.busy_time = 0.0
+
+    def record(self, elapsed):
+        self.items += 1
+        self.busy_time += elapsed
+
+    def throughput(self):
+        """Items per second of time the stage spent working"""
+        return self.items / self.busy_time if self.busy_time > 0 else 0.0
+
+    def as_dict(self):
+        return {
+            "stage": self.name,
+            "items": self.items,
+            "busy_time": round(self.busy_time, 4),
+            "items_per_sec": round(self.throughput(), 2),
+        }
+
+
+def _run_stage(stats, fn, inbox, outbox, errors, stop):
+    """Pull items from inbox, apply fn and push non-None results to outbox"""
+    while True:
+        item = inbox.get()
+        if item is _SENTINEL:
+            break
+        if stop.is_set():
+            # Keep draining so upstream never blocks on a full queue
+            continue
+        start = time.perf_counter()
+        try:
+            out = fn(item)
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+            continue
+        stats.record(time.perf_counter() - start)
+        if outbox is not None and out is not None:
+            outbox.put(out)
+    if outbox is not None:
+        outbox.put(_SENTINEL)
+
+
+def run_video_pipeline(cap, infer, annotate, write, frame_stride=1, queue_size=8, on_progress=None,
+                       on_annotated=None):
+    """Run decode -> inference -> annotation -> writing as concurrent stages
+
+    cap is an opened cv2.VideoCapture. Only every frame_stride-th frame is
+    decoded and sent on; skipped frames are grabbed without decoding.
+    infer(frame) returns a model result, annotate(frame, result) returns the
+    frame to write and write(frame) stores it. Stages are joined by bounded
+    queues of queue_size, so a slow stage applies back-pressure instead of
+    buffering the whole clip in memory.
+
+    on_annotated(index, annotated_frame, result), if given, is called from the
+    annotation stage in frame order; it is the hook for per-frame consumers
+    such as the tracker.
+
+    Returns a report dict with per-stage throughput and overall wall time.
+    """
+    frame_stride = max(1, int(frame_stride))
+    stats = {name: StageStats(name) for name in ("decode", "inference", "annotate", "write")}
+    errors = []
+    stop = threading.Event()
+
+    decoded = queue.Queue(maxsize=queue_size)
+    inferred = queue.Queue(maxsize=queue_size)
+    annotated = queue.Queue(maxsize=queue_size)
+
+    def decode():
+        index = 0
+        try:
+            while cap.isOpened() and not stop.is_set():
+                start = time.perf_counter()
+                if index % frame_stride == 0:
+                    ret, frame = cap.read()
+                else:
+                    ret, frame = cap.grab(), None
+                if not ret:
+                    break
+                if frame is not None:
+                    stats["decode"].record(time.perf_counter() - start)
+                    decoded.put((index, frame))
+                index += 1
+        except Exception as e:
+            errors.append(e)
+            stop.set()
+        finally:
+            decoded.put(_SENTINEL)
+
+    def infer_item(item):
+        index, frame = item
+        return index, frame, infer(frame)
+
+    def annotate_item(item):
+        index, frame, result = item
+        annotated_frame = annotate(frame, result)
+        if on_annotated is not None:
+            on_annotated(index, annotated_frame, result)
+        return index, annotated_frame
+
+    def write_item(item):
+        index, frame = item
+        write(frame)
+        if on_progress is not None:
+            on_progress(index, stats["write"].items + 1)
+
+    threads = [
+        threading.Thread(target=decode, name="video-decode", daemon=True),
+        threading.Thread(target=_run_stage, name="video-infer", daemon=True,
+                         args=(stats["inference"], infer_item, decoded, inferred, errors, stop)),
+        threading.Thread(target=_run_stage, name="video-annotate", daemon=True,
+                         args=(stats["annotate"], annotate_item, inferred, annotated, errors, stop)),
+        threading.Thread(target=_run_stage, name="video-write", daemon=True,
+                         args=(stats["write"], write_item, annotated, None, errors, stop)),
+    ]
+
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    wall_time = time.perf_counter() - start
+
+    if errors:
+        raise errors[0]
+
+    frames = stats["write"].items
+    return {
+        "frames": frames,
+        "frame_stride": frame_stride,
+        "wall_time": round(wall_time, 4),
+        "fps": round(frames / wall_time, 2) if wall_time > 0 else 0.0,
+        "stages": [s.as_dict() for s in stats.values()],
+    }
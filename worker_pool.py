@@ -0,0 +1,402 @@
+import atexit
+import collections
+import contextlib
+import multiprocessing as mp
+import os
+import queue
+import sys
+import threading
+import time
+import uuid
+
+from metrics import record_stages
+
+FINISHED = ("done", "error")
+JOB_ID_SIZE = 32        # uuid4().hex
+
+
+def _set_threads(threads):
+    # Must run before torch, onnxruntime or OpenCV are imported in the worker
+    for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "TORCH_NUM_THREADS", "ORT_INTRA_OP_THREADS"):
+        os.environ[var] = str(threads)
+
+
+def detect_frames(images, output_dir, confidence):
+    """Default worker stage: detection and plate OCR on [(path, image)]
+
+    Returns once the annotated images are on disk, so a finished job's
+    image_path can be served straight away by the web process.
+    """
+    from detect_module import detect_arrays
+    from image_store import get_image_store
+
+    all_data = detect_arrays(images, output_dir, confidence)
+    store = get_image_store()
+    for detection_data in all_data:
+        store.wait(detection_data["image_path"])
+    return all_data
+
+
+def _share(image):
+    """Copy a decoded frame into a new shared memory block; returns (shm, descriptor)"""
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    shm = shared_memory.SharedMemory(create=True, size=max(1, image.nbytes))
+    np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)[...] = image
+    return shm, (shm.name, image.shape, image.dtype.str)
+
+
+def _attach(descriptor):
+    """Copy a frame out of its shared memory block
+
+    The copy is one memcpy; it lets the parent unlink the block as soon as
+    the job finishes while annotated images are still being rendered.
+    """
+    import numpy as np
+    from multiprocessing import shared_memory
+
+    name, shape, dtype = descriptor
+    shm = shared_memory.SharedMemory(name=name)
+    try:
+        view = np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+        image = view.copy()
+        del view
+        return image
+    finally:
+        shm.close()
+
+
+@contextlib.contextmanager
+def _main_script_hidden():
+    """Keep spawned workers from re-running the launching script
+
+    Under `python app.py`, spawn re-imports app.py in every worker (Mongo
+    client, index builds, Flask app); the workers only need this module.
+    """
+    main = sys.modules.get("__main__")
+    path = getattr(main, "__file__", None)
+    if path is None or getattr(main, "__spec__", None) is not None:
+        yield
+        return
+    del main.__file__
+    try:
+        yield
+    finally:
+        main.__file__ = path
+
+
+def _worker_main(index, tasks, results, claims, threads, detect):
+    _set_threads(threads)
+    import cv2
+    from metrics import stage_delta, stage_totals
+    from profiler import get_profiler
+
+    cv2.setNumThreads(threads)
+    profiler = get_profiler()
+    while True:
+        job = tasks.get()
+        if job is None:
+            break
+        job_id, frames, output_dir, confidence, (profile_dir, sample_rate, max_dumps) = job
+        # Written straight to shared memory: a queued "running" notice can be
+        # lost if the process dies before the queue's feeder thread sends it
+        claims[index * JOB_ID_SIZE:(index + 1) * JOB_ID_SIZE] = job_id.encode()
+        results.put(("running", job_id, index, None))
+        # Follow the parent's profiler, which /admin/profiling may have changed
+        profiler.directory = profile_dir
+        profiler.configure(sample_rate=sample_rate, max_dumps=max_dumps)
+        before = stage_totals()
+        try:
+            images = [(path, _attach(descriptor)) for path, descriptor in frames]
+            kind, payload = "done", profiler.call("inference_worker", detect, images, output_dir, confidence)
+        except Exception as e:
+            kind, payload = "error", f"{type(e).__name__}: {e}"
+        # Stage timings live in this process's registry; ship them to the parent's
+        results.put((kind, job_id, index, (payload, stage_delta(before, stage_totals()))))
+
+
+class InferencePool:
+    """Inference worker processes fed by a job queue
+
+    submit() answers what the result cache can, decodes the rest in the
+    calling process, copies the frames into multiprocessing.shared_memory
+    and queues a job naming the blocks, so pixels are never pickled. Each
+    worker process loads its own model (threads_per_worker threads for
+    torch / ONNX Runtime / OpenCV), so concurrent uploads no longer share a
+    GIL or fight over one model lock.
+
+    A collector thread in the submitting process records results, fills the
+    result cache and calls on_result(all_data), whose return value becomes
+    the job's results (app.py ingests detections there). A worker that dies
+    fails its current job and is replaced. Only the newest max_jobs finished
+    jobs are kept for polling. Workers start on the first submit.
+
+    Each result carries the stage timings (inference, ocr, image_write, ...)
+    the worker recorded for the job; the collector folds them into this
+    process's metrics REGISTRY and the job's stage_seconds. Jobs take the
+    submitting process's profiler settings along, so sampled worker calls
+    are dumped as "inference_worker" next to its own profiles.
+
+    Job state lives in this object, i.e. in the process that accepted the
+    upload: with several web processes, a job can only be polled through
+    the one that submitted it.
+
+    detect(images, output_dir, confidence) runs in the workers, so it must
+    be a module-level function importable there (not one defined in the
+    launching script).
+    """
+
+    def __init__(self, workers=2, threads_per_worker=1, queue_size=64, output_dir="outputs", confidence=0.25,
+                 use_cache=True, max_jobs=1000, on_result=None, detect=detect_frames):
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        self.workers = workers
+        self.threads_per_worker = threads_per_worker
+        self.output_dir = output_dir
+        self.confidence = confidence
+        self.use_cache = use_cache
+        self.max_jobs = max_jobs
+        self.on_result = on_result
+        self.detect = detect
+        # spawn, not fork: forking a process that already runs threads (and
+        # possibly torch) is unsafe
+        self._ctx = mp.get_context("spawn")
+        self._tasks = self._ctx.Queue(maxsize=queue_size)
+        self._results = self._ctx.Queue()
+        self._jobs = collections.OrderedDict()
+        self._cond = threading.Condition()
+        self._procs = []
+        # Job id each worker last took, JOB_ID_SIZE bytes per worker
+        self._claims = self._ctx.Array("c", JOB_ID_SIZE * workers, lock=False)
+        self._started = False
+        self._stopping = False
+        self.stats = {"submitted": 0, "completed": 0, "failed": 0, "cached": 0, "frames": 0,
+                      "worker_restarts": 0, "job_time": 0.0}
+
+    def _spawn(self, index):
+        proc = self._ctx.Process(target=_worker_main, name=f"inference-worker-{index}", daemon=True,
+                                 args=(index, self._tasks, self._results, self._claims, self.threads_per_worker,
+                                       self.detect))
+        with _main_script_hidden():
+            proc.start()
+        return proc
+
+    def start(self):
+        with self._cond:
+            if self._started:
+                return
+            self._started = True
+            self._procs = [self._spawn(i) for i in range(self.workers)]
+        threading.Thread(target=self._collect, name="inference-collector", daemon=True).start()
+        atexit.register(self.shutdown)
+
+    def submit(self, image_paths, timeout=5.0):
+        """Queue image_paths for detection; returns the job id
+
+        Raises queue.Full if the job queue stays full for timeout seconds.
+        """
+        from detect_module import prepare_images
+        from inference_engine import get_engine
+        from profiler import get_profiler
+        from result_cache import get_result_cache
+
+        self.start()
+        cache = get_result_cache() if self.use_cache else None
+        model_version = get_engine().model_version() if self.use_cache else None
+        by_path, keys, images = prepare_images(image_paths, cache, model_version, self.confidence)
+
+        job_id = uuid.uuid4().hex
+        job = {
+            "job_id": job_id,
+            "status": "queued",
+            "submitted_at": time.time(),
+            "finished_at": None,
+            "paths": list(image_paths),
+            "by_path": by_path,
+            "keys": keys if cache is not None else {},
+            "frames": [path for path, _ in images],
+            "shm": [],
+            "results": None,
+            "error": None,
+            "stage_seconds": {},
+        }
+        with self._cond:
+            self._jobs[job_id] = job
+            self.stats["submitted"] += 1
+            self.stats["cached"] += len(by_path)
+            self.stats["frames"] += len(images)
+        if not images:
+            self._finish(job, [])
+            return job_id
+
+        frames = []
+        try:
+            for path, image in images:
+                shm, descriptor = _share(image)
+                job["shm"].append(shm)
+                frames.append((path, descriptor))
+            profiler = get_profiler()
+            profile = (profiler.directory, profiler.sample_rate, profiler.max_dumps)
+            self._tasks.put((job_id, frames, self.output_dir, self.confidence, profile), timeout=timeout)
+        except BaseException:
+            with self._cond:
+                self._jobs.pop(job_id, None)
+            self._release(job)
+            raise
+        return job_id
+
+    def _release(self, job):
+        for shm in job["shm"]:
+            try:
+                shm.close()
+                shm.unlink()
+            except FileNotFoundError:
+                pass
+        job["shm"] = []
+
+    def _finish(self, job, all_data, error=None):
+        """Record a job's outcome (collector thread, or submit for all-cached jobs)"""
+        self._release(job)
+        results = None
+        if error is None:
+            by_path = job["by_path"]
+            cache = None
+            if job["keys"]:
+                from result_cache import get_result_cache
+
+                cache = get_result_cache()
+            for path, detection_data in zip(job["frames"], all_data):
+                by_path[path] = detection_data
+                if cache is not None:
+                    # Best-effort: a failed cache write must not fail the job
+                    try:
+                        cache.put(job["keys"][path], detection_data)
+                    except Exception as e:
+                        print(f"⚠️  Could not cache result for {path}: {e}")
+
+            from detect_module import unreadable_image
+
+            results = [by_path.get(path) or unreadable_image(path) for path in job["paths"]]
+            if self.on_result is not None:
+                try:
+                    results = self.on_result(results)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {e}"
+        with self._cond:
+            job["status"] = "error" if error else "done"
+            job["error"] = error
+            job["results"] = None if error else results
+            job["finished_at"] = time.time()
+            self.stats["failed" if error else "completed"] += 1
+            self.stats["job_time"] += job["finished_at"] - job["submitted_at"]
+            self._evict()
+            self._cond.notify_all()
+
+    def _evict(self):
+        finished = [job_id for job_id, job in self._jobs.items() if job["status"] in FINISHED]
+        for job_id in finished[:max(0, len(finished) - self.max_jobs)]:
+            del self._jobs[job_id]
+
+    def _collect(self):
+        """Collector thread: one failing message fails its job, not the thread"""
+        while not self._stopping:
+            try:
+                kind, job_id, index, payload = self._results.get(timeout=0.5)
+            except queue.Empty:
+                try:
+                    self._check_workers()
+                except Exception as e:
+                    print(f"⚠️  Inference worker check failed: {e}")
+                continue
+            try:
+                self._handle(kind, job_id, payload)
+            except Exception as e:
+                print(f"⚠️  Could not record inference job {job_id}: {e}")
+                with self._cond:
+                    job = self._jobs.get(job_id)
+                if job is not None and job["status"] not in FINISHED:
+                    self._finish(job, None, error=f"{type(e).__name__}: {e}")
+
+    def _handle(self, kind, job_id, payload):
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if kind == "running":
+                if job is not None and job["status"] == "queued":
+                    job["status"] = "running"
+                    job["started_at"] = time.time()
+                return
+        payload, stages = payload
+        if job is not None:
+            job["stage_seconds"] = {stage: round(d["sum"], 6) for stage, d in stages.items()}
+        record_stages(stages)
+        if job is None:
+            return
+        if kind == "done":
+            self._finish(job, payload)
+        else:
+            self._finish(job, None, error=payload)
+
+    def _check_workers(self):
+        for index, proc in enumerate(self._procs):
+            if proc.is_alive() or self._stopping:
+                continue
+            claim = self._claims[index * JOB_ID_SIZE:(index + 1) * JOB_ID_SIZE].decode()
+            with self._cond:
+                job = self._jobs.get(claim)
+                self.stats["worker_restarts"] += 1
+            print(f"⚠️  Inference worker {index} exited with code {proc.exitcode}; restarting")
+            if job is not None and job["status"] not in FINISHED:
+                self._finish(job, None, error=f"inference worker exited with code {proc.exitcode}")
+            self._procs[index] = self._spawn(index)
+
+    def get(self, job_id):
+        """Public view of a job (status, results once done), or None"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None:
+                return None
+            view = {k: job[k] for k in ("job_id", "status", "submitted_at", "finished_at", "error", "stage_seconds")}
+            view["images"] = len(job["paths"])
+            if job["status"] == "done":
+                view["results"] = job["results"]
+            return view
+
+    def wait(self, job_id, timeout=None):
+        """Block until job_id finishes; returns get(job_id)"""
+        with self._cond:
+            self._cond.wait_for(lambda: self._jobs.get(job_id, {}).get("status", "done") in FINISHED, timeout)
+        return self.get(job_id)
+
+    def report(self):
+        with self._cond:
+            stats = dict(self.stats)
+            states = collections.Counter(job["status"] for job in self._jobs.values())
+        finished = stats["completed"] + stats["failed"]
+        stats.update({
+            "workers": self.workers,
+            "threads_per_worker": self.threads_per_worker,
+            "alive": sum(proc.is_alive() for proc in self._procs),
+            "jobs": dict(states),
+            "avg_job_time": stats["job_time"] / finished if finished else 0.0,
+        })
+        return stats
+
+    def shutdown(self, timeout=5.0):
+        """Stop the workers and release any shared memory still held"""
+        if not self._started or self._stopping:
+            return
+        self._stopping = True
+        for _ in self._procs:
+            try:
+                self._tasks.put(None, timeout=timeout)
+            except queue.Full:
+                break
+        for proc in self._procs:
+            proc.join(timeout)
+            if proc.is_alive():
+                proc.terminate()
+        with self._cond:
+            jobs = list(self._jobs.values())
+        for job in jobs:
+            self._release(job)